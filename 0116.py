@@ -1,4 +1,7 @@
-from gurobipy import Model, GRB, quicksum
+import numpy as np
+from gurobipy import GRB
+
+from matrix_model import build_assignment_model, assignment_results, flatten_orders
 
 # === 数据初始化 ===
 time_intervals = ["T1", "T2"]  # 时间区间
@@ -12,119 +15,19 @@ ground_cost = 5  # 地面运输成本
 air_cost = 10  # 空中运输成本
 activation_penalty = 100  # 激活惩罚
 
-# 起点到停机坪的地面距离
-distance_ground_start = {
-    (i, p): abs(p - i) * ground_cost
-    for t in time_intervals for (i, j, _) in orders[t] for p in vertiports
-}
-
-# 停机坪间空中距离
-distance_air = {
-    (p, q): abs(p - q) * air_cost
-    for p in vertiports for q in vertiports if p != q
-}
-
-# 停机坪到终点的地面距离
-distance_ground_end = {
-    (j, q): abs(j - q) * ground_cost
-    for t in time_intervals for (i, j, _) in orders[t] for q in vertiports
-}
+# 距离矩阵 (订单 x 停机坪, 停机坪 x 停机坪)
+_, _, origin, destination, _ = flatten_orders(time_intervals, orders)
+ports = np.array(vertiports)
+distance_ground_start = np.abs(ports[None, :] - origin[:, None]) * ground_cost  # 起点到停机坪的地面距离
+distance_air = np.abs(ports[:, None] - ports[None, :]) * air_cost  # 停机坪间空中距离
+distance_ground_end = np.abs(ports[None, :] - destination[:, None]) * ground_cost  # 停机坪到终点的地面距离
 
 # === 初始化模型 ===
-model = Model("Urban Air Mobility")
-
-# === 决策变量 ===
-x = model.addVars(
-    time_intervals,  # 时间区间
-    range(len(orders["T1"])),  # 订单编号
-    vertiports,  # 起飞停机坪
-    vertiports,  # 降落停机坪
-    vtype=GRB.BINARY,
-    name="x"
-)
-
-z = model.addVars(
-    vertiports,
-    vtype=GRB.BINARY,
-    name="z"
-)
-
-# === 目标函数 ===
-model.setObjective(
-    quicksum(
-        x[t, o, p, q] * (
-            distance_ground_start[(orders[t][o][0], p)] +
-            distance_air[(p, q)] +
-            distance_ground_end[(orders[t][o][1], q)]
-        )
-        for t in time_intervals
-        for o in range(len(orders[t]))
-        for p in vertiports
-        for q in vertiports if p != q
-    )
-    + quicksum(
-        z[p] * activation_penalty
-        for p in vertiports
-    ),
-    GRB.MINIMIZE
-)
-
-# === 约束条件 ===
-
-# # 路径唯一性约束
-# for t in time_intervals:
-#     for o in range(len(orders[t])):
-#         model.addConstr(
-#             quicksum(x[t, o, p, q] for p in vertiports for q in vertiports if p != q) == 1,
-#             name=f"path_uniqueness_{t}_{o}"
-#         )
-
-# # 容量限制约束
-# for t in time_intervals:
-#     for p in vertiports:
-#         for q in vertiports:
-#             if p != q:
-#                 model.addConstr(
-#                     quicksum(x[t, o, p, q] * orders[t][o][2] for o in range(len(orders[t]))) <= capacity,
-#                     name=f"capacity_limit_{t}_{p}_{q}"
-#                 )
-
-# # 启用逻辑约束
-# for t in time_intervals:
-#     for o in range(len(orders[t])):
-#         for p in vertiports:
-#             for q in vertiports:
-#                 if p != q:
-#                     model.addConstr(x[t, o, p, q] <= z[p], name=f"path_activation_start_{t}_{o}_{p}_{q}")
-#                     model.addConstr(x[t, o, p, q] <= z[q], name=f"path_activation_end_{t}_{o}_{p}_{q}")
-
-# Path Uniqueness Constraints
-model.addConstrs(
-    quicksum(x[t, o, p, q] for p in vertiports for q in vertiports if p != q) == 1
-    for t in time_intervals for o in range(len(orders[t]))
-)
-
-# Capacity Constraints
-model.addConstrs(
-    quicksum(x[t, o, p, q] * orders[t][o][2] for o in range(len(orders[t]))) <= capacity
-    for t in time_intervals for p in vertiports for q in vertiports if p != q
-)
-
-# Activation Logic Constraints
-model.addConstrs(
-    x[t, o, p, q] <= z[p]
-    for t in time_intervals for o in range(len(orders[t])) for p in vertiports for q in vertiports if p != q
-)
-model.addConstrs(
-    x[t, o, p, q] <= z[q]
-    for t in time_intervals for o in range(len(orders[t])) for p in vertiports for q in vertiports if p != q
-)
-
-# Ensure Selected Vertiports Minimize Ground-Level Distance
-model.addConstrs(
-    quicksum(x[t, o, p, q] * distance_ground_start[(orders[t][o][0], p)]
-             for q in vertiports if p != q) <= quicksum(distance_ground_start[(orders[t][o][0], v)] for v in vertiports) * z[p]
-    for t in time_intervals for o in range(len(orders[t])) for p in vertiports
+# 矩阵形式建模: 路径唯一性、容量限制、启用逻辑和地面距离约束 (见 matrix_model)
+model, v, layout = build_assignment_model(
+    "Urban Air Mobility", time_intervals, orders, vertiports,
+    distance_ground_start, distance_air, distance_ground_end, activation_penalty,
+    capacity=capacity, ground_activation=True
 )
 
 # === 求解模型 ===
@@ -134,11 +37,8 @@ model.optimize()
 if model.status == GRB.OPTIMAL:
     print(f"Objective value: {model.objVal}")
     print("Selected Vertiports and Flow Amounts:")
-    for t in time_intervals:
-        for o in range(len(orders[t])):
-            for p in vertiports:
-                for q in vertiports:
-                    if p != q and x[t, o, p, q].x > 0.5:
-                        print(f"Time: {t}, Order: {o}, Takeoff: {p}, Landing: {q}, Flow: {orders[t][o][2]}")
+    results, activated = assignment_results(v, layout)
+    for t, o, p, q, flow in results:
+        print(f"Time: {t}, Order: {o}, Takeoff: {p}, Landing: {q}, Flow: {flow}")
 else:
     print("No optimal solution found.")
@@ -1,10 +1,29 @@
 from typing import Dict
 
-def charging_and_battery_update(vehicle_states: Dict, time_interval: int, charging_rate: float):
+import numpy as np
+
+def charging_and_battery_update(vehicle_states: Dict, time_interval: int, charging_rate):
     """
     Simulate charging and update vehicle states.
     Vehicles are only available again after full charge (battery = 100%).
+
+    `charging_rate` is the battery gained per step, or a `battery_model.BatteryModel` whose
+    charge curve is applied to all charging vehicles at once.
     """
+    if hasattr(charging_rate, "charge"):
+        charging = [state for state in vehicle_states.values() if state["charging"] == 1]
+        if not charging:
+            return
+        # 整个机队一次查表
+        battery = charging_rate.charge(np.array([state["battery"] for state in charging], dtype=float),
+                                       time_interval)
+        for state, level in zip(charging, battery.tolist()):
+            state["battery"] = level
+            if level == 100:
+                state["charging"] = 0
+                state["avail"] = 1
+        return
+
     for vehicle_id, state in vehicle_states.items():
         loc = state["loc"]
 
@@ -0,0 +1,107 @@
+import argparse
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+class BatteryModel:
+    """
+    Piecewise battery model: a charge-rate curve over SOC and a distance/payload discharge law.
+
+    The charge rate (SOC % per step) is piecewise linear in SOC through the `soc_points` /
+    `rate_points` breakpoints. The curve is integrated once into a cumulative time-to-SOC
+    table, so charging for dt from any SOC is two `np.interp` lookups (SOC -> time, time + dt
+    -> SOC) over a whole array of vehicles.
+
+    A model can stand in for `charging_rate` in `battery_charging.charging_and_battery_update`
+    and for `discharge_rate` in `distance_battery.battery_consumption_required`.
+    """
+
+    def __init__(self, soc_points: Sequence[float], rate_points: Sequence[float], discharge_rate: float = 0.5,
+                 payload_factor: float = 0.0, takeoff_energy: float = 0.0, resolution: int = 2001):
+        """
+        :param soc_points: Increasing SOC breakpoints from 0 to 100.
+        :param rate_points: Charge rate (% per step) at each breakpoint; must be positive.
+        :param discharge_rate: Battery used per unit of flight distance with no payload.
+        :param payload_factor: Relative extra consumption per unit of payload.
+        :param takeoff_energy: Fixed battery used by every flight (take-off and landing).
+        :param resolution: Number of SOC samples in the lookup tables.
+        """
+        soc_points = np.asarray(soc_points, dtype=float)
+        rate_points = np.asarray(rate_points, dtype=float)
+        if soc_points[0] != 0 or soc_points[-1] != 100 or np.any(np.diff(soc_points) <= 0):
+            raise ValueError("soc_points must increase from 0 to 100")
+        if len(rate_points) != len(soc_points) or np.any(rate_points <= 0):
+            raise ValueError("rate_points must give a positive rate for every SOC breakpoint")
+        self.soc_points = soc_points
+        self.rate_points = rate_points
+        self.discharge_rate = discharge_rate
+        self.payload_factor = payload_factor
+        self.takeoff_energy = takeoff_energy
+
+        # 累积充电时间表: time[k] = 从 0% 充到 soc[k] 所需时间 (对 1/rate 做梯形积分)
+        # 断点也放进网格, 分段线性的速率在每段内才被精确插值
+        self.soc_grid = np.union1d(np.linspace(0.0, 100.0, resolution), soc_points)
+        inverse_rate = 1.0 / np.interp(self.soc_grid, soc_points, rate_points)
+        steps = np.diff(self.soc_grid) * (inverse_rate[1:] + inverse_rate[:-1]) / 2
+        self.time_grid = np.concatenate([[0.0], np.cumsum(steps)])
+
+    @classmethod
+    def constant(cls, charging_rate: float, discharge_rate: float = 0.5, **kwargs) -> "BatteryModel":
+        """Constant-rate charging, the behaviour of a plain numeric `charging_rate`."""
+        return cls([0, 100], [charging_rate, charging_rate], discharge_rate, resolution=2, **kwargs)
+
+    @classmethod
+    def cc_cv(cls, charging_rate: float, cv_start: float = 80, cutoff_rate: Optional[float] = None,
+              discharge_rate: float = 0.5, **kwargs) -> "BatteryModel":
+        """
+        Constant current up to `cv_start` % SOC, then constant voltage: the rate falls linearly
+        with SOC to `cutoff_rate` at 100% (default a tenth of `charging_rate`).
+        """
+        if cutoff_rate is None:
+            cutoff_rate = charging_rate / 10
+        if cv_start >= 100:
+            return cls.constant(charging_rate, discharge_rate, **kwargs)
+        return cls([0, cv_start, 100], [charging_rate, charging_rate, cutoff_rate], discharge_rate, **kwargs)
+
+    @property
+    def full_charge_time(self) -> float:
+        """Steps to charge from 0% to 100%."""
+        return float(self.time_grid[-1])
+
+    def time_at(self, soc):
+        """Steps to charge from 0% to `soc` (array-friendly)."""
+        return np.interp(soc, self.soc_grid, self.time_grid)
+
+    def soc_at(self, time):
+        """SOC reached after charging `time` steps from 0% (array-friendly, 100 once full)."""
+        return np.interp(time, self.time_grid, self.soc_grid)
+
+    def charge(self, soc, dt: float):
+        """SOC after charging for dt steps, for a scalar or an array of vehicles."""
+        soc = self.soc_at(self.time_at(soc) + dt)
+        # 表查找的舍入误差不应让电池停在 99.999...%
+        return np.where(soc > 100 - 1e-9, 100.0, soc)
+
+    def charge_time(self, soc_from, soc_to=100):
+        """Steps to charge from `soc_from` to `soc_to`."""
+        return np.maximum(self.time_at(soc_to) - self.time_at(soc_from), 0.0)
+
+    def consumption(self, distance, payload=0):
+        """Battery percentage used to fly `distance` carrying `payload` (array-friendly)."""
+        return self.takeoff_energy + distance * self.discharge_rate * (1 + self.payload_factor * payload)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the charge curve of a CC/CV battery model.")
+    parser.add_argument("--charging_rate", type=float, default=20)
+    parser.add_argument("--cv_start", type=float, default=80)
+    parser.add_argument("--cutoff_rate", type=float, default=None)
+    args = parser.parse_args()
+
+    model = BatteryModel.cc_cv(args.charging_rate, args.cv_start, args.cutoff_rate)
+    print(f"Full charge from 0%: {model.full_charge_time:.2f} steps")
+    soc = np.zeros(1)
+    for step in range(1, int(np.ceil(model.full_charge_time)) + 1):
+        soc = model.charge(soc, 1)
+        print(f"step {step}: {soc[0]:.2f}%")
@@ -0,0 +1,318 @@
+import argparse
+import contextlib
+import copy
+import datetime
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from distance_battery import vertiport_names
+from metrics import calculate_demand_met
+from simulation import load_gurobi_results, load_distance_map, run_iterations
+from task_assignment import time_step_path_assignment
+
+VERTIPORTS_FILE = "adjusted_vertiports_numeric.csv"
+FLOW_FILE = "updated_flow_data_with_vertiports.csv"
+DISTANCE_FILE = "distance_matrix.csv"
+
+
+# --- synthetic generators -----------------------------------------------------------
+
+def synthetic_demand(steps: int, rows_per_step: int, vertiports: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Resample the shipped flow data into `steps` steps of `rows_per_step` rows.
+
+    Only routes between the first `vertiports` vertiports are used; the simulation looks
+    distances up in `distance_matrix.csv`, so it cannot go beyond the shipped vertiports.
+    """
+    rng = np.random.default_rng(seed)
+    flow = pd.read_csv(FLOW_FILE)
+    keep = set(vertiport_names[:vertiports])
+    pool = flow[flow["start"].isin(keep) & flow["end"].isin(keep)].reset_index(drop=True)
+    rows = pool.iloc[rng.integers(0, len(pool), steps * rows_per_step)].reset_index(drop=True)
+    rows["Time"] = [f"T{t}" for t in np.repeat(np.arange(steps), rows_per_step)]
+    return rows[["Time", "start", "end", "flow", "distance"]]
+
+
+def synthetic_fleet(vehicles: int, vertiports: int, seed: int = 0):
+    """Vehicle, vertiport and plane states spread evenly over the first `vertiports` vertiports."""
+    rng = np.random.default_rng(seed)
+    names = list(vertiport_names[:vertiports])
+    battery = rng.uniform(60, 100, vehicles).round(1)
+    vehicle_states = {
+        f"V{i + 1}": {"activated": True, "avail": 1, "charging": 0, "in_service": 0,
+                      "battery": float(battery[i]), "loc": names[i % len(names)]}
+        for i in range(vehicles)
+    }
+    vertiport_states = {v: {"activated": True, "loc": None, "avail": 30, "in_service": 0} for v in names}
+    plane_status = {
+        f"V{i + 1}": {"battery": float(battery[i]), "location": names[i % len(names)], "status": "standby"}
+        for i in range(vehicles)
+    }
+    return vehicle_states, vertiport_states, plane_status
+
+
+def synthetic_trips(trips: int, grid_cells: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Taxi trips in the format `get_od.get_flow` reads (save_od.csv).
+
+    Pick-ups and drop-offs are scattered around the shipped vertiports over a square of
+    about `grid_cells` grid cells, at times inside the window `get_flow` aggregates.
+    """
+    from get_od import grid_size
+
+    rng = np.random.default_rng(seed)
+    vertiports = pd.read_csv(VERTIPORTS_FILE)
+    half = np.sqrt(grid_cells) * grid_size / 2
+    lat0, lon0 = vertiports["Latitude"].mean(), vertiports["Longitude"].mean()
+    start = pd.Timestamp("2008-05-17 18:00:00")
+    time_on = start + pd.to_timedelta(rng.integers(0, 24 * 23 * 3600, trips), unit="s")
+    return pd.DataFrame({
+        "id": rng.choice(["abboip", "abcoij", "abdremlu"], trips),
+        "lat_on": lat0 + rng.uniform(-half, half, trips),
+        "lon_on": lon0 + rng.uniform(-half, half, trips),
+        "time_on": time_on,
+        "time_off": time_on + pd.to_timedelta(rng.integers(300, 3600, trips), unit="s"),
+        "lat_off": lat0 + rng.uniform(-half, half, trips),
+        "lon_off": lon0 + rng.uniform(-half, half, trips),
+    })
+
+
+def synthetic_orders(intervals: int, orders_per_interval: int, vertiports: int, seed: int = 0):
+    """Orders and vertiports for `kmeans_OD_batch.build_batch_model` on its 52-column grid."""
+    from kmeans_OD_batch import GRID_WIDTH, air_cost
+
+    rng = np.random.default_rng(seed)
+    cells = GRID_WIDTH * GRID_WIDTH
+    grid_ids = [int(p) for p in rng.choice(cells, vertiports, replace=False)]
+    distance_air = {
+        (p, q): float(rng.uniform(1, 20)) * air_cost for p in grid_ids for q in grid_ids if p != q
+    }
+    batch = [f"T{t}" for t in range(intervals)]
+    orders = {
+        t: [(int(i), int(j), int(f)) for i, j, f in zip(rng.integers(0, cells, orders_per_interval),
+                                                     rng.integers(0, cells, orders_per_interval),
+                                                     rng.integers(1, 4, orders_per_interval))]
+        for t in batch
+    }
+    return batch, orders, grid_ids, distance_air
+
+
+# --- timing -------------------------------------------------------------------------
+
+def time_call(fn: Callable, repeat: int, setup: Callable = None) -> Dict:
+    """Time `fn(*setup())` `repeat` times; `setup` runs untimed before every call."""
+    samples = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            begin = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - begin)
+    return {
+        "repeat": repeat,
+        "min_s": min(samples),
+        "median_s": statistics.median(samples),
+        "mean_s": statistics.mean(samples),
+    }
+
+
+def machine_metadata() -> Dict:
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except Exception:
+            return None
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": version("numpy"),
+        "pandas": version("pandas"),
+        "scipy": version("scipy"),
+        "gurobipy": version("gurobipy"),
+    }
+
+
+# --- benchmarks ---------------------------------------------------------------------
+
+def bench_simulation(params: Dict, repeat: int, workdir: str) -> List[Dict]:
+    vehicles, vertiports, rows, steps = params["vehicles"], params["vertiports"], params["rows_per_step"], params["steps"]
+    demand = synthetic_demand(steps, rows, vertiports, params["seed"])
+    flow_file = os.path.join(workdir, f"flow_{vertiports}_{rows}_{steps}.csv")
+    demand.to_csv(flow_file, index=False)
+    fleet = synthetic_fleet(vehicles, vertiports, params["seed"])
+    batches = [load_gurobi_results(flow_file, t, as_batch=True) for t in range(steps)]
+    distance_map = load_distance_map(DISTANCE_FILE)
+
+    results = []
+
+    def record(name, timing, **extra):
+        results.append({"name": name, "params": dict(params, **extra), **timing})
+
+    record("load_gurobi_results", time_call(lambda: load_gurobi_results(flow_file, steps // 2), repeat))
+    record("load_gurobi_results", time_call(lambda: load_gurobi_results(flow_file, steps // 2, as_batch=True), repeat),
+           as_batch=True)
+
+    def dispatch_setup(step_demand):
+        def setup():
+            vehicle_states, vertiport_states, plane_status = copy.deepcopy(fleet)
+            return step_demand, vehicle_states, vertiport_states, [], 0.5, {}, plane_status
+        return setup
+
+    for dispatch in ("greedy", "assignment"):
+        record("time_step_path_assignment",
+               time_call(lambda *a: time_step_path_assignment(*a, dispatch=dispatch), repeat, dispatch_setup(batches[0])),
+               dispatch=dispatch)
+
+    # Demand met on the state a greedy dispatch leaves behind
+    _, vehicle_states, vertiport_states, unmet, rate, movements, plane_status = dispatch_setup(batches[0])()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        time_step_path_assignment(batches[0], vehicle_states, vertiport_states, unmet, rate, movements, plane_status)
+    record("calculate_demand_met", time_call(lambda: calculate_demand_met(batches[0], movements, unmet), repeat))
+
+    def replay_solution(t, unmet_demand, vehicle_states, vertiport_states, original_solution, get_second_best):
+        # 回退时复用上一个解，计时不包含 Gurobi 求解
+        return original_solution
+
+    def run_setup():
+        vehicle_states, vertiport_states, plane_status = copy.deepcopy(fleet)
+        return vehicle_states, vertiport_states, plane_status, list(batches)
+
+    for dispatch in ("greedy", "assignment"):
+        record("run_iterations", time_call(
+            lambda vs, vps, ps, demand_per_time: run_iterations(
+                steps, vs, vps, demand_per_time, charging_rate=20, discharge_rate=0.5,
+                regenerate_solution=replay_solution, plane_status=ps, distance_map=distance_map, dispatch=dispatch),
+            repeat, run_setup), dispatch=dispatch)
+    return results
+
+
+def bench_get_flow(params: Dict, repeat: int, workdir: str) -> List[Dict]:
+    try:
+        from get_od import get_flow
+    except ImportError as e:
+        return [{"name": "get_od.get_flow", "params": params, "skipped": f"{type(e).__name__}: {e}"}]
+
+    trips_dir = os.path.join(workdir, f"trips_{params['trips']}_{params['grid_cells']}")
+    os.makedirs(trips_dir, exist_ok=True)
+    synthetic_trips(params["trips"], params["grid_cells"], params["seed"]).to_csv(
+        os.path.join(trips_dir, "save_od.csv"), index=False)
+
+    # get_flow 把结果写到当前目录，在临时目录里运行
+    cwd = os.getcwd()
+    os.chdir(trips_dir)
+    try:
+        timing = time_call(lambda: get_flow("save_od.csv"), repeat)
+    finally:
+        os.chdir(cwd)
+    return [{"name": "get_od.get_flow", "params": params, **timing}]
+
+
+def bench_batch_model(params: Dict, repeat: int) -> List[Dict]:
+    """Build time of the quicksum model against the matrix-form one for the same batch."""
+    from kmeans_OD_batch import build_batch_model, build_batch_model_matrix
+
+    batch, orders, grid_ids, distance_air = synthetic_orders(
+        params["intervals"], params["orders_per_interval"], params["model_vertiports"], params["seed"])
+
+    results = []
+    for name, builder in (("kmeans_OD_batch.build_batch_model", build_batch_model),
+                          ("kmeans_OD_batch.build_batch_model_matrix", build_batch_model_matrix)):
+        def build():
+            model = builder(0, batch, orders, grid_ids, distance_air)[0]
+            model.update()
+            model.dispose()
+
+        results.append({"name": name, "params": params, **time_call(build, repeat)})
+    return results
+
+
+def compare(baseline: Dict, current: Dict):
+    """Print median-time ratios (current / baseline) for benchmarks present in both reports."""
+    def key(result):
+        return result["name"], json.dumps(result["params"], sort_keys=True)
+
+    before = {key(r): r for r in baseline["results"] if "median_s" in r}
+    for result in current["results"]:
+        if "median_s" in result and key(result) in before:
+            ratio = result["median_s"] / before[key(result)]["median_s"]
+            print(f"{result['name']:<42} {ratio:6.2f}x  {result['params']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation, assignment and optimisation hot paths.")
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[20, 200])
+    parser.add_argument("--vertiports", type=int, nargs="+", default=[len(vertiport_names)])
+    parser.add_argument("--rows_per_step", type=int, nargs="+", default=[200])
+    parser.add_argument("--steps", type=int, nargs="+", default=[10])
+    parser.add_argument("--trips", type=int, nargs="+", default=[2000])
+    parser.add_argument("--grid_cells", type=int, default=36)
+    parser.add_argument("--intervals", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--orders_per_interval", type=int, nargs="+", default=[20])
+    parser.add_argument("--model_vertiports", type=int, nargs="+", default=[10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip", nargs="*", default=[], choices=["simulation", "get_flow", "batch_model"])
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="earlier benchmark JSON to compare against")
+    args = parser.parse_args()
+
+    if max(args.vertiports) > len(vertiport_names):
+        parser.error(f"--vertiports is limited to the {len(vertiport_names)} vertiports in {DISTANCE_FILE}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        if "simulation" not in args.skip:
+            for vehicles, vertiports, rows, steps in itertools.product(
+                    args.vehicles, args.vertiports, args.rows_per_step, args.steps):
+                params = {"vehicles": vehicles, "vertiports": vertiports, "rows_per_step": rows,
+                          "steps": steps, "seed": args.seed}
+                results += bench_simulation(params, args.repeat, workdir)
+        if "get_flow" not in args.skip:
+            for trips in args.trips:
+                params = {"trips": trips, "grid_cells": args.grid_cells, "seed": args.seed}
+                results += bench_get_flow(params, args.repeat, workdir)
+        if "batch_model" not in args.skip:
+            for intervals, orders, vertiports in itertools.product(
+                    args.intervals, args.orders_per_interval, args.model_vertiports):
+                params = {"intervals": intervals, "orders_per_interval": orders,
+                          "model_vertiports": vertiports, "seed": args.seed}
+                results += bench_batch_model(params, args.repeat)
+
+    report = {"metadata": machine_metadata(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for result in results:
+        if "skipped" in result:
+            print(f"{result['name']:<42} skipped ({result['skipped']})")
+        else:
+            print(f"{result['name']:<42} {result['median_s'] * 1000:10.2f} ms  {result['params']}")
+    print(f"Saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
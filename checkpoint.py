@@ -0,0 +1,130 @@
+import glob
+import os
+import pickle
+import queue
+import threading
+from typing import Dict, List, Optional
+
+from unmet_ledger import UnmetDemandLedger
+
+CHECKPOINT_VERSION = 1
+
+
+def snapshot_state(next_step: int, vehicle_states: Dict, vertiport_states: Dict, plane_status: Dict,
+                   unmet_demand: List, flag: int, stuck_iteration: int, last_solution=None, metrics=None) -> bytes:
+    """
+    Serialise everything `run_iterations` needs to continue from `next_step`.
+
+    Pickling happens immediately, so the snapshot is frozen even if the simulation
+    keeps mutating the dicts while a background writer is still busy.
+    """
+    state = {
+        "version": CHECKPOINT_VERSION,
+        "next_step": next_step,
+        "vehicle_states": vehicle_states,
+        "vertiport_states": vertiport_states,
+        "plane_status": plane_status,
+        # 未满足需求账本连同需求年龄和统计一起保存
+        "unmet_demand": unmet_demand if isinstance(unmet_demand, UnmetDemandLedger) else list(unmet_demand),
+        "flag": flag,
+        "stuck_iteration": stuck_iteration,
+        "last_solution": last_solution,
+        "metrics": metrics,
+    }
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def write_checkpoint(path: str, data: bytes):
+    """Write atomically, so a crash mid-write never leaves a truncated snapshot."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> Dict:
+    """Load a snapshot. Each call returns fresh objects, so two loads give two independent forks."""
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {path}: {state.get('version')}")
+    return state
+
+
+def latest_checkpoint(directory: str) -> Optional[str]:
+    paths = sorted(glob.glob(os.path.join(directory, "step_*.pkl")))
+    return paths[-1] if paths else None
+
+
+def resume_kwargs(state: Dict) -> Dict:
+    """Keyword arguments for `run_iterations` that continue from a loaded snapshot."""
+    return {
+        "vehicle_states": state["vehicle_states"],
+        "vertiport_states": state["vertiport_states"],
+        "plane_status": state["plane_status"],
+        "start_step": state["next_step"],
+        "unmet_demand": state["unmet_demand"],
+        "flag": state["flag"],
+        "stuck_iteration": state["stuck_iteration"],
+        "last_solution": state["last_solution"],
+        "metrics": state.get("metrics"),
+    }
+
+
+class Checkpointer:
+    """
+    Writes a snapshot every `every` steps into `directory` as step_<n>.pkl.
+
+    With `background=True` the file I/O runs on a writer thread; only the pickling
+    stays on the simulation thread. Call `close()` to flush pending writes.
+    """
+
+    def __init__(self, directory: str, every: int = 10, background: bool = False):
+        self.directory = directory
+        self.every = every
+        self.background = background
+        os.makedirs(directory, exist_ok=True)
+
+        self._queue = None
+        self._thread = None
+        self._error = None
+        if background:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._writer, name="checkpoint-writer", daemon=True)
+            self._thread.start()
+
+    def path(self, step: int) -> str:
+        return os.path.join(self.directory, f"step_{step:06d}.pkl")
+
+    def due(self, next_step: int) -> bool:
+        return self.every > 0 and next_step % self.every == 0
+
+    def save(self, next_step: int, data: bytes):
+        if self._error is not None:
+            raise self._error
+        if self.background:
+            self._queue.put((self.path(next_step), data))
+        else:
+            write_checkpoint(self.path(next_step), data)
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                write_checkpoint(*item)
+            except Exception as e:  # surfaced on the next save/close
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise self._error
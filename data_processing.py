@@ -1,9 +1,83 @@
+import hashlib
+import os
+
 import pandas as pd
 import numpy as np
 
-def load_and_preprocess(data_file):
+BIN_MINUTES = 15  # same 15-minute slots as get_od.get_flow
+TIME_ORIGIN = '2008-05-17 18:00:00'  # first slot of get_od.get_flow
+RUSH_HOUR_WINDOW = '180min'
+RUSH_HOUR_CACHE_DIR = '.rush_hour_cache'
+
+_rush_hour_scores = {}
+
+def bin_volume(time_on, bin_minutes=BIN_MINUTES):
+    """
+    Trips per aligned time bin. Volumes of separate chunks can simply be concatenated.
     """
-    Load the dataset and preprocess it by computing distance, time spent, and rush hour rolling window.
+    return pd.to_datetime(time_on).dt.floor(f'{bin_minutes}min').value_counts()
+
+def rush_hour_scores(volume, window=RUSH_HOUR_WINDOW, bin_minutes=BIN_MINUTES, quantile=0.75):
+    """
+    Rush-hour score of every time bin: mean trip volume over the trailing `window`.
+
+    Bins without trips count as zero volume. Bins scoring in the top 25% of the bins
+    that have trips are rush hours.
+    """
+    volume = volume.groupby(level=0).sum().sort_index()
+    bins = pd.date_range(volume.index.min(), volume.index.max(), freq=f'{bin_minutes}min')
+    volume = volume.reindex(bins, fill_value=0)
+    score = volume.rolling(window, min_periods=1).mean()
+
+    scores = pd.DataFrame({'volume': volume, 'score': score})
+    scores['rush'] = score >= score[volume > 0].quantile(quantile)
+    scores.index.name = 'bin'
+    return scores
+
+def load_rush_hour_scores(data_file, window=RUSH_HOUR_WINDOW, bin_minutes=BIN_MINUTES,
+                          cache_dir=RUSH_HOUR_CACHE_DIR, time_on=None, chunksize=200_000):
+    """
+    `rush_hour_scores` of a trip file, cached per dataset (path, size, mtime) and parameters.
+
+    On a miss the volumes come from `time_on` if the caller has it loaded already, otherwise
+    from streaming the file's time_on column in chunks.
+    """
+    stat = os.stat(data_file)
+    key = hashlib.sha256(repr((os.path.abspath(data_file), stat.st_size, stat.st_mtime_ns,
+                               window, bin_minutes)).encode()).hexdigest()[:16]
+    if key in _rush_hour_scores:
+        return _rush_hour_scores[key]
+
+    path = os.path.join(cache_dir, f'{key}.csv') if cache_dir else None
+    if path and os.path.exists(path):
+        scores = pd.read_csv(path, index_col='bin', parse_dates=['bin'])
+        scores.index.freq = f'{bin_minutes}min'
+    else:
+        if time_on is not None:
+            volume = bin_volume(time_on, bin_minutes)
+        else:
+            volume = pd.concat([
+                bin_volume(chunk['time_on'], bin_minutes)
+                for chunk in pd.read_csv(data_file, usecols=['time_on'], chunksize=chunksize)
+            ])
+        scores = rush_hour_scores(volume, window, bin_minutes)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            scores.to_csv(path + '.tmp')
+            os.replace(path + '.tmp', path)
+    _rush_hour_scores[key] = scores
+    return scores
+
+def rush_hour_steps(scores, origin=TIME_ORIGIN, bin_minutes=BIN_MINUTES):
+    """
+    Rush flag per time step counted from `origin` (step 0 is the bin starting at `origin`).
+    """
+    steps = (scores.index - pd.Timestamp(origin)) // pd.Timedelta(minutes=bin_minutes)
+    return pd.Series(scores['rush'].to_numpy(), index=steps)
+
+def load_and_preprocess(data_file, cache_dir=RUSH_HOUR_CACHE_DIR):
+    """
+    Load the dataset and preprocess it by computing distance, time spent, and the rush-hour score of each trip's time bin.
     """
     # Load data
     data = pd.read_csv(data_file)
@@ -15,38 +89,48 @@ def load_and_preprocess(data_file):
     
     data['time_spend'] = (data['time_off'] - data['time_on']).dt.total_seconds() / 60
     
-    rush_hour_period = 180
-    data['rush_hour'] = data['time_spend'].rolling(window=rush_hour_period, min_periods=1).mean()
+    scores = load_rush_hour_scores(data_file, cache_dir=cache_dir, time_on=data['time_on'])
+    data['time_bin'] = data['time_on'].dt.floor(f'{BIN_MINUTES}min')
+    data['rush_hour'] = data['time_bin'].map(scores['score'])
     
     return data
 
 def classify_rush_hours(data):
     """
-    Classify time steps into rush hour and non-rush hour based on the 75th percentile of demand.
+    Classify time bins into rush hour and non-rush hour based on the 75th percentile of their scores.
     """
-    rush_hour_threshold = data['rush_hour'].quantile(0.75)  # Top 25% of demand time steps
+    rush_hour_threshold = data.groupby('time_bin')['rush_hour'].first().quantile(0.75)  # Top 25% of demand time steps
     data['rush_status'] = np.where(data['rush_hour'] >= rush_hour_threshold, 'rush', 'non_rush')
     return data
 
-def assign_travel_modes(data):
+UAM_PROBABILITIES = {
+    ('rush', 'short'): 0.4,  # 40% of short trips use UAM during rush hours
+    ('rush', 'long'):  0.7,  # 70% of long trips use UAM during rush hours
+    ('non_rush', 'short'): 0.3,  # 30% of short trips use UAM during non-rush hours
+    ('non_rush', 'long'):  0.8   # 80% of long trips use UAM during non-rush hours
+}
+
+def uam_probability(rush, short, probabilities=UAM_PROBABILITIES):
+    """
+    Per-trip UAM probability from boolean rush-hour and short-distance arrays.
+    """
+    return np.select(
+        [rush & short, rush & ~short, ~rush & short],
+        [probabilities[('rush', 'short')], probabilities[('rush', 'long')], probabilities[('non_rush', 'short')]],
+        probabilities[('non_rush', 'long')]
+    )
+
+def assign_travel_modes(data, seed=None, probabilities=UAM_PROBABILITIES):
     """
     Assign travel mode preferences (UAM or Non-UAM) based on distance level and rush hour status.
     """
     distance_threshold = data['distance'].quantile(0.40)
     data['distance_level'] = np.where(data['distance'] <= distance_threshold, 'short', 'long')
 
-    data['UAM'] = 0
-    uam_probabilities = {
-        ('rush', 'short'): 0.4,  # 40% of short trips use UAM during rush hours
-        ('rush', 'long'):  0.7,  # 70% of long trips use UAM during rush hours
-        ('non_rush', 'short'): 0.3,  # 30% of short trips use UAM during non-rush hours
-        ('non_rush', 'long'):  0.8   # 80% of long trips use UAM during non-rush hours
-    }
-
-    for (rush_status, distance_level), prob in uam_probabilities.items():
-        mask = (data['rush_status'] == rush_status) & (data['distance_level'] == distance_level)
-        data.loc[mask, 'UAM'] = np.random.choice([0, 1], size=mask.sum(), p=[1 - prob, prob])
-    
+    p = uam_probability((data['rush_status'] == 'rush').to_numpy(),
+                        (data['distance_level'] == 'short').to_numpy(), probabilities)
+    data['UAM'] = (np.random.default_rng(seed).random(len(data)) < p).astype(int)
+
     return data
 
 def main(data_file, output_file):
@@ -73,10 +157,11 @@ def UAM_data(data_file, output_file):
     print(f"Processed data saved to {output_file}")
 
     data_UAM = data[data['UAM'] == 1]
-    data_UAM = data_UAM.drop(colomns = ['distance_level', 'rush_status', 'UAM'])
+    data_UAM = data_UAM.drop(columns = ['distance_level', 'rush_status', 'UAM'])
     data_UAM.to_csv('UAM_travel_data.csv', index=False)
 
 
-data_file = 'save_od_with_id.csv'
-output_file = 'UAM_travel_data.csv'
-main(data_file, output_file)
\ No newline at end of file
+if __name__ == '__main__':
+    data_file = 'save_od_with_id.csv'
+    output_file = 'UAM_travel_data.csv'
+    main(data_file, output_file)
\ No newline at end of file
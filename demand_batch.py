@@ -0,0 +1,110 @@
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+
+class DemandBatch:
+    """
+    Demand rows stored as parallel NumPy arrays.
+
+    `start` and `end` are integer codes into `names` (the vertiport names), so a batch
+    never holds per-row Python objects. Slicing returns views of the same arrays;
+    boolean/index selection and `concat` copy the arrays once and nothing else.
+    """
+    __slots__ = ("names", "start", "end", "flow", "distance")
+
+    def __init__(self, names: Sequence[str], start, end, flow, distance):
+        self.names = tuple(names)
+        self.start = np.asarray(start, dtype=np.int32)
+        self.end = np.asarray(end, dtype=np.int32)
+        self.flow = np.asarray(flow, dtype=np.int64)  # demand is counted in whole trips
+        self.distance = np.asarray(distance, dtype=np.float64)
+
+    @classmethod
+    def empty(cls, names: Sequence[str]) -> "DemandBatch":
+        return cls(names, [], [], [], [])
+
+    @classmethod
+    def from_records(cls, records: List[Dict], names: Sequence[str]) -> "DemandBatch":
+        """Build from the list-of-dicts format ({"start", "end", "flow", "distance"})."""
+        code = {name: i for i, name in enumerate(names)}
+        return cls(
+            names,
+            [code[d["start"]] for d in records],
+            [code[d["end"]] for d in records],
+            [d["flow"] for d in records],
+            [d["distance"] for d in records],
+        )
+
+    @classmethod
+    def from_tuples(cls, demand: Iterable[Tuple[str, str, float]], names: Sequence[str],
+                    distance_table: np.ndarray) -> "DemandBatch":
+        """Build from (start, end, flow) tuples, looking distances up in a names x names table."""
+        code = {name: i for i, name in enumerate(names)}
+        demand = list(demand)
+        start = np.fromiter((code[d[0]] for d in demand), dtype=np.int32, count=len(demand))
+        end = np.fromiter((code[d[1]] for d in demand), dtype=np.int32, count=len(demand))
+        flow = np.fromiter((d[2] for d in demand), dtype=np.int64, count=len(demand))
+        return cls(names, start, end, flow, distance_table[start, end])
+
+    @classmethod
+    def concat(cls, batches: Sequence["DemandBatch"]) -> "DemandBatch":
+        """Concatenate batches that share the same vertiport names."""
+        names = batches[0].names
+        if any(b.names != names for b in batches[1:]):
+            raise ValueError("DemandBatch.concat needs batches with the same vertiport names.")
+        return cls(
+            names,
+            np.concatenate([b.start for b in batches]),
+            np.concatenate([b.end for b in batches]),
+            np.concatenate([b.flow for b in batches]),
+            np.concatenate([b.distance for b in batches]),
+        )
+
+    def __len__(self):
+        return len(self.flow)
+
+    def __iter__(self):
+        return self.iter_routes()
+
+    def __repr__(self):
+        return f"DemandBatch({len(self)} routes, total flow {self.total_flow():g})"
+
+    def __getitem__(self, index) -> "DemandBatch":
+        """Slice (views) or boolean/integer index (one array copy)."""
+        return DemandBatch(self.names, self.start[index], self.end[index], self.flow[index], self.distance[index])
+
+    def select(self, mask) -> "DemandBatch":
+        return self[mask]
+
+    def route_codes(self) -> np.ndarray:
+        """One integer per (start, end) route."""
+        return self.start.astype(np.int64) * len(self.names) + self.end
+
+    def total_flow(self) -> int:
+        return int(self.flow.sum())
+
+    def iter_routes(self):
+        """Yield (start, end, flow, distance) with vertiport names."""
+        names = self.names
+        for s, e, f, d in zip(self.start.tolist(), self.end.tolist(), self.flow.tolist(), self.distance.tolist()):
+            yield names[s], names[e], f, d
+
+    def to_records(self) -> List[Dict]:
+        """Convert back to the list-of-dicts format."""
+        return [
+            {"start": s, "end": e, "flow": f, "distance": d}
+            for s, e, f, d in self.iter_routes()
+        ]
+
+
+def as_demand_batch(demand, names: Sequence[str], distance_table: np.ndarray = None) -> DemandBatch:
+    """Accept a DemandBatch, a list of demand dicts or a list of (start, end, flow) tuples."""
+    if isinstance(demand, DemandBatch):
+        return demand
+    demand = list(demand)
+    if demand and isinstance(demand[0], dict):
+        return DemandBatch.from_records(demand, names)
+    if not demand:
+        return DemandBatch.empty(names)
+    return DemandBatch.from_tuples(demand, names, distance_table)
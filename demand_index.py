@@ -0,0 +1,89 @@
+from functools import lru_cache
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from demand_batch import DemandBatch
+
+
+def build_demand_index(file_path: str) -> Dict[int, List[Dict]]:
+    """
+    Parse the flow CSV once and index its rows by time step.
+
+    "T12" rows end up under key 12, each as a {"start", "end", "flow", "distance"} dict.
+    """
+    data = pd.read_csv(file_path)
+    data["step"] = data["Time"].str[1:].astype(int)
+    data["flow"] = data["flow"].astype(int)
+    data["distance"] = data["distance"].astype(float)
+
+    return {
+        int(step): group[["start", "end", "flow", "distance"]].to_dict("records")
+        for step, group in data.groupby("step", sort=True)
+    }
+
+
+@lru_cache(maxsize=None)
+def load_demand_index(file_path: str) -> Dict[int, List[Dict]]:
+    """Memoised `build_demand_index`, so repeated callers share one parse per file."""
+    return build_demand_index(file_path)
+
+
+def build_demand_batches(file_path: str, names: Sequence[str]) -> Dict[int, DemandBatch]:
+    """
+    Parse the flow CSV once into one DemandBatch per time step.
+
+    The rows are sorted by step once; every step's batch is a view into those arrays.
+    """
+    data = pd.read_csv(file_path)
+    code = {name: i for i, name in enumerate(names)}
+    step = data["Time"].str[1:].astype(int).to_numpy()
+    order = np.argsort(step, kind="stable")
+
+    start = data["start"].map(code)
+    end = data["end"].map(code)
+    if start.isna().any() or end.isna().any():
+        raise ValueError(f"{file_path} has vertiports that are not in the distance matrix.")
+
+    step = step[order]
+    start = start.to_numpy()[order]
+    end = end.to_numpy()[order]
+    flow = data["flow"].to_numpy(dtype=np.int64)[order]
+    distance = data["distance"].to_numpy(dtype=np.float64)[order]
+
+    batches = DemandBatch(names, start, end, flow, distance)
+    steps, first = np.unique(step, return_index=True)
+    bounds = list(first) + [len(step)]
+    return {int(s): batches[bounds[i]:bounds[i + 1]] for i, s in enumerate(steps)}
+
+
+def load_demand_scenario(file_path: str, names: Sequence[str]) -> Dict[int, DemandBatch]:
+    """
+    Load a columnar scenario written by `scenario_generator.generate_scenarios`.
+
+    Same result as `build_demand_batches`; vertiport codes are remapped to `names`.
+    """
+    data = np.load(file_path)
+    code = {name: i for i, name in enumerate(names)}
+    remap = np.array([code[name] for name in data["names"]], dtype=np.int32)
+
+    step = data["step"]
+    order = np.argsort(step, kind="stable")
+    step = step[order]
+    batches = DemandBatch(names, remap[data["start"][order]], remap[data["end"][order]],
+                          data["flow"][order], data["distance"][order])
+    steps, first = np.unique(step, return_index=True)
+    bounds = list(first) + [len(step)]
+    return {int(s): batches[bounds[i]:bounds[i + 1]] for i, s in enumerate(steps)}
+
+
+def demand_window(demand_index: Dict, t: int, lookahead: int = 0):
+    """Demand of step t plus the following `lookahead` steps."""
+    steps = [demand_index[step] for step in range(t, t + lookahead + 1) if step in demand_index]
+    if steps and isinstance(steps[0], DemandBatch):
+        return steps[0] if len(steps) == 1 else DemandBatch.concat(steps)
+    window = []
+    for demand in steps:
+        window.extend(demand)
+    return window
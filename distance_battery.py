@@ -1,5 +1,11 @@
-def battery_consumption_required(distance: float, discharge_rate: float) -> float:
-    """Calculates the battery percentage required to travel a given distance."""
+def battery_consumption_required(distance: float, discharge_rate, payload: float = 0) -> float:
+    """
+    Calculates the battery percentage required to travel a given distance.
+    `discharge_rate` is the battery used per unit distance, or a `battery_model.BatteryModel`
+    (which also accounts for `payload`; a plain rate ignores it).
+    """
+    if hasattr(discharge_rate, "consumption"):
+        return discharge_rate.consumption(distance, payload)
     return distance * discharge_rate
 
 
@@ -11,10 +17,15 @@ import pandas as pd
 
 # Load the distance matrix from the file
 distance_data = pd.read_csv('distance_matrix.csv', index_col=0)
+# Flattened once so per-route lookups don't go through DataFrame.loc
+distance_lookup = {(loc1, loc2): float(d) for (loc1, loc2), d in distance_data.stack().items()}
+# Vertiport order used for DemandBatch codes, and the matching code x code distance table
+vertiport_names = tuple(distance_data.index)
+distance_table = distance_data.loc[list(vertiport_names), list(vertiport_names)].to_numpy(dtype=float)
 
 def calculate_distance(loc1: str, loc2: str) -> float:
     """Returns the distance between two points from the distance matrix."""
-    if loc1 in distance_data.index and loc2 in distance_data.columns:
-        return distance_data.loc[loc1, loc2]
+    if (loc1, loc2) in distance_lookup:
+        return distance_lookup[(loc1, loc2)]
     else:
         raise ValueError(f"Distance between {loc1} and {loc2} not found.")
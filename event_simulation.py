@@ -0,0 +1,192 @@
+import heapq
+import math
+from collections import deque
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from demand_batch import DemandBatch
+from distance_battery import calculate_distance, distance_table
+from metrics import calculate_coverage_rate, calculate_demand_met
+from task_assignment import time_step_path_assignment
+
+# Event kinds, in the order they are handled at equal times
+ARRIVAL = 0
+CHARGE_COMPLETE = 1
+DEPARTURE = 2
+CHARGE_CHECK = 3  # a vehicle left idle by the dispatch at this step starts charging
+
+
+class EventSimulation:
+    """
+    Event-driven fleet simulation.
+
+    Instead of advancing every step, the engine pops events from a priority queue:
+    departures (dispatch epochs at the steps where demand is released or waiting),
+    arrivals and charge completions. Steps with nothing to do are never visited.
+
+    Flight durations come from `distance_matrix.csv` divided by `speed` (distance units per
+    step); with `speed=None` every flight takes exactly one step. Each vertiport has
+    `vertiport_states[v]["avail"]` chargers; vehicles beyond that wait in a FIFO queue.
+    With one-step flights and enough chargers this follows the `run_iterations` step rules:
+    a flight dispatched at step t is standby at its destination at step t + 1, a vehicle
+    below `charge_below` that is not dispatched then starts charging (as `reset_plane_status`
+    does), and a charging vehicle gains `charging_rate` per step until full. A
+    `battery_model.BatteryModel` may be passed as both rates; charge completions are then
+    timed from its charge curve.
+    """
+
+    def __init__(self, plane_status: Dict, vertiport_states: Dict, demand_per_step, charging_rate: float,
+                 discharge_rate: float, distance_file: str = "distance_matrix.csv", speed: Optional[float] = None,
+                 charge_below: float = 100, dispatch: str = "greedy"):
+        self.plane_status = plane_status
+        self.vertiport_states = vertiport_states
+        self.demand_per_step = demand_per_step
+        self.charging_rate = charging_rate
+        self.discharge_rate = discharge_rate
+        self.speed = speed
+        self.charge_below = charge_below
+        self.dispatch = dispatch
+
+        self.flight_distance = pd.read_csv(distance_file, index_col=0)
+        self.chargers_in_use = {v: 0 for v in vertiport_states}
+        self.charge_queue = {v: deque() for v in vertiport_states}
+        self.unmet_demand = []
+        self.records = []
+
+        self._events = []
+        self._seq = 0
+        self._scheduled_departures = set()
+
+    def schedule(self, time: float, kind: int, payload=None):
+        heapq.heappush(self._events, (time, kind, self._seq, payload))
+        self._seq += 1
+
+    def flight_duration(self, start: str, end: str) -> float:
+        if self.speed is None:
+            return 1.0
+        return self.flight_distance.loc[start, end] / self.speed
+
+    def _schedule_departure(self, step: int):
+        if step not in self._scheduled_departures:
+            self._scheduled_departures.add(step)
+            self.schedule(step, DEPARTURE, step)
+
+    def _release_steps(self):
+        if isinstance(self.demand_per_step, dict):
+            return sorted(self.demand_per_step)
+        return range(len(self.demand_per_step))
+
+    def _step_demand(self, step: int):
+        if isinstance(self.demand_per_step, dict):
+            demand = self.demand_per_step.get(step, [])
+        else:
+            demand = self.demand_per_step[step] if step < len(self.demand_per_step) else []
+        if isinstance(demand, DemandBatch):
+            return DemandBatch.concat([
+                demand, DemandBatch.from_tuples(self.unmet_demand, demand.names, distance_table)
+            ])
+        return list(demand) + [
+            {"start": start, "end": end, "flow": needed, "distance": calculate_distance(start, end)}
+            for start, end, needed in self.unmet_demand
+        ]
+
+    # --- charging -----------------------------------------------------------------
+
+    def _request_charge(self, time: float, vehicle_id: str):
+        status = self.plane_status[vehicle_id]
+        location = status["location"]
+        status["status"] = "charging"
+        if self.chargers_in_use[location] < self.vertiport_states[location]["avail"]:
+            self._start_charge(time, vehicle_id)
+        else:
+            self.charge_queue[location].append(vehicle_id)
+
+    def _start_charge(self, time: float, vehicle_id: str):
+        status = self.plane_status[vehicle_id]
+        self.chargers_in_use[status["location"]] += 1
+        if hasattr(self.charging_rate, "charge_time"):
+            duration = float(self.charging_rate.charge_time(status["battery"]))
+        else:
+            duration = max(0.0, 100 - status["battery"]) / self.charging_rate
+        self.schedule(time + duration, CHARGE_COMPLETE, vehicle_id)
+
+    def _on_charge_complete(self, time: float, vehicle_id: str):
+        status = self.plane_status[vehicle_id]
+        status["battery"] = 100
+        status["status"] = "standby"
+        location = status["location"]
+        self.chargers_in_use[location] -= 1
+        if self.charge_queue[location]:
+            self._start_charge(time, self.charge_queue[location].popleft())
+        if self.unmet_demand:
+            self._schedule_departure(math.ceil(time))
+
+    # --- flights ------------------------------------------------------------------
+
+    def _on_arrival(self, time: float, vehicle_id: str):
+        status = self.plane_status[vehicle_id]
+        status["status"] = "standby"
+        step = math.ceil(time)
+        if self.unmet_demand:
+            self._schedule_departure(step)
+        if status["battery"] < self.charge_below:
+            self.schedule(step, CHARGE_CHECK, vehicle_id)
+
+    def _on_charge_check(self, time: float, vehicle_id: str):
+        status = self.plane_status[vehicle_id]
+        if status["status"] == "standby" and status["battery"] < self.charge_below:
+            self._request_charge(time, vehicle_id)
+
+    def _on_departure(self, step: int):
+        demand = self._step_demand(step)
+        vehicle_movements = {}
+        self.unmet_demand = []
+        time_step_path_assignment(demand, {}, self.vertiport_states, self.unmet_demand, self.discharge_rate,
+                                  vehicle_movements, self.plane_status, dispatch=self.dispatch)
+
+        for vehicle_id, (start, end) in vehicle_movements.items():
+            self.schedule(step + self.flight_duration(start, end), ARRIVAL, vehicle_id)
+
+        # Same demand accounting as run_iterations
+        total_met_demand, total_demand = calculate_demand_met(demand, vehicle_movements, self.unmet_demand)
+        self.records.append({
+            "step": step,
+            "dispatched": len(vehicle_movements),
+            "total_demand": total_demand,
+            "met_demand": total_met_demand,
+            "coverage_rate": calculate_coverage_rate(total_met_demand, total_demand),
+        })
+
+    # --- main loop ----------------------------------------------------------------
+
+    def run(self, until: Optional[float] = None) -> List[Dict]:
+        """
+        Process events up to (excluding) time `until`.
+
+        :return: One record per dispatch epoch with dispatched vehicles, demand and coverage.
+        """
+        for step in self._release_steps():
+            if until is None or step < until:
+                self._schedule_departure(step)
+        for vehicle_id, status in self.plane_status.items():
+            if status["status"] == "in_service":
+                self.schedule(0, ARRIVAL, vehicle_id)
+            elif status["battery"] < self.charge_below:
+                self.schedule(0, CHARGE_CHECK, vehicle_id)
+
+        handlers = {
+            ARRIVAL: self._on_arrival,
+            CHARGE_COMPLETE: self._on_charge_complete,
+            CHARGE_CHECK: self._on_charge_check,
+        }
+        while self._events:
+            time, kind, _, payload = self._events[0]
+            if until is not None and time >= until:
+                break
+            heapq.heappop(self._events)
+            if kind == DEPARTURE:
+                self._on_departure(payload)
+            else:
+                handlers[kind](time, payload)
+        return self.records
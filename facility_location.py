@@ -0,0 +1,407 @@
+import argparse
+import heapq
+import time
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from matrix_model import flatten_orders, grid_manhattan
+from vertiport_locator import cell_centres
+
+
+class FacilityLocationResult(NamedTuple):
+    open: List[int]      # indices of the activated candidates
+    cost: float          # routing cost plus activation penalties
+    start: np.ndarray    # take-off candidate index per order
+    end: np.ndarray      # landing candidate index per order
+
+
+class PairFacilityLocation:
+    """
+    Heuristic for choosing which vertiports to activate.
+
+    Every order flies from one open vertiport p to another open q != p at
+    ground_start[o, p] + air[p, q] + ground_end[o, q], and every open vertiport costs
+    `activation_penalty`: the objective of the kmeans_OD MILPs with z left free.
+
+    For an open set S two (orders x candidates) tables are kept: the cheapest air leg plus
+    egress when taking off at x, and the cheapest access plus air leg when landing at x.
+    With them the cost of adding any candidate is one vectorised min, so greedy steps, swap
+    moves and full re-evaluations never loop over pairs in Python.
+    """
+
+    def __init__(self, ground_start: np.ndarray, air: np.ndarray, ground_end: np.ndarray,
+                 activation_penalty: float, weights: Optional[np.ndarray] = None):
+        self.ground_start = np.asarray(ground_start, dtype=float)
+        self.ground_end = np.asarray(ground_end, dtype=float)
+        self.air = np.array(air, dtype=float)
+        np.fill_diagonal(self.air, np.inf)  # p == q is not a flight
+        self.penalty = float(activation_penalty)
+        self.weights = np.ones(len(self.ground_start)) if weights is None else np.asarray(weights, dtype=float)
+
+    # --- cost tables --------------------------------------------------------------
+
+    def _tables(self, open_set: Sequence[int], columns=slice(None)):
+        n_orders = len(self.ground_start)
+        n_columns = len(self.air[0, columns])
+        take_off = np.full((n_orders, n_columns), np.inf)
+        landing = np.full((n_orders, n_columns), np.inf)
+        for c in open_set:
+            self._add(take_off, landing, c, columns)
+        return take_off, landing
+
+    def _add(self, take_off, landing, c, columns=slice(None)):
+        np.minimum(take_off, self.air[columns, c][None, :] + self.ground_end[:, c][:, None], out=take_off)
+        np.minimum(landing, self.ground_start[:, c][:, None] + self.air[c, columns][None, :], out=landing)
+
+    def _route_costs(self, open_set: Sequence[int], take_off: np.ndarray) -> np.ndarray:
+        idx = list(open_set)
+        if not idx:
+            return np.full(len(self.ground_start), np.inf)
+        return (self.ground_start[:, idx] + take_off[:, idx]).min(axis=1)
+
+    def order_costs(self, open_set: Sequence[int]) -> np.ndarray:
+        """Cheapest route of every order through the open set (inf with fewer than two open)."""
+        idx = list(open_set)
+        costs = np.full(len(self.ground_start), np.inf)
+        ground_end = self.ground_end[:, idx]
+        for p in idx:
+            np.minimum(costs, self.ground_start[:, p] + (self.air[p, idx][None, :] + ground_end).min(axis=1), out=costs)
+        return costs
+
+    def total_cost(self, open_set: Sequence[int]) -> float:
+        return float(self.weights @ self.order_costs(open_set)) + self.penalty * len(open_set)
+
+    def _costs_with(self, current, take_off, landing, c) -> np.ndarray:
+        """Per-order cost after opening candidate c."""
+        via_c = np.minimum(self.ground_start[:, c] + take_off[:, c], landing[:, c] + self.ground_end[:, c])
+        return np.minimum(current, via_c)
+
+    def _routing_with_each(self, current, take_off, landing) -> np.ndarray:
+        """Weighted routing cost after opening each candidate, for all candidates at once."""
+        via = np.minimum(self.ground_start + take_off, landing + self.ground_end)
+        return self.weights @ np.minimum(current[:, None], via)
+
+    # --- search -------------------------------------------------------------------
+
+    def best_pair(self, open_set: Sequence[int] = (), current: Optional[np.ndarray] = None,
+                  pair_budget: float = 1e7):
+        """
+        Best pair of closed candidates to open together, on top of `open_set` whose per-order
+        costs are `current` (nothing open by default).
+
+        A lone vertiport serves no one, so single-candidate savings miss new take-off/landing
+        pairs. Pairs are compared exactly among the m closed candidates that would serve the
+        orders best as both ends, where orders x m^2 stays within `pair_budget`.
+        :return: (routing cost with the pair open, a, b); inf cost if fewer than two are closed.
+        """
+        n_orders, n_candidates = self.ground_start.shape
+        if current is None:
+            current = np.full(n_orders, np.inf)
+        score = self.weights @ np.minimum(current[:, None], self.ground_start + self.ground_end)
+        score[list(open_set)] = np.inf
+        m = min(n_candidates - len(open_set), max(2, int(np.sqrt(pair_budget / max(n_orders, 1)))))
+        if m < 2:
+            return np.inf, -1, -1
+        shortlist = np.argsort(score, kind="stable")[:m]
+
+        gs, ge = self.ground_start[:, shortlist], self.ground_end[:, shortlist]
+        air = self.air[np.ix_(shortlist, shortlist)]
+        base = np.broadcast_to(current[:, None], gs.shape)
+        if len(open_set):
+            take_off, landing = self._tables(open_set, shortlist)
+            via = np.minimum(gs + take_off, landing + ge)
+            base = np.minimum(base, via)
+        totals = np.empty((m, m))
+        for a in range(m):
+            forward = gs[:, a][:, None] + air[a][None, :] + ge
+            backward = gs + air[:, a][None, :] + ge[:, a][:, None]
+            either = np.minimum(base[:, a][:, None], base)
+            totals[a] = self.weights @ np.minimum(either, np.minimum(forward, backward))
+        np.fill_diagonal(totals, np.inf)
+        a, b = np.unravel_index(np.argmin(totals), totals.shape)
+        return float(totals[a, b]), int(shortlist[a]), int(shortlist[b])
+
+    def greedy(self, max_open: Optional[int] = None) -> List[int]:
+        """
+        Lazy greedy: open the candidate with the largest saving while it exceeds the penalty.
+
+        Savings are re-evaluated only when a candidate reaches the top of the heap. The pair
+        objective is not submodular (a vertiport is worth more once a partner is open), so stale
+        bounds can be low: before stopping all savings are recomputed, and the best pair of new
+        vertiports is tried as well.
+        """
+        _, first, second = self.best_pair()
+        open_set = [first, second]
+        take_off, landing = self._tables(open_set)
+        current = self._route_costs(open_set, take_off)
+        routing = float(self.weights @ current)
+
+        def fresh_heap():
+            gains = routing - self._routing_with_each(current, take_off, landing)
+            heap = [(-gain, c) for c, gain in enumerate(gains) if c not in open_set]
+            heapq.heapify(heap)
+            return heap
+
+        heap = fresh_heap()
+        stale = False
+        while max_open is None or len(open_set) < max_open:
+            if heap:
+                _, c = heapq.heappop(heap)
+                costs = self._costs_with(current, take_off, landing, c)
+                gain = routing - float(self.weights @ costs)
+                if heap and gain < -heap[0][0]:
+                    heapq.heappush(heap, (-gain, c))  # 上界已过时, 放回
+                    continue
+                if gain > self.penalty:
+                    open_set.append(c)
+                    current, routing = costs, float(self.weights @ costs)
+                    self._add(take_off, landing, c)
+                    stale = True
+                    continue
+            # 起降点成对起作用: 停止前重新计算全部收益, 并尝试同时启用一对
+            if stale:
+                heap, stale = fresh_heap(), False
+                if heap and -heap[0][0] > self.penalty:
+                    continue
+            if max_open is not None and len(open_set) + 2 > max_open:
+                break
+            pair_routing, a, b = self.best_pair(open_set, current)
+            if routing - pair_routing <= 2 * self.penalty:
+                break
+            for c in (a, b):
+                current = self._costs_with(current, take_off, landing, c)
+                self._add(take_off, landing, c)
+                open_set.append(c)
+            routing = float(self.weights @ current)
+            heap, stale = fresh_heap(), False
+        return open_set
+
+    def _ranked_tables(self, open_set: Sequence[int], columns: np.ndarray, landing: bool = True):
+        """
+        Best value, its open vertiport and second-best value of both tables (only take-off
+        without `landing`) on `columns`, so that the tables of the open set minus any one
+        vertiport s are a `where(arg == s, second, best)` away.
+        """
+        shape = (len(self.ground_start), len(columns))
+        legs = [lambda q: self.air[columns, q][None, :] + self.ground_end[:, q][:, None]]
+        if landing:
+            legs.append(lambda q: self.ground_start[:, q][:, None] + self.air[q, columns][None, :])
+        tables = []
+        for leg in legs:
+            best = np.full(shape, np.inf)
+            second = np.full(shape, np.inf)
+            arg = np.full(shape, -1, dtype=np.int32)
+            for q in open_set:
+                value = leg(q)
+                np.minimum(second, np.maximum(best, value), out=second)
+                better = value < best
+                np.copyto(best, value, where=better)
+                arg[better] = q
+            tables.append((best, arg, second))
+        return tables
+
+    def _neighbours(self, open_set: Sequence[int], count: int) -> List[np.ndarray]:
+        """The `count` closed candidates closest by flight cost to each open vertiport."""
+        closed = np.ones(len(self.air), dtype=bool)
+        closed[list(open_set)] = False
+        count = min(count, int(closed.sum()))
+        neighbours = []
+        for s in open_set:
+            distance = np.where(closed, self.air[s], np.inf)
+            neighbours.append(np.argpartition(distance, count - 1)[:count] if count else np.empty(0, dtype=np.int64))
+        return neighbours
+
+    def _combine(self, open_set: List[int], best: float, single, replacements, start, end):
+        """
+        Apply several improving replacements (cost, s, c) at once, c None for a drop, if the
+        orders routed through the replaced vertiports do not overlap and the exact cost of the
+        result beats `single`, the best one-move (cost, open set). Returns the better of the two.
+        """
+        used = np.zeros(len(start), dtype=bool)
+        removed, added = [], []
+        for cost, s, c in sorted(replacements, key=lambda move: move[0]):
+            if cost >= best - 1e-9:
+                break
+            if c in added or (c is None and len(open_set) - len(removed) + len(added) <= 2):
+                continue
+            affected = (start == s) | (end == s)
+            if not used[affected].any():
+                used |= affected
+                removed.append(s)
+                if c is not None:
+                    added.append(c)
+        if len(removed) > 1:
+            candidate = [c for c in open_set if c not in removed] + added
+            cost = self.total_cost(candidate)
+            if cost < single[0]:
+                return cost, candidate
+        return single
+
+    def _drop_move(self, open_set: List[int], best: float):
+        """
+        Cheapest (cost, open set) reachable by dropping open vertiports.
+
+        Every single drop is priced from one take-off table over the open columns, and
+        non-overlapping improving drops are combined, so the vertiports greedy opened early and
+        later made redundant go in a few rounds.
+        """
+        if len(open_set) < 3:
+            return np.inf, open_set
+        columns = np.sort(np.asarray(open_set))
+        ground_start = self.ground_start[:, columns]
+        (take_off, take_off_arg, take_off2), = self._ranked_tables(open_set, columns, landing=False)
+        first = (ground_start + take_off).argmin(axis=1)
+        start, end = columns[first], take_off_arg[np.arange(len(first)), first]
+
+        drops = []
+        for s in open_set:
+            via = ground_start + np.where(take_off_arg == s, take_off2, take_off)
+            via[:, columns == s] = np.inf
+            drops.append((float(self.weights @ via.min(axis=1)) + self.penalty * (len(open_set) - 1), s, None))
+        cost, s, _ = min(drops, key=lambda move: move[0])
+        return self._combine(open_set, best, (cost, [c for c in open_set if c != s]), drops, start, end)
+
+    def _best_move(self, open_set: List[int], best: float, neighbours: int, max_open: Optional[int] = None):
+        """
+        Cheapest (cost, open set) reachable by adding one of the open vertiports' neighbours or
+        the best new pair, dropping an open vertiport, or swapping it for one of its own
+        neighbours; non-overlapping improving drops and swaps are combined.
+
+        Only the open and neighbouring columns are evaluated, so a round costs
+        orders x open x (open + neighbours) rather than orders x open x candidates.
+        """
+        near = self._neighbours(open_set, neighbours)
+        columns = np.unique(np.concatenate([np.asarray(open_set)] + near))
+        local_open = np.searchsorted(columns, open_set)
+        ground_start, ground_end = self.ground_start[:, columns], self.ground_end[:, columns]
+        (take_off, take_off_arg, take_off2), (landing, landing_arg, landing2) = self._ranked_tables(open_set, columns)
+        via_open = ground_start[:, local_open] + take_off[:, local_open]
+        first = via_open.argmin(axis=1)
+        current = via_open[np.arange(len(first)), first]
+        start, end = np.asarray(open_set)[first], take_off_arg[np.arange(len(first)), local_open[first]]
+
+        k = len(open_set)
+        moves = []
+        closed = np.setdiff1d(np.arange(len(columns)), local_open)
+        if len(closed) and (max_open is None or k < max_open):
+            via = np.minimum(ground_start[:, closed] + take_off[:, closed], landing[:, closed] + ground_end[:, closed])
+            totals = self.weights @ np.minimum(current[:, None], via)
+            i = int(np.argmin(totals))
+            moves.append((float(totals[i]) + self.penalty * (k + 1), open_set + [int(columns[closed[i]])]))
+        if max_open is None or k + 2 <= max_open:
+            pair_routing, a, b = self.best_pair(open_set, current)
+            moves.append((pair_routing + self.penalty * (k + 2), open_set + [a, b]))
+        replacements = []
+        for n, (s, s_near) in enumerate(zip(open_set, near)):
+            # 只取剩余开放列和 s 的邻居列
+            local = np.concatenate([np.delete(local_open, n), np.searchsorted(columns, s_near)])
+            rest_take_off = np.where(take_off_arg[:, local] == s, take_off2[:, local], take_off[:, local])
+            via_start = ground_start[:, local] + rest_take_off
+            rest_current = via_start[:, :k - 1].min(axis=1)
+            if k > 2:
+                replacements.append((float(self.weights @ rest_current) + self.penalty * (k - 1), s, None))
+            if len(s_near):
+                near_local = local[k - 1:]
+                rest_landing = np.where(landing_arg[:, near_local] == s, landing2[:, near_local], landing[:, near_local])
+                via = np.minimum(via_start[:, k - 1:], rest_landing + ground_end[:, near_local])
+                totals = self.weights @ np.minimum(rest_current[:, None], via)
+                i = int(np.argmin(totals))
+                replacements.append((float(totals[i]) + self.penalty * k, s, int(s_near[i])))
+        for cost, s, c in replacements:
+            moves.append((cost, [x for x in open_set if x != s] + ([] if c is None else [c])))
+        single = min(moves, key=lambda move: move[0], default=(np.inf, open_set))
+        return self._combine(open_set, best, single, replacements, start, end)
+
+    def local_search(self, open_set: List[int], max_rounds: int = 100, neighbours: int = 20,
+                     max_open: Optional[int] = None) -> List[int]:
+        """
+        Improving moves until none lowers the objective. Drops are cheap to evaluate and clear
+        out what greedy opened early, so add / pair-add / swap moves are only evaluated once no
+        drop helps.
+        """
+        open_set = list(open_set)
+        best = self.total_cost(open_set)
+        for _ in range(max_rounds):
+            cost, candidate = self._drop_move(open_set, best)
+            if cost >= best - 1e-9:
+                cost, candidate = self._best_move(open_set, best, neighbours, max_open)
+            if cost >= best - 1e-9:
+                break
+            best, open_set = cost, candidate
+        return open_set
+
+    def assign(self, open_set: Sequence[int]):
+        """Cheapest (take-off, landing) of every order within the open set."""
+        idx = np.array(open_set)
+        pair_cost = (self.ground_start[:, idx][:, :, None] + self.air[np.ix_(idx, idx)][None, :, :]
+                     + self.ground_end[:, idx][:, None, :])
+        a, b = np.divmod(pair_cost.reshape(len(pair_cost), -1).argmin(axis=1), len(idx))
+        return idx[a], idx[b]
+
+    def solve(self, max_open: Optional[int] = None, swap_rounds: int = 100,
+              neighbours: int = 20) -> FacilityLocationResult:
+        open_set = self.local_search(self.greedy(max_open), swap_rounds, neighbours, max_open)
+        start, end = self.assign(open_set)
+        return FacilityLocationResult(sorted(open_set), self.total_cost(open_set), start, end)
+
+
+def haversine_matrix(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    phi = np.radians(lat)
+    dphi = phi[None, :] - phi[:, None]
+    dlambda = np.radians(lon)[None, :] - np.radians(lon)[:, None]
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi)[:, None] * np.cos(phi)[None, :] * np.sin(dlambda / 2) ** 2
+    return 6371 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def grid_cell_problem(time_intervals, orders, grid_width: int, ground_cost: float, air_cost: float,
+                      activation_penalty: float):
+    """
+    Every occupied grid cell (any order origin or destination) as a candidate vertiport.
+
+    Orders with the same (origin, destination) cost the same wherever they occur, so they are
+    merged into one weighted row. :return: (problem, candidate cells).
+    """
+    _, _, origin, destination, _ = flatten_orders(time_intervals, orders)
+    od, weights = np.unique(np.stack([origin, destination], axis=1), axis=0, return_counts=True)
+    cells = np.unique(od)
+    lat, lon = cell_centres(cells, grid_width)
+    problem = PairFacilityLocation(
+        grid_manhattan(od[:, 0], cells, grid_width) * ground_cost,
+        haversine_matrix(lat, lon) * air_cost,
+        grid_manhattan(od[:, 1], cells, grid_width) * ground_cost,
+        activation_penalty, weights,
+    )
+    return problem, cells
+
+
+if __name__ == "__main__":
+    from kmeans_OD_batch import GRID_WIDTH, MAX_TIME_INTERVALS, activation_penalty, air_cost, ground_cost, load_orders
+
+    parser = argparse.ArgumentParser(description="Choose vertiports among all occupied grid cells.")
+    parser.add_argument("--odflow_file", default="hh-odflow.npz")
+    parser.add_argument("--max_intervals", type=int, default=MAX_TIME_INTERVALS)
+    parser.add_argument("--max_open", type=int, default=None, help="upper bound on activated vertiports")
+    parser.add_argument("--swap_rounds", type=int, default=100)
+    parser.add_argument("--neighbours", type=int, default=20, help="swap candidates per open vertiport")
+    parser.add_argument("--output_file", default="heuristic_vertiports.csv")
+    args = parser.parse_args()
+
+    time_intervals, orders = load_orders(args.odflow_file, args.max_intervals)
+    begin = time.perf_counter()
+    problem, cells = grid_cell_problem(time_intervals, orders, GRID_WIDTH, ground_cost, air_cost,
+                                       activation_penalty)
+    result = problem.solve(args.max_open, args.swap_rounds, args.neighbours)
+    print(f"{len(cells)} 个候选网格, {len(problem.weights)} 组 OD, 激活 {len(result.open)} 个停机坪, "
+          f"目标值 {result.cost:.2f}, 用时 {time.perf_counter() - begin:.2f} 秒")
+
+    grid_ids = cells[result.open]
+    lat, lon = cell_centres(grid_ids, GRID_WIDTH)
+    pd.DataFrame({
+        "Vertiport": [f"Vertiport_{i + 1}" for i in range(len(grid_ids))],
+        "Latitude": lat,
+        "Longitude": lon,
+        "Grid_ID": grid_ids,
+    }).to_csv(args.output_file, index=False)
+    print(f"结果已保存至 '{args.output_file}'")
@@ -1,13 +1,43 @@
-from typing import List, Dict
-from distance_battery import calculate_distance
-from gurobi_solver import solve_gurobi
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional
+from distance_battery import calculate_distance, distance_table
+from gurobi_solver import solve_gurobi, solve_k_best
+from solution_cache import demand_fingerprint
+from demand_index import load_demand_index, demand_window
+from demand_batch import DemandBatch
+
+def _combined_demand(t: int, unmet_demand: List, demand_index: Optional[Dict[int, List[Dict]]],
+                     lookahead: int):
+    """Unmet demand plus the new demand of step t (and the lookahead window)."""
+    # 只取当前时间步（及前瞻窗口）的新需求
+    if demand_index is None:
+        demand_index = load_demand_index("updated_flow_data_with_vertiports.csv")
+    new_demand = demand_window(demand_index, t, lookahead)
+
+    # 合并上一轮未满足的需求和新需求; 未满足需求账本直接给出按路线合并的视图
+    if isinstance(new_demand, DemandBatch):
+        if hasattr(unmet_demand, "as_batch") and unmet_demand.names == new_demand.names:
+            carried = unmet_demand.as_batch()
+        else:
+            carried = DemandBatch.from_tuples(unmet_demand, new_demand.names, distance_table)
+        return DemandBatch.concat([carried, new_demand])
+    return [
+        {"start": d[0], "end": d[1], "flow": d[2], "distance": calculate_distance(d[0], d[1])}
+        for d in unmet_demand
+    ] + new_demand
+
+
+def fallback_problem(t: int, unmet_demand: List, demand_index: Optional[Dict[int, List[Dict]]], lookahead: int,
+                     solver_params: Dict):
+    """(combined demand, cache key) of the fallback solve of step t."""
+    combined_demand = _combined_demand(t, unmet_demand, demand_index, lookahead)
+    key = demand_fingerprint(combined_demand, banned_solutions=None, solver_params=solver_params)
+    return combined_demand, key
 
-import pandas as pd
-from typing import List, Dict
-from distance_battery import calculate_distance
 
 def regenerate_solution(t: int, unmet_demand: List, vehicle_states: Dict, vertiport_states: Dict,
-                        original_solution: List[Dict], get_second_best:bool) -> List[Dict]:
+                        original_solution: List[Dict], get_second_best:bool, cache=None,
+                        demand_index: Optional[Dict[int, List[Dict]]] = None, lookahead: int = 0) -> List[Dict]:
     """
     Regenerate a new Gurobi solution, optionally retrieving the second-best solution.
 
@@ -16,28 +46,138 @@ def regenerate_solution(t: int, unmet_demand: List, vehicle_states: Dict, vertip
     :param vehicle_states: Current states of vehicles.
     :param vertiport_states: Current states of vertiports.
     :param original_solution: The original solution to ban.
+    :param cache: Optional SolutionCache; a hit skips the solver.
+    :param demand_index: Per-step demand from `build_demand_index`; parsed from the default CSV if omitted.
+    :param lookahead: Number of steps after t whose demand is also passed to the solver.
     :return: A new solution that excludes the banned solution.
     """
     print(f"Regenerating solution for iteration {t + 1}...")
 
-    # 读取当前时间步的新需求（从CSV文件中）
-    csv_file_path = "updated_flow_data_with_vertiports.csv"
-    data = pd.read_csv(csv_file_path)
+    combined_demand, key = fallback_problem(t, unmet_demand, demand_index, lookahead, {"get_second_best": False})
 
-    # 创建新需求列表
-    new_demand = [
-        {"start": row["start"], "end": row["end"], "flow": row["flow"],
-        "distance": row["distance"]}
-        for _, row in data.iterrows()
-    ]
-
-    # 合并上一轮未满足的需求和新需求
-    combined_demand = [
-        {"start": d[0], "end": d[1], "flow": d[2], "distance": calculate_distance(d[0], d[1])}
-        for d in unmet_demand
-    ] + new_demand
+    # 命中缓存时直接返回，跳过求解
+    if cache is not None:
+        cached_solution = cache.get(key)
+        if cached_solution is not None:
+            print("Reusing cached solution.")
+            return cached_solution
 
     # Call the Gurobi solver and request the second-best solution
     new_solution = solve_gurobi(combined_demand, banned_solutions=None,get_second_best=False)
 
+    if cache is not None:
+        cache.put(key, new_solution)
+
     return new_solution
+
+
+def regenerate_k_best(t: int, unmet_demand: List, vehicle_states: Dict, vertiport_states: Dict,
+                      original_solution: List[Dict], k: int = 5, diversity: int = 1, cache=None,
+                      demand_index: Optional[Dict[int, List[Dict]]] = None, lookahead: int = 0):
+    """
+    Solve once for up to k ranked alternatives, so retries can walk them without re-solving.
+
+    Takes the same arguments as `regenerate_solution`, plus k and diversity for `solve_k_best`.
+    :return: KBestSolutions ranked by objective.
+    """
+    print(f"Regenerating {k} alternative solutions for iteration {t + 1}...")
+
+    combined_demand, key = fallback_problem(t, unmet_demand, demand_index, lookahead, {"k": k, "diversity": diversity})
+
+    if cache is not None:
+        cached_solutions = cache.get(key)
+        if cached_solutions is not None:
+            print("Reusing cached solutions.")
+            return cached_solutions
+
+    solutions = solve_k_best(combined_demand, k, diversity)
+
+    if cache is not None:
+        cache.put(key, solutions)
+
+    return solutions
+
+
+def _solve_fallback(combined_demand):
+    """Worker-process body of a speculative `regenerate_solution` solve."""
+    return solve_gurobi(combined_demand, banned_solutions=None, get_second_best=False)
+
+
+class SpeculativeFallback:
+    """
+    `regenerate_solution` with fallback problems pre-solved in a background process.
+
+    `speculate(t, unmet_demand)` submits the problem step t would solve with that unmet demand;
+    `speculate_step(t, carried_demand)` guesses the problem of a step before it runs, assuming
+    its first pass serves nothing (the usual case when the fleet is exhausted). Calling the
+    object like `regenerate_solution` waits for a speculation with the same demand fingerprint
+    and uses it, and falls back to solving in the foreground otherwise. Speculations of earlier
+    steps are discarded once the loop has moved on; finished ones still fill the cache.
+    """
+
+    def __init__(self, cache, demand_index: Optional[Dict[int, List[Dict]]] = None, lookahead: int = 0,
+                 workers: int = 1):
+        self.cache = cache
+        self.demand_index = demand_index
+        self.lookahead = lookahead
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.pending = {}  # key -> (t, future)
+        self.submitted = 0
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def _discard(self, before: int):
+        for key, (t, future) in list(self.pending.items()):
+            if t >= before:
+                continue
+            del self.pending[key]
+            if future.done() and future.exception() is None:
+                self.cache.put(key, future.result())
+            else:
+                future.cancel()
+            self.discarded += 1
+
+    def speculate(self, t: int, unmet_demand: List):
+        """Start solving the fallback problem of step t for this unmet demand, if not known yet."""
+        self._discard(before=t)
+        combined_demand, key = fallback_problem(t, unmet_demand, self.demand_index, self.lookahead,
+                                                {"get_second_best": False})
+        if len(combined_demand) == 0 or key in self.pending or key in self.cache:
+            return
+        self.pending[key] = (t, self.executor.submit(_solve_fallback, combined_demand))
+        self.submitted += 1
+
+    def speculate_step(self, t: int, carried_demand: List):
+        """Speculate step t's fallback before it runs, assuming its first pass serves nothing."""
+        if self.demand_index is None or t not in self.demand_index:
+            return
+        demand = self.demand_index[t]
+        if isinstance(demand, DemandBatch):
+            routes = demand.iter_routes()
+        else:
+            routes = ((d["start"], d["end"], d["flow"], d["distance"]) for d in demand)
+        self.speculate(t, list(carried_demand) + [(start, end, flow) for start, end, flow, _ in routes])
+
+    def __call__(self, t: int, unmet_demand: List, vehicle_states: Dict, vertiport_states: Dict,
+                 original_solution: List[Dict], get_second_best: bool = False) -> List[Dict]:
+        self._discard(before=t)
+        _, key = fallback_problem(t, unmet_demand, self.demand_index, self.lookahead, {"get_second_best": False})
+        entry = self.pending.pop(key, None)
+        if entry is not None and entry[1].exception() is None:
+            print(f"Using speculative solution for iteration {t + 1}.")
+            solution = entry[1].result()
+            self.cache.put(key, solution)
+            self.hits += 1
+            return solution
+        self.misses += 1
+        return regenerate_solution(t, unmet_demand, vehicle_states, vertiport_states, original_solution,
+                                   get_second_best, cache=self.cache, demand_index=self.demand_index,
+                                   lookahead=self.lookahead)
+
+    def stats(self) -> Dict:
+        return {"submitted": self.submitted, "hits": self.hits, "misses": self.misses,
+                "discarded": self.discarded, "pending": len(self.pending)}
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -1,60 +1,128 @@
+import json
+import os
+
 import pandas as pd
-import geopandas as gpd
-import movingpandas as mpd
 import folium
-from folium.plugins import TimestampedGeoJson, AntPath
+from folium.plugins import TimestampedGeoJson
 from datetime import datetime
 import numpy as np
-from shapely.geometry import Point
+import shapely
 import math
 
-grid_size =  0.0089932188*1.5
+from memory_budget import MemoryReport, dense_odflow_bytes
 
-def draw_with_OSM(df,savename):
-    # the df was sorted e.g.
-    # df = df.sort_values(by=['t'], ascending=[True])
+grid_size =  0.0089932188*1.5
 
-    start_point = Point(df.longitude.iloc[0],df.latitude.iloc[0])
-    # print(start_point)
-    m = folium.Map(location=[start_point.y, start_point.x], tiles="cartodbpositron", zoom_start=14)
+def occupied_trips(df):
+    """
+    Occupied stretches of every cab's GPS trace, found without a Python loop.
+
+    :param df: GPS rows with id, latitude, longitude, occupancy and t.
+    :return: The occupied rows sorted by (id, t), with a `trip` number per stretch.
+    """
+    df = df.sort_values(by=['id', 't'], kind='stable')
+    occupied = df['occupancy'].to_numpy() == 1
+    cab = df['id'].to_numpy()
+    new_cab = np.r_[True, cab[1:] != cab[:-1]]
+    # 载客段的起点: 本行载客, 且是新车辆或上一行空车
+    starts = occupied & (new_cab | ~np.r_[False, occupied[:-1]])
+    trips = df[occupied].copy()
+    trips['trip'] = (np.cumsum(starts) - 1)[occupied]
+    return trips
+
+
+def simplified_trip_lines(trips, tolerance):
+    """
+    One Douglas-Peucker simplified LineString per trip (single-point trips are dropped).
+
+    :return: (trip numbers, lines)
+    """
+    index = trips['trip'].to_numpy()
+    keep = np.bincount(index)[index] >= 2
+    numbers, index = np.unique(index[keep], return_inverse=True)
+    lines = shapely.linestrings(trips[['longitude', 'latitude']].to_numpy()[keep], indices=index)
+    return numbers, shapely.simplify(lines, tolerance, preserve_topology=False)
+
+
+def trip_density(trips, cell_size=grid_size):
+    """Number of distinct trips passing through each grid cell, as (row, col, trips) arrays."""
+    row = np.floor(trips['latitude'].to_numpy() / cell_size).astype(np.int64)
+    col = np.floor(trips['longitude'].to_numpy() / cell_size).astype(np.int64)
+    visits = np.unique(np.stack([trips['trip'].to_numpy(), row, col], axis=1), axis=0)
+    cells, counts = np.unique(visits[:, 1:], axis=0, return_counts=True)
+    return cells[:, 0], cells[:, 1], counts
+
+
+def trips_geojson(df, tolerance=1e-4, max_trips=2000, sample_trips=500, cell_size=grid_size, precision=5, seed=0):
+    """
+    Occupied trips of `df` as one GeoJSON FeatureCollection.
+
+    Up to `max_trips` trips are all drawn as simplified lines. Above that, a density layer
+    (trips per grid cell) is drawn with a random sample of `sample_trips` trips on top, so
+    the size stays bounded for a whole fleet. Coordinates are rounded to `precision` decimals.
+    """
+    trips = occupied_trips(df)
+    numbers, lines = simplified_trip_lines(trips, tolerance)
+    cab = trips.groupby('trip')['id'].first()
+    features = []
+
+    if len(numbers) > max_trips:
+        rows, cols, counts = trip_density(trips, cell_size)
+        for row, col, count in zip(rows, cols, counts):
+            lat0, lon0 = round(row * cell_size, precision), round(col * cell_size, precision)
+            lat1, lon1 = round(lat0 + cell_size, precision), round(lon0 + cell_size, precision)
+            features.append({
+                'type': 'Feature',
+                'properties': {'kind': 'density', 'trips': int(count)},
+                'geometry': {'type': 'Polygon',
+                             'coordinates': [[[lon0, lat0], [lon1, lat0], [lon1, lat1], [lon0, lat1], [lon0, lat0]]]},
+            })
+        chosen = np.sort(np.random.default_rng(seed).choice(len(numbers), size=min(sample_trips, len(numbers)), replace=False))
+        numbers, lines = numbers[chosen], lines[chosen]
+
+    for number, line in zip(numbers, lines):
+        features.append({
+            'type': 'Feature',
+            'properties': {'kind': 'trip', 'id': str(cab[number]), 'trip': int(number)},
+            'geometry': {'type': 'LineString',
+                         'coordinates': np.round(shapely.get_coordinates(line), precision).tolist()},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def write_geojson(collection, path):
+    with open(path, 'w') as f:
+        json.dump(collection, f, separators=(',', ':'))
+
+
+def _trip_style(feature, peak):
+    if feature['properties']['kind'] == 'density':
+        share = feature['properties']['trips'] / peak
+        return {'fillColor': '#d62728', 'fillOpacity': 0.1 + 0.6 * share, 'weight': 0}
+    return {'color': '#1f77b4', 'weight': 2, 'opacity': 0.6}
+
+
+def draw_with_OSM(df, savename, tolerance=1e-4, max_trips=2000, sample_trips=500):
+    """
+    Map the occupied trips of one cab or a whole fleet.
+
+    The trips go into a single GeoJSON layer (see `trips_geojson`), written next to
+    `savename` as .geojson and drawn on an OSM map saved as `savename`.
+    """
+    collection = trips_geojson(df, tolerance, max_trips, sample_trips)
+    write_geojson(collection, os.path.splitext(savename)[0] + '.geojson')
+
+    m = folium.Map(location=[df.latitude.iloc[0], df.longitude.iloc[0]], tiles="cartodbpositron", zoom_start=14)
     m.add_child(folium.LatLngPopup())
     minimap = folium.plugins.MiniMap()
     m.add_child(minimap)
     folium.TileLayer('OpenStreetMap').add_to(m)
-    #
-    count = 0
-    for i in range(len(df)):
-
-        # print(df.occupancy.iloc[i])
-        if df.occupancy.iloc[i]==1 and start < 0:
-            start = i
-        if df.occupancy.iloc[i]==0 and start >= 0 :
-            df1 = df.iloc[start:i]
-            df1 = df1.set_index('t')
-            # print(df1)
-            gdf = gpd.GeoDataFrame(df1, geometry=gpd.points_from_xy(df1.longitude, df1.latitude), crs=4236)
-            trajs = mpd.TrajectoryCollection(gdf, 'id')
-            # start_point = trajs.trajectories[0].get_start_location()
-            # print(trajs)
-            for index, traj in enumerate(trajs.trajectories):
-                name = f"Taxi {traj.df['id'][0]}"  # 轨迹名称
-                # print(name,traj)
-                randr = lambda: np.random.randint(0, 255)
-                color = '#%02X%02X%02X' % (randr(), randr(), randr())  # black
-                # line
-                geo_col = traj.to_point_gdf().geometry
-                xy = [[y, x] for x, y in zip(geo_col.x, geo_col.y)]
-                f1 = folium.FeatureGroup(name)
-                # print(xy)
-                AntPath(locations=xy, color=color, weight=3, opacity=0.7, dash_array=[20, 30]).add_to(f1)
-                f1.add_to(m)
 
-            start = -1
-            count +=1
+    peak = max((f['properties'].get('trips', 1) for f in collection['features']), default=1)
+    folium.GeoJson(collection, name='trips', style_function=lambda feature: _trip_style(feature, peak)).add_to(m)
     folium.LayerControl().add_to(m)
-    m.get_root().render()
-    m.get_root().save("taxi_test_page.html")
-    print(count)
+    m.save(savename)
+    print(sum(f['properties']['kind'] == 'trip' for f in collection['features']))
 
 
 def extraction_data(taxi_id):
@@ -181,7 +249,15 @@ def deal_id(df):
     map_df.to_csv('value_mapping.csv', index=False)
     return df, len(value_map)
 
-def get_flow(path):
+def get_flow(path, memory_budget=None, report=None):
+    """
+    Grid the trips in `path` and aggregate them into 15-minute OD flows (h-odflow.npz).
+
+    The dense T x N x N tensor is written as `arr_0`. If it would exceed `memory_budget`
+    bytes, only the non-zero cells are written instead (keys shape, t, o, d, flow), which
+    `kmeans_OD_batch.load_orders` reads as well. Sizes are recorded in `report`.
+    """
+    report = report if report is not None else MemoryReport(memory_budget)
 
     taxi_data = pd.read_csv(path, dtype=str,index_col=False)
 
@@ -272,25 +348,30 @@ def get_flow(path):
     time = pd.DataFrame({'time': pd.date_range(f'2008-5-17 18:00:00', f'2008-6-10 01:45:00', freq=f'{0.25 * 60}min')})
 
     time = time[: -1]
-    odflow = np.zeros((len(time), lenid, lenid))
 
     group_time_odflow = nyc_taxi_data.groupby(['alignedtime', 'upid', 'offid']).size().reset_index(name='counts')
     print(group_time_odflow)
-    for index, row in time.iterrows():
-        timeslot = row['time']
-        #筛选出与当前 timeslot 相同的记录，即在当前时间段内发生的所有乘客上下车区域组合。
-        odflow_data = group_time_odflow[group_time_odflow["alignedtime"] == timeslot]
-        for i, row_ in odflow_data.iterrows():
-            o_id = int(row_['upid'])
-            d_id = int(row_['offid'])
-            count = row_['counts']
-            odflow[index, o_id, d_id] += count
-        if index % 1000==0:
-            print(f" {index}/{len(time)}")
-
+    # 每条记录对应的时间片下标，只保留落在时间范围内的记录
+    slot = ((group_time_odflow['alignedtime'] - time['time'].iloc[0]) // pd.Timedelta(minutes=15)).to_numpy()
+    inside = (slot >= 0) & (slot < len(time))
+    t_idx = slot[inside].astype(np.int64)
+    o_idx = group_time_odflow['upid'].to_numpy()[inside].astype(np.int64)
+    d_idx = group_time_odflow['offid'].to_numpy()[inside].astype(np.int64)
+    counts = group_time_odflow['counts'].to_numpy()[inside].astype(np.float64)
 
     f = f'h-odflow.npz'
-    np.savez_compressed(f, odflow)
+    dense_bytes = dense_odflow_bytes(len(time), lenid)
+    if report.fits(dense_bytes):
+        odflow = np.zeros((len(time), lenid, lenid))
+        np.add.at(odflow, (t_idx, o_idx, d_idx), counts)
+        report.record('odflow', odflow.nbytes)
+        report.strategy('odflow', 'dense')
+        np.savez_compressed(f, odflow)
+    else:
+        # 稠密张量超出内存预算，只保存非零项 (groupby 已保证每个 (t, o, d) 唯一)
+        report.record('odflow', t_idx.nbytes + o_idx.nbytes + d_idx.nbytes + counts.nbytes)
+        report.strategy('odflow', 'sparse')
+        np.savez_compressed(f, shape=np.array([len(time), lenid, lenid]), t=t_idx, o=o_idx, d=d_idx, flow=counts)
     # np.savetxt(f, odflow, delimiter=",")
     print(f)
 
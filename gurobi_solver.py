@@ -1,17 +1,43 @@
+from collections import namedtuple
 from gurobipy import Model, GRB
+import numpy as np
 
-def solve_gurobi(demand_data, banned_solutions=None, get_second_best=False):
+from demand_batch import DemandBatch
+
+
+class KBestSolutions(namedtuple("KBestSolutions", ["routes", "objectives", "flows"])):
     """
-    Solves the optimization problem with Gurobi and optionally retrieves the second-best solution.
+    Up to k solutions of one solve, ranked by objective.
 
-    :param demand_data: List of demands with start, end, flow, and distance.
-    :param banned_solutions: List of solutions to ban, each represented as [(start, end)].
-    :param get_second_best: If True, retrieves the second-best solution from the solution pool.
-    :return: List of paths representing the Gurobi solution.
+    `routes` are the demand dicts giving the column order of `flows`,
+    `objectives` has shape (m,) and `flows` has shape (m, len(routes)).
     """
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.objectives)
+
+    def solution(self, rank):
+        """The rank-th solution in the list-of-dicts format returned by `solve_gurobi`."""
+        return [
+            {"start": d["start"], "end": d["end"], "flow": float(flow), "distance": d["distance"]}
+            for d, flow in zip(self.routes, self.flows[rank])
+            if flow > 0
+        ]
+
+
+def _filter_demand(demand_data):
+    """Drop entries with non-finite or non-positive flow/distance."""
     from numpy import isfinite
 
-    # Filter invalid demand data
+    if isinstance(demand_data, DemandBatch):
+        valid = (np.isfinite(demand_data.distance)
+                 & (demand_data.flow > 0) & (demand_data.distance > 0))
+        if not valid.all():
+            print("Warning: Invalid demand data removed.")
+            print(f"Invalid entries: {demand_data[~valid].to_records()}")
+        return demand_data[valid].to_records()
+
     valid_demand_data = [
         d for d in demand_data
         if isfinite(d["flow"]) and isfinite(d["distance"]) and d["flow"] > 0 and d["distance"] > 0
@@ -19,7 +45,11 @@ def solve_gurobi(demand_data, banned_solutions=None, get_second_best=False):
     if len(valid_demand_data) != len(demand_data):
         print("Warning: Invalid demand data removed.")
         print(f"Invalid entries: {[d for d in demand_data if d not in valid_demand_data]}")
+    return valid_demand_data
+
 
+def _build_flow_model(valid_demand_data, banned_solutions=None):
+    """Build the flow model shared by `solve_gurobi` and `solve_k_best`."""
     model = Model("UAM_Optimization")
 
     # Variables: Assign flow for each demand
@@ -48,10 +78,29 @@ def solve_gurobi(demand_data, banned_solutions=None, get_second_best=False):
                     sum(flow_vars[p] for p in banned_pairs) <= len(banned_pairs) - 1,
                     f"banned_solution_{banned}"
                 )
+    return model, flow_vars
 
-    # Enable the solution pool
-    model.setParam("PoolSearchMode", 2)  # Enable the solution pool search
-    model.setParam("PoolSolutions", 2)  # Store up to 2 solutions
+
+def solve_gurobi(demand_data, banned_solutions=None, get_second_best=False):
+    """
+    Solves the optimization problem with Gurobi and optionally retrieves the second-best solution.
+
+    :param demand_data: DemandBatch or list of demands with start, end, flow, and distance.
+    :param banned_solutions: List of solutions to ban, each represented as [(start, end)].
+    :param get_second_best: If True, retrieves the second-best solution from the solution pool.
+    :return: List of paths representing the Gurobi solution.
+    """
+    from numpy import isfinite
+
+    # Filter invalid demand data
+    valid_demand_data = _filter_demand(demand_data)
+
+    model, flow_vars = _build_flow_model(valid_demand_data, banned_solutions)
+
+    # Enable the solution pool only when the second-best solution is wanted
+    if get_second_best:
+        model.setParam("PoolSearchMode", 2)  # Enable the solution pool search
+        model.setParam("PoolSolutions", 2)  # Store up to 2 solutions
 
     # Solve the model
     model.optimize()
@@ -77,3 +126,70 @@ def solve_gurobi(demand_data, banned_solutions=None, get_second_best=False):
         print("No optimal solution found.")
         return []
 
+
+def solve_k_best(demand_data, k, diversity=1, banned_solutions=None, use_pool=True):
+    """
+    Retrieve up to k distinct solutions from a single solve.
+
+    Two solutions are distinct when at least `diversity` routes are used in one
+    and unused in the other. With `use_pool` the Gurobi solution pool is searched
+    and filtered; otherwise the model is re-optimised with a no-good cut on the
+    route-usage indicators after each solution.
+
+    :param demand_data: DemandBatch or list of demands with start, end, flow, and distance.
+    :param k: Maximum number of solutions to return.
+    :param diversity: Minimum Hamming distance between the route supports of two solutions.
+    :param banned_solutions: List of solutions to ban, each represented as [(start, end)].
+    :param use_pool: Use the solution pool instead of no-good cuts.
+    :return: KBestSolutions ranked by objective (best first).
+    """
+    valid_demand_data = _filter_demand(demand_data)
+    model, flow_vars = _build_flow_model(valid_demand_data, banned_solutions)
+    variables = [flow_vars[(d["start"], d["end"])] for d in valid_demand_data]
+
+    objectives = []
+    flows = []
+    supports = []
+
+    def _keep(objective, values):
+        values = np.where(np.isfinite(values), np.round(values), 0) + 0.0  # no -0.0
+        support = values > 0
+        if all(np.count_nonzero(support != s) >= diversity for s in supports):
+            objectives.append(objective)
+            flows.append(values)
+            supports.append(support)
+
+    if use_pool:
+        model.setParam("PoolSearchMode", 2)
+        # Extra room so enough solutions survive the diversity filter
+        model.setParam("PoolSolutions", k if diversity <= 1 else k * 4)
+        model.optimize()
+        if model.status == GRB.OPTIMAL:
+            for rank in range(model.SolCount):
+                if len(objectives) >= k:
+                    break
+                model.setParam("SolutionNumber", rank)
+                _keep(model.PoolObjVal, np.array(model.getAttr("Xn", variables), dtype=float))
+    else:
+        # Route-usage indicators for the no-good cuts
+        used = [model.addVar(vtype=GRB.BINARY, name=f"used_{i}") for i in range(len(variables))]
+        for var, u, d in zip(variables, used, valid_demand_data):
+            model.addConstr(var <= d["flow"] * u)
+            model.addConstr(u <= var)
+        while len(objectives) < k:
+            model.optimize()
+            if model.status != GRB.OPTIMAL:
+                break
+            _keep(model.ObjVal, np.array(model.getAttr("X", variables), dtype=float))
+            support = np.array(model.getAttr("X", used)) > 0.5
+            model.addConstr(
+                sum(1 - u for u, s in zip(used, support) if s) + sum(u for u, s in zip(used, support) if not s)
+                >= diversity
+            )
+
+    if not objectives:
+        print("No optimal solution found.")
+        return KBestSolutions(valid_demand_data, np.empty(0), np.empty((0, len(valid_demand_data))))
+
+    order = np.argsort(objectives, kind="stable")
+    return KBestSolutions(valid_demand_data, np.asarray(objectives)[order], np.vstack(flows)[order])
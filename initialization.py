@@ -4,7 +4,8 @@ def initialize_states_with_time(vehicles: List[str], vertiports: List[str],verti
     """Initialize states for vehicles and vertiports."""
     num_vertiports = len(vertiports)
     vehicle_states = {
-        k: {"activated": True, "avail": 1, "charging": 0, "in_service": 0, "battery": 100, "loc":vertiports[i // 2]}
+        k: {"activated": True, "avail": 1, "charging": 0, "in_service": 0, "battery": 100,
+            "loc": vertiports[i * num_vertiports // len(vehicles)]}
         for i, k in enumerate(vehicles)
     }
     vertiport_states = {
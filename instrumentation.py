@@ -0,0 +1,125 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._step_ns[self.name] += time.perf_counter_ns() - self.start
+        return False
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class Profiler:
+    """
+    Per-phase monotonic timers and counters for the simulation loop.
+
+    Wrap work in `with profiler.phase("name"):`, bump counters with `count`, and call
+    `end_step(t)` once per time step to close that step's record. A disabled profiler
+    returns one shared no-op context manager, so instrumented code costs a method call.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.steps: List[Dict] = []
+        self._step_ns = defaultdict(int)
+        self._step_counts = defaultdict(int)
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self._step_counts[name] += n
+
+    def end_step(self, step: int):
+        if not self.enabled:
+            return
+        self.steps.append({"step": step, "ns": dict(self._step_ns), "counts": dict(self._step_counts)})
+        self._step_ns.clear()
+        self._step_counts.clear()
+
+    # --- aggregation --------------------------------------------------------------
+
+    def phases(self) -> List[str]:
+        return sorted({name for record in self.steps for name in record["ns"]})
+
+    def counters(self) -> List[str]:
+        return sorted({name for record in self.steps for name in record["counts"]})
+
+    @staticmethod
+    def histogram(values_ns: List[int]) -> Dict[str, int]:
+        """Counts per power-of-two bucket of microseconds, labelled by the bucket's upper bound."""
+        buckets = defaultdict(int)
+        for ns in values_ns:
+            upper = 1
+            while upper * 1000 < ns:
+                upper *= 2
+            buckets[f"<={upper}us"] += 1
+        return dict(sorted(buckets.items(), key=lambda item: int(item[0][2:-2])))
+
+    def report(self) -> Dict:
+        """Per-phase totals, percentiles and histograms of per-step time, plus counter totals."""
+        phases = {}
+        for name in self.phases():
+            # Only the steps where the phase ran (e.g. "solve" runs on retries only)
+            values = sorted(record["ns"][name] for record in self.steps if name in record["ns"])
+            phases[name] = {
+                "total_s": sum(values) / 1e9,
+                "mean_ms": sum(values) / len(values) / 1e6,
+                "p50_ms": values[len(values) // 2] / 1e6,
+                "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))] / 1e6,
+                "max_ms": values[-1] / 1e6,
+                "histogram": self.histogram(values),
+            }
+        counters = {
+            name: sum(record["counts"].get(name, 0) for record in self.steps)
+            for name in self.counters()
+        }
+        return {"steps": len(self.steps), "phases": phases, "counters": counters}
+
+    def write_report(self, path: str):
+        """Write the summary as JSON, or the per-step records as CSV if `path` ends in .csv."""
+        if path.endswith(".csv"):
+            phases, counters = self.phases(), self.counters()
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["step"] + [f"{p}_ms" for p in phases] + counters)
+                for record in self.steps:
+                    writer.writerow(
+                        [record["step"]]
+                        + [record["ns"].get(p, 0) / 1e6 for p in phases]
+                        + [record["counts"].get(c, 0) for c in counters]
+                    )
+        else:
+            with open(path, "w") as f:
+                json.dump(self.report(), f, indent=2)
+
+
+NULL_PROFILER = Profiler(enabled=False)
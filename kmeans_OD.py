@@ -1,8 +1,10 @@
 import numpy as np
 import pandas as pd
-from gurobipy import Model, GRB, quicksum
+from gurobipy import GRB
 import math
 
+from matrix_model import build_assignment_model, assignment_results, flatten_orders, grid_manhattan
+
 # === 加载数据 ===
 file_path = "hh-odflow.npz"
 data = np.load(file_path)
@@ -45,70 +47,30 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
-distance_ground_start = {
-    (i, p): manhattan_distance(i, p, GRID_WIDTH) * ground_cost
-    for t in time_intervals for (i, j, _) in orders[t] for p in vertiports
-}
-distance_air = {
-    (p, q): haversine(lat_p, lon_p, lat_q, lon_q) * air_cost
+# 距离矩阵 (订单 x 停机坪, 停机坪 x 停机坪)
+_, _, origin, destination, _ = flatten_orders(time_intervals, orders)
+distance_ground_start = grid_manhattan(origin, vertiports, GRID_WIDTH) * ground_cost
+distance_air = np.array([
+    [haversine(lat_p, lon_p, lat_q, lon_q) * air_cost if p != q else 0
+     for (q, (lat_q, lon_q)) in zip(vertiports, vertiport_data[['Latitude', 'Longitude']].values)]
     for (p, (lat_p, lon_p)) in zip(vertiports, vertiport_data[['Latitude', 'Longitude']].values)
-    for (q, (lat_q, lon_q)) in zip(vertiports, vertiport_data[['Latitude', 'Longitude']].values)
-    if p != q
-}
-distance_ground_end = {
-    (j, q): manhattan_distance(j, q, GRID_WIDTH) * ground_cost
-    for t in time_intervals for (i, j, _) in orders[t] for q in vertiports
-}
-
-model = Model("Urban Air Mobility")
-x = model.addVars(
-    time_intervals,
-    range(max(len(orders[t]) for t in time_intervals)),
-    vertiports,
-    vertiports,
-    vtype=GRB.BINARY,
-    name="x"
-)
-z = model.addVars(vertiports, vtype=GRB.BINARY, name="z")
-
-model.setObjective(
-    quicksum(
-        x[t, o, p, q] * (
-            distance_ground_start.get((orders[t][o][0], p), 0) +
-            distance_air.get((p, q), 0) +
-            distance_ground_end.get((orders[t][o][1], q), 0)
-        )
-        for t in time_intervals for o in range(len(orders[t])) for p in vertiports for q in vertiports if p != q
-    )
-    + quicksum(z[p] * activation_penalty for p in vertiports),
-    GRB.MINIMIZE
-)
+])
+distance_ground_end = grid_manhattan(destination, vertiports, GRID_WIDTH) * ground_cost
 
-model.addConstrs(
-    quicksum(x[t, o, p, q] for p in vertiports for q in vertiports if p != q) == 1
-    for t in time_intervals for o in range(len(orders[t]))
-)
-model.addConstrs(
-    x[t, o, p, q] <= z[p]
-    for t in time_intervals for o in range(len(orders[t])) for p in vertiports for q in vertiports if p != q
-)
-model.addConstrs(
-    x[t, o, p, q] <= z[q]
-    for t in time_intervals for o in range(len(orders[t])) for p in vertiports for q in vertiports if p != q
+# 矩阵形式建模 (见 matrix_model)
+model, v, layout = build_assignment_model(
+    "Urban Air Mobility", time_intervals, orders, vertiports,
+    distance_ground_start, distance_air, distance_ground_end, activation_penalty
 )
 
 model.optimize()
 
 if model.status == GRB.OPTIMAL:
     print(f"Objective value: {model.objVal}")
-    for t in time_intervals:
-        for o in range(len(orders[t])):
-            for p in vertiports:
-                for q in vertiports:
-                    if p != q and x[t, o, p, q].x > 0.5:
-                        print(f"Time: {t}, Order: {o}, Takeoff: {p}, Landing: {q}, Flow: {orders[t][o][2]}")
-    for p in vertiports:
-        if z[p].x > 0.5:
-            print(f"Vertiport {p} is activated.")
+    results, activated = assignment_results(v, layout)
+    for t, o, p, q, flow in results:
+        print(f"Time: {t}, Order: {o}, Takeoff: {p}, Landing: {q}, Flow: {flow}")
+    for p in activated:
+        print(f"Vertiport {p} is activated.")
 else:
     print("No optimal solution found.")
@@ -2,44 +2,32 @@ import numpy as np
 import pandas as pd
 from gurobipy import Model, GRB, quicksum
 import math
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-# === 加载数据 ===
-file_path = "hh-odflow.npz"
-data = np.load(file_path)
-flow_data = data['arr_0']
-# 加载停机坪数据
-vertiport_data = pd.read_csv("adjusted_vertiports_numeric.csv")
-
-# 创建一个从 Grid_ID 到停机坪名称（Vertiport）的字典
-grid_to_vertiport = dict(zip(vertiport_data['Grid_ID'], vertiport_data['Vertiport']))
+from memory_budget import MemoryReport, parse_size, deep_sizeof, batch_model_bytes, batch_model_variables
+from data_processing import load_rush_hour_scores, rush_hour_steps
+from matrix_model import (build_assignment_model, assignment_results, flatten_orders, grid_manhattan, air_matrix,
+                          set_assignment_start)
+from facility_location import PairFacilityLocation
+from vertiport_locator import VertiportLocator, cell_centres
 
 # 限制的时间区间数量和批次大小
 MAX_TIME_INTERVALS = 500
 BATCH_SIZE = 50
 
-# 构造时间区间
-time_intervals = [f"T{t}" for t in range(min(MAX_TIME_INTERVALS, flow_data.shape[0]))]
-
-# 构造订单数据
-orders = {
-    f"T{t}": [
-        (i, j, int(flow_data[t, i, j]))
-        for i in range(flow_data.shape[1])
-        for j in range(flow_data.shape[2])
-        if flow_data[t, i, j] > 0
-    ]
-    for t in range(min(MAX_TIME_INTERVALS, flow_data.shape[0]))
-}
-
-# 加载停机坪数据
-vertiport_data = pd.read_csv("adjusted_vertiports_numeric.csv")
-vertiports = vertiport_data['Grid_ID'].tolist()
+# 自适应分批: 没有历史记录时每个变量的建模+求解时间 (秒)
+DEFAULT_SECONDS_PER_VARIABLE = 1e-4
+SOLVE_HISTORY_FILE = "batch_solve_times.csv"
 
 # 参数定义
 GRID_WIDTH = 52  # 根据计算的网格列数
 ground_cost = 5
 air_cost = 10
 activation_penalty = 100
+PRUNED_COST = 1e9  # 启发式中被剪枝的 (订单, 停机坪) 的地面成本
 
 # 曼哈顿距离计算函数
 def manhattan_distance(id1, id2, grid_width):
@@ -57,26 +45,56 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
-# 停机坪之间的空中距离矩阵
-distance_air = {
-    (p, q): haversine(lat_p, lon_p, lat_q, lon_q) * air_cost
-    for (p, (lat_p, lon_p)) in zip(vertiports, vertiport_data[['Latitude', 'Longitude']].values)
-    for (q, (lat_q, lon_q)) in zip(vertiports, vertiport_data[['Latitude', 'Longitude']].values)
-    if p != q
-}
 
-# 分批处理时间片段
-batches = [time_intervals[i:i + BATCH_SIZE] for i in range(0, len(time_intervals), BATCH_SIZE)]
+def load_orders(file_path, max_intervals, report=None):
+    """
+    Load the OD flow tensor and build the per-interval order lists.
 
-# 保存每批次结果
-all_results = []
+    Reads both the dense `arr_0` tensor and the sparse (shape, t, o, d, flow) format
+    `get_od.get_flow` writes under a memory budget.
+    """
+    data = np.load(file_path)
+    if "shape" in data.files:
+        num_intervals = min(max_intervals, int(data["shape"][0]))
+        t_idx, o_idx, d_idx, flow = data["t"], data["o"], data["d"], data["flow"]
+        keep = (t_idx < num_intervals) & (flow > 0)
+        t_idx, o_idx, d_idx, flow = t_idx[keep], o_idx[keep], d_idx[keep], flow[keep]
+        odflow_bytes = t_idx.nbytes + o_idx.nbytes + d_idx.nbytes + flow.nbytes
+    else:
+        flow_data = data['arr_0']
+        num_intervals = min(max_intervals, flow_data.shape[0])
+        t_idx, o_idx, d_idx = np.nonzero(flow_data[:num_intervals] > 0)
+        flow = flow_data[t_idx, o_idx, d_idx]
+        odflow_bytes = flow_data.nbytes
 
-for batch_idx, batch in enumerate(batches):
-    print(f"正在优化第 {batch_idx + 1}/{len(batches)} 批时间片段...")
+    # 构造时间区间
+    time_intervals = [f"T{t}" for t in range(num_intervals)]
 
-    # 构建当前批次的订单数据
-    batch_orders = {t: orders[t] for t in batch}
+    # 构造订单数据 (按 t, o, d 排序，与逐格扫描稠密张量的顺序一致)
+    order = np.lexsort((d_idx, o_idx, t_idx))
+    orders = {t: [] for t in time_intervals}
+    for t, i, j, f in zip(t_idx[order].tolist(), o_idx[order].tolist(), d_idx[order].tolist(), flow[order].tolist()):
+        orders[time_intervals[t]].append((i, j, int(f)))
+
+    if report is not None:
+        report.record("odflow", odflow_bytes)
+        report.record("orders", deep_sizeof(orders))
+    return time_intervals, orders
+
+
+def load_air_distances(vertiport_data):
+    """停机坪之间的空中距离矩阵"""
+    vertiports = vertiport_data['Grid_ID'].tolist()
+    return {
+        (p, q): haversine(lat_p, lon_p, lat_q, lon_q) * air_cost
+        for (p, (lat_p, lon_p)) in zip(vertiports, vertiport_data[['Latitude', 'Longitude']].values)
+        for (q, (lat_q, lon_q)) in zip(vertiports, vertiport_data[['Latitude', 'Longitude']].values)
+        if p != q
+    }
 
+
+def build_batch_model(batch_idx, batch, batch_orders, vertiports, distance_air, threads=0):
+    """Build the MILP for one batch of time intervals. Returns (model, x, z)."""
     # 起点到停机坪的地面距离
     distance_ground_start = {
         (i, p): manhattan_distance(i, p, GRID_WIDTH) * ground_cost
@@ -91,6 +109,8 @@ for batch_idx, batch in enumerate(batches):
 
     # === 初始化模型 ===
     model = Model(f"UAM_Batch_{batch_idx + 1}")
+    if threads > 0:
+        model.setParam("Threads", threads)
 
     # 决策变量
     x = model.addVars(
@@ -140,28 +160,356 @@ for batch_idx, batch in enumerate(batches):
         x[t, o, p, q] <= z[q]
         for t in batch for o in range(len(batch_orders[t])) for p in vertiports for q in vertiports if p != q
     )
+    return model, x, z
+
+
+def batch_cost_arrays(batch, batch_orders, vertiports, distance_air):
+    """(ground_start, air, ground_end) cost arrays of one batch, shared by the matrix model and the heuristic."""
+    _, _, origin, destination, _ = flatten_orders(batch, batch_orders)
+    return (grid_manhattan(origin, vertiports, GRID_WIDTH) * ground_cost,
+            air_matrix(vertiports, distance_air),
+            grid_manhattan(destination, vertiports, GRID_WIDTH) * ground_cost)
+
+
+def batch_candidates(batch, batch_orders, prune, ground_start, ground_end):
+    """
+    (allowed_start, allowed_end) masks of one batch: the vertiports within `radius_km` of each
+    order's origin / destination cell, plus its `min_k` nearest and its cheapest one under the
+    `ground_start` / `ground_end` grid costs, so pruning never drops an order's best ground leg.
+
+    :param prune: (locator, radius_km, min_k), the locator built over `vertiports` in order; None keeps every pair.
+    """
+    if prune is None:
+        return None, None
+    locator, radius_km, min_k = prune
+    _, _, origin, destination, _ = flatten_orders(batch, batch_orders)
+    allowed_start = locator.candidates(*cell_centres(origin, GRID_WIDTH), radius_km, min_k)
+    allowed_end = locator.candidates(*cell_centres(destination, GRID_WIDTH), radius_km, min_k)
+    # 球面距离与网格曼哈顿距离的排序不一致, 显式保留地面成本最低的停机坪
+    rows = np.arange(len(origin))
+    allowed_start[rows, np.argmin(ground_start, axis=1)] = True
+    allowed_end[rows, np.argmin(ground_end, axis=1)] = True
+    return allowed_start, allowed_end
+
+
+def build_batch_model_matrix(batch_idx, batch, batch_orders, vertiports, distance_air, threads=0, prune=None):
+    """Matrix-form `build_batch_model` (see `matrix_model`). Returns (model, v, layout)."""
+    ground_start, air, ground_end = batch_cost_arrays(batch, batch_orders, vertiports, distance_air)
+    allowed_start, allowed_end = batch_candidates(batch, batch_orders, prune, ground_start, ground_end)
+    return build_assignment_model(
+        f"UAM_Batch_{batch_idx + 1}", batch, batch_orders, vertiports, ground_start, air, ground_end,
+        activation_penalty, threads=threads, allowed_start=allowed_start, allowed_end=allowed_end
+    )
+
+
+def heuristic_activation(batch, batch_orders, vertiports, distance_air, prune=None):
+    """Lazy-greedy + swap vertiport activation of one batch (see `facility_location`)."""
+    ground_start, air, ground_end = batch_cost_arrays(batch, batch_orders, vertiports, distance_air)
+    allowed_start, allowed_end = batch_candidates(batch, batch_orders, prune, ground_start, ground_end)
+    if allowed_start is not None:
+        ground_start = np.where(allowed_start, ground_start, PRUNED_COST)
+        ground_end = np.where(allowed_end, ground_end, PRUNED_COST)
+    return PairFacilityLocation(ground_start, air, ground_end, activation_penalty).solve()
+
+
+def heuristic_results(batch, batch_orders, vertiports, solution):
+    """(Time, Order, Start, End, Flow) rows and activated vertiports of a heuristic solution."""
+    times, order_index, _, _, flows = flatten_orders(batch, batch_orders)
+    results = [
+        (t, int(o), vertiports[p], vertiports[q], int(flow))
+        for t, o, p, q, flow in zip(times, order_index, solution.start, solution.end, flows)
+    ]
+    return results, [vertiports[p] for p in solution.open]
+
+
+def solve_batch(batch_idx, batch, batch_orders, vertiports, distance_air, threads=0, builder="matrix",
+                activation="milp", prune=None):
+    """
+    Build and solve one batch, with the matrix builder or the original quicksum one.
+
+    :param activation: "milp" leaves vertiport activation to the solver, "mipstart" gives the matrix model
+        the facility-location heuristic's solution as a start, "heuristic" uses that solution without a model.
+    :param prune: Candidate pruning for the matrix builder and the heuristic, see `batch_candidates`.
+    :return: (batch_idx, results, activated, seconds) where results holds (Time, Order, Start, End, Flow)
+        rows and seconds is the build plus solve wall time.
+    """
+    begin = time.perf_counter()
+    has_orders = any(batch_orders[t] for t in batch) and len(vertiports) >= 2
+    if activation == "heuristic" and has_orders:
+        solution = heuristic_activation(batch, batch_orders, vertiports, distance_air, prune)
+        print(f"Batch {batch_idx + 1} Heuristic objective value: {solution.cost}")
+        results, activated = heuristic_results(batch, batch_orders, vertiports, solution)
+        return batch_idx, results, activated, time.perf_counter() - begin
+
+    if builder == "matrix":
+        model, v, layout = build_batch_model_matrix(batch_idx, batch, batch_orders, vertiports, distance_air, threads,
+                                                    prune)
+        if activation == "mipstart" and has_orders:
+            solution = heuristic_activation(batch, batch_orders, vertiports, distance_air, prune)
+            set_assignment_start(v, layout, solution.start, solution.end, solution.open)
+    else:
+        model, x, z = build_batch_model(batch_idx, batch, batch_orders, vertiports, distance_air, threads)
 
     # 求解模型
     model.optimize()
+    seconds = time.perf_counter() - begin
 
     # 处理结果
-    if model.status == GRB.OPTIMAL:
+    results = []
+    activated = []
+    if model.status == GRB.OPTIMAL and builder == "matrix":
+        print(f"Batch {batch_idx + 1} Objective value: {model.objVal}")
+        results, activated = assignment_results(v, layout)
+    elif model.status == GRB.OPTIMAL:
         print(f"Batch {batch_idx + 1} Objective value: {model.objVal}")
         for t in batch:
             for o in range(len(batch_orders[t])):
                 for p in vertiports:
                     for q in vertiports:
                         if p != q and x[t, o, p, q].x > 0.5:
-                            start_vertiport = grid_to_vertiport.get(batch_orders[t][o][0], "Unknown")
-                            end_vertiport = grid_to_vertiport.get(batch_orders[t][o][1], "Unknown")
-                            all_results.append((t, o, p, q, batch_orders[t][o][2]))
-        for p in vertiports:
-            if z[p].x > 0.5:
-                print(f"Vertiport {p} is activated in batch {batch_idx + 1}.")
+                            results.append((t, o, p, q, batch_orders[t][o][2]))
+        activated = [p for p in vertiports if z[p].x > 0.5]
     else:
         print(f"Batch {batch_idx + 1} did not find an optimal solution.")
+    return batch_idx, results, activated, seconds
+
+
+def rush_hour_batches(time_intervals, rush, batch_size):
+    """
+    Split the intervals into batches of at most `batch_size` that never mix rush and non-rush
+    intervals, so the heavy rush-hour models are batched (and scheduled) on their own.
+
+    :param rush: Rush flag per time step (see `data_processing.rush_hour_steps`).
+    """
+    batches = []
+    for t in time_intervals:
+        is_rush = bool(rush.get(int(t[1:]), False))
+        if batches and len(batches[-1][1]) < batch_size and batches[-1][0] == is_rush:
+            batches[-1][1].append(t)
+        else:
+            batches.append((is_rush, [t]))
+    return [batch for _, batch in batches]
+
+
+def estimate_solve_rate(history_file=SOLVE_HISTORY_FILE, recent=50):
+    """Seconds per model variable: median over the most recent recorded batches, else the default."""
+    if not history_file or not os.path.exists(history_file):
+        return DEFAULT_SECONDS_PER_VARIABLE
+    history = pd.read_csv(history_file).tail(recent)
+    history = history[history["variables"] > 0]
+    if history.empty:
+        return DEFAULT_SECONDS_PER_VARIABLE
+    return float((history["seconds"] / history["variables"]).median())
+
+
+def record_solve_times(history_file, solve_log):
+    """Append the (intervals, orders, vertiports, variables, seconds) rows of this run."""
+    if not history_file or not solve_log:
+        return
+    pd.DataFrame(solve_log).to_csv(history_file, mode="a", index=False,
+                                   header=not os.path.exists(history_file))
+
+
+def adaptive_batches(time_intervals, orders, vertiports, target_seconds, seconds_per_variable, rush=None,
+                     builder="matrix"):
+    """
+    Grow each batch while its estimated build and solve time stays under `target_seconds`.
+
+    The estimate is the size of the model `builder` creates (see
+    `memory_budget.batch_model_variables`) times `seconds_per_variable`. Quiet overnight
+    intervals thus share one batch while rush-hour intervals get small ones; an interval
+    that exceeds the target on its own is a batch by itself. With `rush` (see
+    `rush_hour_batches`) batches also break at rush-hour changes.
+    """
+    batches = []
+    current, current_rush = [], None
+    for t in time_intervals:
+        is_rush = bool(rush.get(int(t[1:]), False)) if rush is not None else None
+        candidate = current + [t]
+        estimate = batch_model_variables(candidate, orders, vertiports, builder) * seconds_per_variable
+        if current and (estimate > target_seconds or is_rush != current_rush):
+            batches.append(current)
+            candidate = [t]
+        current, current_rush = candidate, is_rush
+    if current:
+        batches.append(current)
+    return batches
+
+
+def fit_batches_to_budget(batches, orders, vertiports, report, workers=1, builder="matrix"):
+    """
+    Split batches whose model would not fit in the memory budget.
+
+    With several workers the budget is shared by the models built concurrently (as many as
+    `run_batches` actually runs, see `split_threads`). A batch is halved until its estimated
+    model size fits; a single interval is kept as it is (it cannot be split further) and reported.
+    """
+    concurrent = split_threads(workers)[0] if workers > 1 else 1
+    fitted = []
+    pending = list(batches)
+    while pending:
+        batch = pending.pop(0)
+        estimate = batch_model_bytes(batch, orders, vertiports, builder) * concurrent
+        if report.fits(estimate) or len(batch) == 1:
+            if not report.fits(estimate):
+                print(f"警告: 时间片 {batch[0]} 的模型约 {estimate / 1024 ** 2:.0f} MB，超出内存预算")
+            report.record("model variables", estimate)
+            fitted.append(batch)
+        else:
+            half = len(batch) // 2
+            pending[:0] = [batch[:half], batch[half:]]
+    if len(fitted) != len(batches):
+        report.strategy("batches", f"{len(batches)} -> {len(fitted)}")
+    return fitted
+
+
+def schedule_batches(batches, orders):
+    """
+    Order batches for dispatch, largest first (by order count).
+
+    Longest-processing-time-first keeps the pool busy and stops one big
+    rush-hour batch from being picked up last and dominating the makespan.
+    """
+    sizes = [sum(len(orders[t]) for t in batch) for batch in batches]
+    return sorted(range(len(batches)), key=lambda idx: sizes[idx], reverse=True)
+
+
+def split_threads(workers, total_cores=None):
+    """Split the available cores into (concurrent models, solver threads per model)."""
+    total_cores = total_cores or os.cpu_count() or 1
+    workers = max(1, min(workers, total_cores))
+    return workers, max(1, total_cores // workers)
+
+
+def run_batches(batches, orders, vertiports, distance_air, workers=1, threads=0, solve_log=None,
+                builder="matrix", activation="milp", prune=None):
+    """
+    Solve all batches, sequentially (workers=1) or on a process pool.
+
+    If `solve_log` is a list, one row per batch with its size and solve time is appended.
+    :return: result rows merged in time order, and the activated vertiports per batch.
+    """
+    all_results = []
+    activated = {}
+
+    def log(batch_idx, seconds):
+        if solve_log is not None:
+            batch = batches[batch_idx]
+            solve_log.append({
+                "intervals": len(batch),
+                "orders": sum(len(orders[t]) for t in batch),
+                "vertiports": len(vertiports),
+                "variables": batch_model_variables(batch, orders, vertiports, builder),
+                "seconds": seconds,
+            })
+
+    if workers <= 1:
+        for batch_idx, batch in enumerate(batches):
+            print(f"正在优化第 {batch_idx + 1}/{len(batches)} 批时间片段...")
+            batch_orders = {t: orders[t] for t in batch}
+            _, results, activated[batch_idx], seconds = solve_batch(
+                batch_idx, batch, batch_orders, vertiports, distance_air, threads, builder, activation, prune
+            )
+            log(batch_idx, seconds)
+            all_results.extend(results)
+    else:
+        workers, threads_per_model = split_threads(workers)
+        if threads > 0:
+            threads_per_model = threads
+        print(f"并行求解: {workers} 个进程, 每个模型 {threads_per_model} 个线程")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for batch_idx in schedule_batches(batches, orders):
+                batch = batches[batch_idx]
+                batch_orders = {t: orders[t] for t in batch}
+                futures.append(executor.submit(
+                    solve_batch, batch_idx, batch, batch_orders, vertiports, distance_air, threads_per_model, builder,
+                    activation, prune
+                ))
+            for future in as_completed(futures):
+                batch_idx, results, activated[batch_idx], seconds = future.result()
+                log(batch_idx, seconds)
+                print(f"第 {batch_idx + 1}/{len(batches)} 批完成")
+                all_results.extend(results)
+
+    # 按时间顺序合并结果
+    all_results.sort(key=lambda row: (int(row[0][1:]), row[1]))
+    return all_results, activated
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--odflow_file", default="hh-odflow.npz")
+    parser.add_argument("--vertiports_file", default="adjusted_vertiports_numeric.csv")
+    parser.add_argument("--output_file", default="optimized_results_with_vertiport_mapping.csv")
+    parser.add_argument("--max_intervals", type=int, default=MAX_TIME_INTERVALS)
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="number of batches solved concurrently")
+    parser.add_argument("--threads", type=int, default=0, help="solver threads per model (0 = split cores evenly)")
+    parser.add_argument("--builder", choices=["matrix", "quicksum"], default="matrix",
+                        help="model construction: sparse matrix form or the original quicksum expressions")
+    parser.add_argument("--activation", choices=["milp", "mipstart", "heuristic"], default="milp",
+                        help="vertiport activation: solver only, heuristic MIP start (matrix builder), or heuristic only")
+    parser.add_argument("--prune_radius", type=float, default=None,
+                        help="km; orders only use vertiports this close to their origin/destination (matrix builder)")
+    parser.add_argument("--prune_min_k", type=int, default=2,
+                        help="nearest vertiports always kept per origin/destination when pruning")
+    parser.add_argument("--trips_file", default=None,
+                        help="trip CSV the odflow was built from; batches are then split at rush-hour changes")
+    parser.add_argument("--target_solve_time", type=float, default=None,
+                        help="seconds per batch; batches are then sized by estimated model size instead of --batch_size")
+    parser.add_argument("--solve_history", default=SOLVE_HISTORY_FILE,
+                        help="CSV of recorded batch solve times, used and extended by adaptive batching")
+    parser.add_argument("--memory_budget", default=None,
+                        help="e.g. 4G; batches are split until the concurrently built models fit")
+    parser.add_argument("--memory_report", action="store_true", help="print peak sizes of the major structures")
+    args = parser.parse_args()
+
+    report = MemoryReport(parse_size(args.memory_budget) if args.memory_budget else None)
+
+    # === 加载数据 ===
+    time_intervals, orders = load_orders(args.odflow_file, args.max_intervals, report)
+
+    # 加载停机坪数据
+    vertiport_data = pd.read_csv(args.vertiports_file)
+    vertiports = vertiport_data['Grid_ID'].tolist()
+    distance_air = load_air_distances(vertiport_data)
+    report.record("distance dicts", deep_sizeof(distance_air))
+    prune = None
+    if args.prune_radius is not None:
+        prune = (VertiportLocator.from_csv(args.vertiports_file), args.prune_radius, args.prune_min_k)
+
+    # 分批处理时间片段
+    rush = rush_hour_steps(load_rush_hour_scores(args.trips_file)) if args.trips_file else None
+    if args.target_solve_time:
+        seconds_per_variable = estimate_solve_rate(args.solve_history)
+        batches = adaptive_batches(time_intervals, orders, vertiports, args.target_solve_time,
+                                   seconds_per_variable, rush, args.builder)
+        print(f"自适应分批: {len(batches)} 批 (每变量 {seconds_per_variable:.2e} 秒)")
+    elif rush is not None:
+        batches = rush_hour_batches(time_intervals, rush, args.batch_size)
+    else:
+        batches = [time_intervals[i:i + args.batch_size] for i in range(0, len(time_intervals), args.batch_size)]
+    batches = fit_batches_to_budget(batches, orders, vertiports, report, args.workers, args.builder)
+
+    solve_log = []
+    all_results, activated = run_batches(batches, orders, vertiports, distance_air, args.workers, args.threads,
+                                         solve_log, args.builder, args.activation, prune)
+    if args.activation != "heuristic":  # 启发式不建模, 其用时不代表求解速度
+        record_solve_times(args.solve_history, solve_log)
+    for batch_idx in sorted(activated):
+        for p in activated[batch_idx]:
+            print(f"Vertiport {p} is activated in batch {batch_idx + 1}.")
+
+    # 保存最终结果
+    results_df = pd.DataFrame(all_results, columns=["Time", "Order", "Start_Vertiport", "End_Vertiport", "Flow"])
+    results_df.to_csv(args.output_file, index=False)
+    print(f"优化结果已保存至 '{args.output_file}'")
+
+    if args.memory_report:
+        report.print_summary()
+
 
-# 保存最终结果
-results_df = pd.DataFrame(all_results, columns=["Time", "Order", "Start_Vertiport", "End_Vertiport", "Flow"])
-results_df.to_csv("optimized_results_with_vertiport_mapping.csv", index=False)
-print("优化结果已保存至 'optimized_results_with_vertiport_mapping.csv'")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
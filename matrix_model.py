@@ -0,0 +1,170 @@
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import scipy.sparse as sp
+from gurobipy import GRB, Model
+
+
+class AssignmentLayout(NamedTuple):
+    """Position of every variable in the model's single MVar: x columns first, then z."""
+    times: List            # time interval of each order row
+    order_index: np.ndarray  # order number within its interval
+    flows: np.ndarray
+    pair_start: np.ndarray   # vertiport index of each (p, q) pair, p != q
+    pair_end: np.ndarray
+    vertiports: List
+    x_order: np.ndarray      # order row of each x column, in (order, pair) order
+    x_pair: np.ndarray       # (p, q) pair of each x column
+
+    @property
+    def num_x(self) -> int:
+        return len(self.x_order)
+
+
+def flatten_orders(time_intervals: Sequence, orders: Dict):
+    """(times, order numbers, origins, destinations, flows) of every order, in (t, o) order."""
+    times, order_index, origin, destination, flows = [], [], [], [], []
+    for t in time_intervals:
+        for o, (i, j, flow) in enumerate(orders[t]):
+            times.append(t)
+            order_index.append(o)
+            origin.append(i)
+            destination.append(j)
+            flows.append(flow)
+    return times, np.array(order_index, dtype=np.int64), np.array(origin, dtype=np.int64), \
+        np.array(destination, dtype=np.int64), np.array(flows, dtype=float)
+
+
+def build_assignment_model(name: str, time_intervals: Sequence, orders: Dict, vertiports: List,
+                           ground_start: np.ndarray, air: np.ndarray, ground_end: np.ndarray,
+                           activation_penalty: float, capacity: Optional[float] = None,
+                           ground_activation: bool = False, threads: int = 0,
+                           allowed_start: Optional[np.ndarray] = None, allowed_end: Optional[np.ndarray] = None):
+    """
+    Matrix form of the order -> (take-off, landing) vertiport assignment MILP.
+
+    Builds the same model as the quicksum versions in kmeans_OD / kmeans_OD_batch / 0116, but
+    assembles the cost vector and constraint matrices with numpy / scipy.sparse and loads
+    them with one addMVar and one addMConstr per constraint family. Only the p != q pairs of
+    real orders get x variables, and only those the optional candidate masks allow.
+
+    :param ground_start: (orders x vertiports) cost from each order's origin to each vertiport.
+    :param air: (vertiports x vertiports) flight cost.
+    :param ground_end: (orders x vertiports) cost from each vertiport to each order's destination.
+    :param capacity: If set, the flow of one interval on one (p, q) pair is at most this (0116).
+    :param ground_activation: Add 0116's ground-distance activation constraint per (t, o, p).
+    :param allowed_start: (orders x vertiports) mask of the take-off vertiports each order may use,
+        e.g. from `vertiport_locator.VertiportLocator.candidates`; every order needs a pair left.
+    :param allowed_end: Same for landing vertiports.
+    :return: (model, v, layout); v[:layout.num_x] are the x variables, v[layout.num_x:] is z.
+    """
+    times, order_index, _, _, flows = flatten_orders(time_intervals, orders)
+    n_orders, n_vertiports = len(order_index), len(vertiports)
+    pair_start, pair_end = np.nonzero(~np.eye(n_vertiports, dtype=bool))
+    n_pairs = len(pair_start)
+    # 候选剪枝: 只为允许的 (订单, p, q) 建变量
+    keep = np.ones((n_orders, n_pairs), dtype=bool)
+    if allowed_start is not None:
+        keep &= np.asarray(allowed_start, dtype=bool)[:, pair_start]
+    if allowed_end is not None:
+        keep &= np.asarray(allowed_end, dtype=bool)[:, pair_end]
+    x_order, x_pair = np.nonzero(keep)
+    x_start, x_end = pair_start[x_pair], pair_end[x_pair]
+    n_x = len(x_order)
+    layout = AssignmentLayout(times, order_index, flows, pair_start, pair_end, list(vertiports), x_order, x_pair)
+
+    # 目标函数系数: x[o, (p, q)] = 地面(起点->p) + 空中(p->q) + 地面(q->终点)
+    cost_x = ground_start[x_order, x_start] + air[x_start, x_end] + ground_end[x_order, x_end]
+    cost = np.concatenate([cost_x, np.full(n_vertiports, float(activation_penalty))])
+
+    model = Model(name)
+    if threads > 0:
+        model.setParam("Threads", threads)
+    v = model.addMVar(n_x + n_vertiports, vtype=GRB.BINARY, obj=cost, name="v")
+    model.ModelSense = GRB.MINIMIZE
+
+    # 每个订单恰好选择一条 (p, q)
+    rows = np.arange(n_x)
+    assign = sp.csr_matrix((np.ones(n_x), (x_order, rows)), shape=(n_orders, n_x + n_vertiports))
+    model.addMConstr(assign, v, "=", np.ones(n_orders), name="assign")
+
+    # x[o, (p, q)] <= z[p] 且 x[o, (p, q)] <= z[q]
+    for ends in (x_start, x_end):
+        link = sp.hstack([
+            sp.identity(n_x, format="csr"),
+            sp.csr_matrix((-np.ones(n_x), (rows, ends)), shape=(n_x, n_vertiports)),
+        ], format="csr")
+        model.addMConstr(link, v, "<", np.zeros(n_x))
+
+    if capacity is not None:
+        # 同一时间区间同一 (p, q) 的总流量不超过容量
+        position = {t: k for k, t in enumerate(time_intervals)}
+        interval = np.array([position[t] for t in times], dtype=np.int64)
+        n_intervals = len(time_intervals)
+        row = interval[x_order] * n_pairs + x_pair
+        load = sp.csr_matrix((flows[x_order], (row, rows)), shape=(n_intervals * n_pairs, n_x + n_vertiports))
+        model.addMConstr(load, v, "<", np.full(n_intervals * n_pairs, float(capacity)))
+
+    if ground_activation:
+        # sum_q x[o, (p, q)] * 地面(起点->p) <= sum_v 地面(起点->v) * z[p]
+        row = x_order * n_vertiports + x_start
+        coef = ground_start[x_order, x_start]
+        x_part = sp.csr_matrix((coef, (row, rows)), shape=(n_orders * n_vertiports, n_x))
+        z_row = np.arange(n_orders * n_vertiports)
+        z_part = sp.csr_matrix((-np.repeat(ground_start.sum(axis=1), n_vertiports),
+                                (z_row, np.tile(np.arange(n_vertiports), n_orders))),
+                               shape=(n_orders * n_vertiports, n_vertiports))
+        model.addMConstr(sp.hstack([x_part, z_part], format="csr"), v, "<", np.zeros(n_orders * n_vertiports))
+
+    return model, v, layout
+
+
+def assignment_results(v, layout: AssignmentLayout):
+    """
+    Decode a solved model into (Time, Order, Start, End, Flow) rows and the activated vertiports.
+    """
+    values = v.X
+    chosen = np.flatnonzero(values[:layout.num_x] > 0.5)
+    order_row, pair = layout.x_order[chosen], layout.x_pair[chosen]
+    results = [
+        (layout.times[r], int(layout.order_index[r]), layout.vertiports[layout.pair_start[k]],
+         layout.vertiports[layout.pair_end[k]], int(layout.flows[r]))
+        for r, k in zip(order_row, pair)
+    ]
+    activated = [p for p, on in zip(layout.vertiports, values[layout.num_x:] > 0.5) if on]
+    return results, activated
+
+
+def grid_manhattan(cells: np.ndarray, vertiports: Sequence[int], grid_width: int) -> np.ndarray:
+    """(cells x vertiports) Manhattan distance on a row-major grid of `grid_width` columns."""
+    row, col = np.divmod(np.asarray(cells)[:, None], grid_width)
+    v_row, v_col = np.divmod(np.asarray(vertiports)[None, :], grid_width)
+    return np.abs(row - v_row) + np.abs(col - v_col)
+
+
+def air_matrix(vertiports: Sequence, distance_air: Dict) -> np.ndarray:
+    """Dense (vertiports x vertiports) table from a {(p, q): cost} dict (0 where missing)."""
+    return np.array([[distance_air.get((p, q), 0) for q in vertiports] for p in vertiports], dtype=float)
+
+
+def set_assignment_start(v, layout: AssignmentLayout, start: np.ndarray, end: np.ndarray, open_set: Sequence[int]):
+    """
+    MIP start from a heuristic solution: order row r flies vertiport index start[r] -> end[r],
+    and the vertiports at indices `open_set` are activated. Orders whose pair was pruned from
+    the model are left undefined for the solver to complete.
+    """
+    n_vertiports = len(layout.vertiports)
+    n_pairs = len(layout.pair_start)
+    start, end = np.asarray(start), np.asarray(end)
+    # (p, q) 在非对角线对中的位置, 再在保留的列中查找
+    pair = start * (n_vertiports - 1) + end - (end > start)
+    keys = layout.x_order * n_pairs + layout.x_pair
+    wanted = np.arange(len(start)) * n_pairs + pair
+    column = np.minimum(np.searchsorted(keys, wanted), max(len(keys) - 1, 0))
+    found = keys[column] == wanted if len(keys) else np.zeros(len(wanted), dtype=bool)
+
+    values = np.zeros(layout.num_x + n_vertiports)
+    values[column[found]] = 1
+    values[:layout.num_x][np.isin(layout.x_order, np.flatnonzero(~found))] = GRB.UNDEFINED
+    values[layout.num_x + np.asarray(open_set, dtype=np.int64)] = 1
+    v.Start = values
@@ -0,0 +1,118 @@
+import sys
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Measured on gurobipy 13: x variable plus its share of the assignment and activation
+# constraints, including the Python Var/Constr objects held in the tupledicts.
+MODEL_BYTES_PER_VARIABLE = 1500
+
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(text: str) -> int:
+    """'512M', '4G', '1.5g' or a plain byte count -> bytes."""
+    text = str(text).strip().upper().rstrip("B")
+    unit = text[-1] if text and text[-1] in _UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * _UNITS[unit])
+
+
+def format_size(nbytes: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(nbytes) < 1024:
+            return f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} TB"
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size of this process in bytes (None where `resource` is unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def deep_sizeof(obj, _seen=None) -> int:
+    """Approximate size of nested dicts/lists/tuples of scalars and numpy arrays."""
+    _seen = set() if _seen is None else _seen
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes + sys.getsizeof(obj) if obj.base is None else sys.getsizeof(obj)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, _seen) + deep_sizeof(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_sizeof(item, _seen) for item in obj)
+    return size
+
+
+def dense_odflow_bytes(intervals: int, zones: int) -> int:
+    """Size of the dense T x N x N float64 odflow tensor."""
+    return intervals * zones * zones * np.dtype(np.float64).itemsize
+
+
+def batch_model_variables(batch, batch_orders: Dict, vertiports, builder: str = "matrix") -> int:
+    """
+    Variables of one batch model. The quicksum `kmeans_OD_batch.build_batch_model` pads every
+    interval to the busiest one and includes p == q; the matrix builder only creates the
+    p != q pairs of real orders (fewer still with candidate pruning, so this is an upper bound).
+    """
+    n = len(vertiports)
+    if builder == "matrix":
+        return sum(len(batch_orders[t]) for t in batch) * n * (n - 1) + n
+    max_orders = max((len(batch_orders[t]) for t in batch), default=0)
+    return len(batch) * max_orders * n ** 2 + n
+
+
+def batch_model_bytes(batch, batch_orders: Dict, vertiports, builder: str = "matrix") -> int:
+    return batch_model_variables(batch, batch_orders, vertiports, builder) * MODEL_BYTES_PER_VARIABLE
+
+
+class MemoryReport:
+    """
+    Peak sizes of the major structures of a run, checked against an optional budget.
+
+    `record` keeps the largest size seen per name; `fits` tells a caller whether a
+    structure of a given size stays within the budget so it can pick a cheaper strategy.
+    """
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget
+        self.peaks: Dict[str, int] = {}
+        self.strategies: Dict[str, str] = {}
+
+    def fits(self, nbytes: int) -> bool:
+        return self.budget is None or nbytes <= self.budget
+
+    def record(self, name: str, nbytes: int):
+        self.peaks[name] = max(self.peaks.get(name, 0), int(nbytes))
+
+    def strategy(self, name: str, choice: str):
+        self.strategies[name] = choice
+
+    def summary(self) -> Dict:
+        return {
+            "budget": self.budget,
+            "peaks": dict(self.peaks),
+            "strategies": dict(self.strategies),
+            "peak_rss": peak_rss(),
+        }
+
+    def print_summary(self):
+        budget = format_size(self.budget) if self.budget is not None else "none"
+        print(f"Memory report (budget: {budget})")
+        for name, nbytes in self.peaks.items():
+            print(f"  {name:<24} {format_size(nbytes):>12}")
+        for name, choice in self.strategies.items():
+            print(f"  {name:<24} {choice:>12}")
+        rss = peak_rss()
+        if rss is not None:
+            print(f"  {'peak RSS':<24} {format_size(rss):>12}")
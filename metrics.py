@@ -1,4 +1,11 @@
-from typing import List, Dict, Tuple
+from bisect import bisect_left
+from typing import List, Dict, Optional, Sequence, Tuple
+from collections import Counter, deque
+
+import numpy as np
+
+from demand_batch import DemandBatch
+from distance_battery import distance_table
 
 def calculate_coverage_rate(actual_met_demand: int, total_demand: int) -> float:
     """Calculate the coverage rate as the ratio of met demand to total demand."""
@@ -20,12 +27,20 @@ def calculate_cost(activated_vertiports: List[str], cost_per_distance: float, di
 def update_demand_chart(unmet_demand: List[Tuple[str, str, int]], new_demand: List[Dict]) -> int:
     """
     Updates the demand chart by including the unmet demand from the previous iteration
-    and the new demand for the current iteration.
+    and the new demand for the current iteration. Either argument may be a DemandBatch.
     """
     print("Debug inside update_demand_chart:")
     print("  unmet_demand =", unmet_demand)
     print("  new_demand =", new_demand)
 
+    # DemandBatch 已经是校验过的数组，直接求和
+    if isinstance(unmet_demand, DemandBatch) or isinstance(new_demand, DemandBatch):
+        total_demand = unmet_demand.total_flow() if isinstance(unmet_demand, DemandBatch) \
+            else sum(flow for _, _, flow in unmet_demand)
+        total_demand += new_demand.total_flow() if isinstance(new_demand, DemandBatch) \
+            else sum(demand["flow"] for demand in new_demand)
+        return total_demand
+
     # 确保 unmet_demand 是预期的列表格式
     if not all(isinstance(d, tuple) and len(d) == 3 for d in unmet_demand):
         raise TypeError("unmet_demand must be a list of tuples with 3 elements (start, end, flow).")
@@ -39,3 +54,197 @@ def update_demand_chart(unmet_demand: List[Tuple[str, str, int]], new_demand: Li
     total_demand += sum([demand["flow"] for demand in new_demand])  # New demand
     return total_demand
 
+
+def calculate_demand_met(gurobi_results, vehicle_movements, unmet_demand):
+    """Calculate the met demand for the current iteration."""
+    # Vehicles per (start, end) route, counted once instead of once per route
+    vehicles_per_route = Counter(movement for movement in vehicle_movements.values() if movement)
+
+    if isinstance(gurobi_results, DemandBatch):
+        current_demand = DemandBatch.concat([
+            DemandBatch.from_tuples(unmet_demand, gurobi_results.names, distance_table), gurobi_results
+        ])
+        names = current_demand.names
+        code = {name: i for i, name in enumerate(names)}
+        vehicles_on_route = np.zeros(len(names) * len(names), dtype=np.int64)
+        for (start, end), count in vehicles_per_route.items():
+            vehicles_on_route[code[start] * len(names) + code[end]] = count
+        met_demand = np.minimum(current_demand.flow, vehicles_on_route[current_demand.route_codes()])
+        return int(met_demand.sum()), current_demand.total_flow()
+
+    total_met_demand = 0
+    total_demand = 0
+
+    current_demand = [
+        {"start": start, "end": end, "flow": flow}
+        for start, end, flow in unmet_demand
+    ] + gurobi_results
+
+    for route in current_demand:
+        start, end, required_demand = route["start"], route["end"], route["flow"]
+        total_demand += required_demand
+
+        vehicles_on_route = vehicles_per_route[(start, end)]
+
+        met_demand = min(required_demand, vehicles_on_route)
+        total_met_demand += met_demand
+
+    return total_met_demand, total_demand
+
+
+class MetricsAccumulator:
+    """
+    Running simulation metrics updated from per-step deltas.
+
+    The loop reports activations, each step's new demand, the dispatched flights and the
+    step's coverage totals; cost, coverage, per-vertiport utilization and per-route service
+    rates are kept up to date in time proportional to those changes. The activation cost
+    follows `calculate_cost`: consecutive activated vertiports in `activation_order`.
+    """
+
+    def __init__(self, names: Sequence[str], distance_map: Dict, activation_order: Sequence[str],
+                 cost_per_distance: float = 10, window: int = 10):
+        self.names = tuple(names)
+        self.code = {name: i for i, name in enumerate(self.names)}
+        self.distance_map = distance_map
+        self.cost_per_distance = cost_per_distance
+        self.position = {v: i for i, v in enumerate(activation_order)}
+        self.order = list(activation_order)
+        self.activated = []  # activation_order 中的位置, 保持有序
+        self.cost = 0
+
+        n = len(self.names)
+        self.route_demand = np.zeros(n * n, dtype=np.int64)
+        self.route_served = np.zeros(n * n, dtype=np.int64)
+        self.departures = np.zeros(n, dtype=np.int64)
+        self.arrivals = np.zeros(n, dtype=np.int64)
+        self.steps = 0
+        self.met = 0
+        self.total = 0
+        self.coverage_sum = 0.0
+        self.unmet_flow = 0
+        self.recent = deque(maxlen=window)
+
+    # --- activations ----------------------------------------------------------------
+
+    def _link(self, a: Optional[int], b: Optional[int]) -> float:
+        if a is None or b is None:
+            return 0
+        return self.distance_map.get((self.order[a], self.order[b]), 0) * self.cost_per_distance
+
+    def _neighbours(self, k: int):
+        before = self.activated[k - 1] if k > 0 else None
+        after = self.activated[k + 1] if k + 1 < len(self.activated) else None
+        return before, after
+
+    def activate(self, vertiport: str):
+        """Add a vertiport to the activated set, updating the cost by its two links."""
+        p = self.position[vertiport]
+        k = bisect_left(self.activated, p)
+        if k < len(self.activated) and self.activated[k] == p:
+            return
+        self.activated.insert(k, p)
+        before, after = self._neighbours(k)
+        self.cost += self._link(before, p) + self._link(p, after) - self._link(before, after)
+
+    def deactivate(self, vertiport: str):
+        p = self.position[vertiport]
+        k = bisect_left(self.activated, p)
+        if k == len(self.activated) or self.activated[k] != p:
+            return
+        before, after = self._neighbours(k)
+        del self.activated[k]
+        self.cost += self._link(before, after) - self._link(before, p) - self._link(p, after)
+
+    def sync_activations(self, vertiport_states: Dict):
+        """Apply the differences between `vertiport_states` and the tracked activated set."""
+        for vertiport, state in vertiport_states.items():
+            p = self.position[vertiport]
+            k = bisect_left(self.activated, p)
+            tracked = k < len(self.activated) and self.activated[k] == p
+            if state["activated"] and not tracked:
+                self.activate(vertiport)
+            elif not state["activated"] and tracked:
+                self.deactivate(vertiport)
+
+    # --- per-step deltas --------------------------------------------------------------
+
+    def add_demand(self, demand):
+        """Count a step's new demand (DemandBatch or list of demand dicts) per route."""
+        if isinstance(demand, DemandBatch):
+            np.add.at(self.route_demand, demand.route_codes(), demand.flow)
+            return
+        n = len(self.names)
+        for d in demand:
+            self.route_demand[self.code[d["start"]] * n + self.code[d["end"]]] += d["flow"]
+
+    def record_dispatch(self, start: str, end: str, count: int = 1):
+        s, e = self.code[start], self.code[end]
+        self.route_served[s * len(self.names) + e] += count
+        self.departures[s] += count
+        self.arrivals[e] += count
+
+    def record_movements(self, vehicle_movements: Dict):
+        """Record the flights of a step's `vehicle_movements` ({vehicle: (start, end) or None})."""
+        for route, count in Counter(m for m in vehicle_movements.values() if m).items():
+            self.record_dispatch(route[0], route[1], count)
+
+    def end_step(self, met: int, total: int, unmet_flow: int, dispatched: int = 0):
+        """Close a step with its final pass's met and total demand and the flow carried over."""
+        coverage = calculate_coverage_rate(met, total)
+        self.steps += 1
+        self.met += met
+        self.total += total
+        self.coverage_sum += coverage
+        self.unmet_flow = unmet_flow
+        self.recent.append((coverage, met, total, unmet_flow, dispatched))
+
+    # --- reports ---------------------------------------------------------------------
+
+    @property
+    def coverage_rate(self) -> float:
+        """Met over total demand of all closed steps."""
+        return calculate_coverage_rate(self.met, self.total)
+
+    def window_stats(self) -> Dict:
+        """Statistics of the last `window` steps."""
+        if not self.recent:
+            return {"steps": 0}
+        coverage, met, total, unmet_flow, dispatched = (np.array(column) for column in zip(*self.recent))
+        return {
+            "steps": len(self.recent),
+            "coverage_rate": calculate_coverage_rate(int(met.sum()), int(total.sum())),
+            "mean_step_coverage": float(coverage.mean()),
+            "mean_unmet_flow": float(unmet_flow.mean()),
+            "mean_dispatched": float(dispatched.mean()),
+        }
+
+    def utilization(self) -> Dict[str, float]:
+        """Flights departing or arriving per step at each vertiport that saw any."""
+        steps = max(self.steps, 1)
+        busy = np.flatnonzero(self.departures + self.arrivals)
+        return {self.names[i]: float(self.departures[i] + self.arrivals[i]) / steps for i in busy}
+
+    def route_service_rates(self) -> Dict[Tuple[str, str], float]:
+        """Flights served over new demand for every route that had demand."""
+        routes = np.flatnonzero(self.route_demand)
+        rates = self.route_served[routes] / self.route_demand[routes]
+        start, end = np.divmod(routes, len(self.names))
+        return {(self.names[s], self.names[e]): float(r) for s, e, r in zip(start, end, rates)}
+
+    def summary(self, top: int = 5) -> Dict:
+        """End-of-run totals, the busiest vertiports and the worst-served routes."""
+        utilization = self.utilization()
+        service = self.route_service_rates()
+        return {
+            "steps": self.steps,
+            "met_demand": self.met,
+            "total_demand": self.total,
+            "coverage_rate": self.coverage_rate,
+            "mean_step_coverage": self.coverage_sum / self.steps if self.steps else 0,
+            "unmet_flow": self.unmet_flow,
+            "flights": int(self.departures.sum()),
+            "total_cost": float(self.cost),
+            "busiest_vertiports": sorted(utilization.items(), key=lambda item: -item[1])[:top],
+            "worst_served_routes": sorted(service.items(), key=lambda item: item[1])[:top],
+        }
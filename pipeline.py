@@ -0,0 +1,333 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import pandas as pd
+
+CACHE_DIR = ".pipeline_cache"
+KEEP_VARIANTS = 8  # 每个阶段保留的缓存版本数
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stage(NamedTuple):
+    name: str
+    command: List[str]     # argv, run from the repository root
+    inputs: List[str]      # files read, relative to the repository root; the script and its local imports are added
+    outputs: List[str]     # files written, relative to the repository root
+    stdout: Optional[str] = None  # capture stdout here as an extra output (default: a log in the cache)
+    appends: Sequence[str] = ()   # CSV histories the stage appends rows to; not fingerprinted, replayed on restore
+
+
+def file_digest(path: str, chunk: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def local_modules(script: str, root: str = ROOT) -> List[str]:
+    """`script` plus every module of this repository it imports, transitively."""
+    seen, pending = set(), [os.path.join(root, script)]
+    while pending:
+        path = pending.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.add(path)
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            pending.extend(os.path.join(root, name.split(".")[0] + ".py") for name in names)
+    return sorted(os.path.relpath(path, root) for path in seen)
+
+
+class StageCache:
+    """
+    Content-addressed cache of stage outputs.
+
+    A stage's fingerprint hashes its command, its input files and the source of the code it
+    runs. Every run stores its outputs under their content hash and records them against the
+    fingerprint, so a stage whose fingerprint was seen before is restored instead of re-run,
+    also after switching a parameter back. File hashes are memoised by (size, mtime).
+
+    Files a stage appends to keep growing across runs, so they are neither fingerprinted nor
+    restored whole: the rows a run appended are stored, and appended again when it is restored.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        for sub in ("objects", "stages", "logs"):
+            os.makedirs(os.path.join(cache_dir, sub), exist_ok=True)
+        self._hashes_path = os.path.join(cache_dir, "hashes.json")
+        self._hashes = {}
+        if os.path.exists(self._hashes_path):
+            with open(self._hashes_path) as f:
+                self._hashes = json.load(f)
+
+    def digest(self, path: str) -> Optional[str]:
+        """Content hash of `path` (relative to the repository root), None if it does not exist."""
+        path = os.path.join(ROOT, path)
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        known = self._hashes.get(key)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        value = file_digest(path)
+        self._hashes[key] = [stat.st_size, stat.st_mtime_ns, value]
+        return value
+
+    def fingerprint(self, stage: Stage) -> str:
+        script = next((arg for arg in stage.command if arg.endswith(".py")), None)
+        code = local_modules(script) if script else []
+        payload = json.dumps({
+            "command": stage.command,
+            "inputs": {path: self.digest(path) for path in stage.inputs},
+            "code": {path: self.digest(path) for path in code},
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def log_path(self, stage: Stage) -> str:
+        if stage.stdout:
+            return os.path.join(ROOT, stage.stdout)
+        return os.path.join(self.cache_dir, "logs", f"{stage.name}.log")
+
+    def _manifest_path(self, stage: Stage) -> str:
+        return os.path.join(self.cache_dir, "stages", f"{stage.name}.json")
+
+    def _manifest(self, stage: Stage) -> Dict:
+        path = self._manifest_path(stage)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def restore(self, stage: Stage, fingerprint: str) -> bool:
+        """Bring the outputs recorded for `fingerprint` into place. False if there are none."""
+        entry = self._manifest(stage).get(fingerprint)
+        if entry is None:
+            return False
+        objects = os.path.join(self.cache_dir, "objects")
+        if not all(self.digest(path) == value or os.path.exists(os.path.join(objects, value))
+                   for path, value in entry["outputs"].items()):
+            return False
+        appended = entry.get("appended", {})
+        if not all(os.path.exists(os.path.join(objects, value)) for value in appended.values()):
+            return False
+        for path, value in entry["outputs"].items():
+            if self.digest(path) != value:
+                shutil.copyfile(os.path.join(objects, value), os.path.join(ROOT, path))
+        for path, value in appended.items():
+            target = os.path.join(ROOT, path)
+            pd.read_csv(os.path.join(objects, value)).to_csv(target, mode="a", index=False,
+                                                             header=not os.path.exists(target))
+        return True
+
+    @staticmethod
+    def count_rows(stage: Stage) -> Dict[str, int]:
+        """Rows already in each file the stage appends to, taken before it runs."""
+        return {path: len(pd.read_csv(os.path.join(ROOT, path))) if os.path.exists(os.path.join(ROOT, path)) else 0
+                for path in stage.appends}
+
+    def _store_object(self, path: str) -> str:
+        value = file_digest(path)
+        target = os.path.join(self.cache_dir, "objects", value)
+        if not os.path.exists(target):
+            shutil.copyfile(path, target + ".tmp")
+            os.replace(target + ".tmp", target)
+        return value
+
+    def store(self, stage: Stage, fingerprint: str, seconds: float, rows_before: Optional[Dict[str, int]] = None):
+        outputs = {}
+        for path in stage.outputs + ([stage.stdout] if stage.stdout else []):
+            value = self.digest(path)
+            if value is None:
+                raise FileNotFoundError(f"stage {stage.name} did not write {path}")
+            outputs[path] = self._store_object(os.path.join(ROOT, path))
+        appended = {}
+        for path, before in (rows_before or {}).items():
+            if not os.path.exists(os.path.join(ROOT, path)):
+                continue
+            rows = pd.read_csv(os.path.join(ROOT, path)).iloc[before:]
+            if rows.empty:
+                continue
+            # 只保存本次运行追加的行
+            staging = os.path.join(self.cache_dir, "appended.tmp")
+            rows.to_csv(staging, index=False)
+            appended[path] = self._store_object(staging)
+            os.remove(staging)
+        manifest = self._manifest(stage)
+        manifest.pop(fingerprint, None)
+        manifest[fingerprint] = {"outputs": outputs, "appended": appended, "seconds": seconds, "created": time.time()}
+        manifest = dict(list(manifest.items())[-KEEP_VARIANTS:])
+        with open(self._manifest_path(stage), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    def save(self):
+        with open(self._hashes_path + ".tmp", "w") as f:
+            json.dump(self._hashes, f)
+        os.replace(self._hashes_path + ".tmp", self._hashes_path)
+
+
+def dependencies(stages: Sequence[Stage]) -> Dict[str, List[str]]:
+    """Upstream stages of every stage: the ones writing a file it reads."""
+    producer = {}
+    for stage in stages:
+        for path in stage.outputs + ([stage.stdout] if stage.stdout else []) + list(stage.appends):
+            if path in producer:
+                raise ValueError(f"{path} is written by both {producer[path]} and {stage.name}")
+            producer[path] = stage.name
+    return {stage.name: sorted({producer[path] for path in stage.inputs if path in producer} - {stage.name})
+            for stage in stages}
+
+
+def run_pipeline(stages: Sequence[Stage], workers: int = 2, cache: Optional[StageCache] = None,
+                 force: Sequence[str] = (), dry_run: bool = False) -> List[Dict]:
+    """
+    Run the stages in dependency order, independent ones concurrently, skipping the ones
+    whose fingerprint is cached.
+
+    A stage is fingerprinted when its upstream stages have finished, so it sees their
+    final outputs. When a stage fails its downstream stages are skipped; the others go on.
+    With `dry_run` nothing is executed, and the stages below one that would run would run too.
+    :return: one row per stage with its status ("cached", "ran", "failed", "skipped",
+        "would run") and the seconds spent on it.
+    """
+    cache = cache or StageCache()
+    by_name = {stage.name: stage for stage in stages}
+    upstream = dependencies(stages)
+    status, timings = {}, []
+
+    def execute(stage: Stage):
+        begin = time.perf_counter()
+        fingerprint = cache.fingerprint(stage)
+        if stage.name not in force and cache.restore(stage, fingerprint):
+            return "cached", time.perf_counter() - begin
+        if dry_run:
+            return "would run", time.perf_counter() - begin
+        rows_before = cache.count_rows(stage)
+        with open(cache.log_path(stage), "w") as log:
+            completed = subprocess.run(stage.command, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+        seconds = time.perf_counter() - begin
+        if completed.returncode != 0:
+            return "failed", seconds
+        cache.store(stage, fingerprint, seconds, rows_before)
+        return "ran", seconds
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        running = {}
+        while len(status) < len(stages):
+            progress = False
+            for stage in stages:
+                if stage.name in status or stage.name in running.values():
+                    continue
+                before = [status.get(name) for name in upstream[stage.name]]
+                inherited = next((state for state in ("failed", "would run") if state in before), None)
+                if inherited or "skipped" in before:
+                    status[stage.name] = "would run" if inherited == "would run" else "skipped"
+                    timings.append({"stage": stage.name, "status": status[stage.name], "seconds": 0.0})
+                    progress = True
+                elif all(state is not None for state in before):
+                    print(f"[{stage.name}] started")
+                    running[executor.submit(execute, stage)] = stage.name
+            if not running:
+                if not progress:
+                    raise ValueError(f"dependency cycle among {sorted(set(by_name) - set(status))}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                state, seconds = future.result()
+                status[name] = state
+                timings.append({"stage": name, "status": state, "seconds": seconds})
+                note = f", log: {cache.log_path(by_name[name])}" if state == "failed" else ""
+                print(f"[{name}] {state} in {seconds:.2f} s{note}")
+    cache.save()
+    return timings
+
+
+def default_stages(args) -> List[Stage]:
+    """get_od -> data_processing / kmeans_align -> kmeans_OD_batch -> vertiport_locator -> simulation."""
+    python = sys.executable
+    return [
+        Stage("get_od", [python, "get_od.py"], ["save_od.csv"],
+              ["save_od_with_id.csv", "value_mapping.csv", "h-odflow.npz", "distance1.csv"]),
+        Stage("data_processing", [python, "data_processing.py"], ["save_od_with_id.csv"],
+              ["UAM_travel_data.csv"]),
+        Stage("kmeans_align", [python, "kmeans_align.py"], ["save_od_with_id.csv"],
+              ["adjusted_vertiports_numeric.csv", "final_vertiports_with_grid.csv"]),
+        Stage("kmeans_OD_batch",
+              [python, "kmeans_OD_batch.py", "--odflow_file", "h-odflow.npz",
+               "--max_intervals", str(args.max_intervals), "--batch_size", str(args.batch_size),
+               "--activation", args.activation, "--solve_history", args.solve_history],
+              ["h-odflow.npz", "adjusted_vertiports_numeric.csv"],
+              ["optimized_results_with_vertiport_mapping.csv"], appends=[args.solve_history]),
+        Stage("vertiport_mapping", [python, "vertiport_locator.py", "--detailed_file", ""],
+              ["optimized_results_with_vertiport_mapping.csv", "adjusted_vertiports_numeric.csv",
+               "distance_matrix.csv"],
+              ["updated_flow_data_with_vertiports.csv"]),
+        Stage("simulation",
+              [python, "simulation.py", "--num_iterations", str(args.num_iterations),
+               "--charging_rate", str(args.charging_rate), "--discharge_rate", str(args.discharge_rate)],
+              ["adjusted_vertiports_numeric.csv", "distance_matrix.csv", "updated_flow_data_with_vertiports.csv"],
+              [], stdout=args.simulation_output),
+    ]
+
+
+def write_timings(path: str, timings: List[Dict]):
+    """Append this run's per-stage rows to a CSV."""
+    rows = pd.DataFrame(timings)
+    rows.insert(0, "run", time.strftime("%Y-%m-%d %H:%M:%S"))
+    rows.to_csv(path, mode="a", index=False, header=not os.path.exists(path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the UAM pipeline, re-running only stages whose inputs changed.")
+    parser.add_argument("--stages", nargs="*", default=None,
+                        help="run only these stages; the outputs of the others are used as they are on disk")
+    parser.add_argument("--force", nargs="*", default=[], help="re-run these stages even if cached")
+    parser.add_argument("--workers", type=int, default=2, help="stages run concurrently")
+    parser.add_argument("--cache_dir", default=CACHE_DIR)
+    parser.add_argument("--dry_run", action="store_true", help="restore cached stages, only list the others")
+    parser.add_argument("--timings_file", default=None, help="CSV the per-stage timings are appended to")
+    parser.add_argument("--max_intervals", type=int, default=500)
+    parser.add_argument("--batch_size", type=int, default=50)
+    parser.add_argument("--activation", choices=["milp", "mipstart", "heuristic"], default="milp")
+    parser.add_argument("--solve_history", default="batch_solve_times.csv",
+                        help="batch solve-time CSV kmeans_OD_batch appends to")
+    parser.add_argument("--num_iterations", type=int, default=2)
+    parser.add_argument("--charging_rate", type=float, default=20)
+    parser.add_argument("--discharge_rate", type=float, default=0.5)
+    parser.add_argument("--simulation_output", default="simulation_output.txt")
+    args = parser.parse_args()
+
+    stages = default_stages(args)
+    if args.stages is not None:
+        unknown = set(args.stages) - {stage.name for stage in stages}
+        if unknown:
+            parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+        stages = [stage for stage in stages if stage.name in args.stages]
+
+    timings = run_pipeline(stages, args.workers, StageCache(args.cache_dir), args.force, args.dry_run)
+    print(f"{'stage':<20}{'status':<12}{'seconds':>10}")
+    for row in timings:
+        print(f"{row['stage']:<20}{row['status']:<12}{row['seconds']:>10.2f}")
+    if args.timings_file:
+        write_timings(args.timings_file, timings)
+    if any(row["status"] in ("failed", "skipped") for row in timings):
+        sys.exit(1)
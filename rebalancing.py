@@ -0,0 +1,85 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from demand_batch import DemandBatch
+from distance_battery import battery_consumption_required
+
+
+def forecast_outflow(demand_per_time: List, t: int, horizon: int, names: Sequence[str]) -> np.ndarray:
+    """Demand leaving each vertiport over steps t+1 .. t+horizon (in `names` order)."""
+    code = {name: i for i, name in enumerate(names)}
+    outflow = np.zeros(len(names))
+    for step in range(t + 1, min(t + 1 + horizon, len(demand_per_time))):
+        demand = demand_per_time[step]
+        if isinstance(demand, DemandBatch):
+            outflow += np.bincount(demand.start, weights=demand.flow, minlength=len(names))
+        else:
+            for d in demand:
+                outflow[code[d["start"]]] += d["flow"]
+    return outflow
+
+
+def rebalance_idle_vehicles(plane_status: Dict, demand_per_time: List, t: int, horizon: int,
+                            discharge_rate: float, names: Sequence[str], distance_table: np.ndarray,
+                            min_battery: float = 0) -> List:
+    """
+    Move idle (standby) vehicles towards the vertiports where the next `horizon` steps of demand start.
+
+    Each vertiport's target is its share of the forecast outflow times the vehicles that will be
+    there next step (standby plus those arriving). Surplus idle vehicles are matched to deficit
+    slots as a transportation problem over `distance_table`, keeping at least `min_battery`
+    after the repositioning flight. Moved vehicles are marked in_service, so they are standby at
+    their new vertiport next step.
+
+    :return: List of (vehicle_id, from, to) moves.
+    """
+    outflow = forecast_outflow(demand_per_time, t, horizon, names)
+    if outflow.sum() == 0:
+        return []
+
+    code = {name: i for i, name in enumerate(names)}
+    idle = {i: [] for i in range(len(names))}
+    fleet = np.zeros(len(names), dtype=int)
+    for vehicle_id, status in plane_status.items():
+        if status["status"] in ("standby", "in_service"):
+            fleet[code[status["location"]]] += 1
+        if status["status"] == "standby":
+            idle[code[status["location"]]].append(vehicle_id)
+
+    # Target distribution of the available fleet, proportional to the forecast
+    share = fleet.sum() * outflow / outflow.sum()
+    target = np.floor(share).astype(int)
+    target[np.argsort(target - share)[:fleet.sum() - target.sum()]] += 1
+
+    surplus_vehicles = []
+    for i in range(len(names)):
+        extra = min(fleet[i] - target[i], len(idle[i]))
+        if extra > 0:
+            # Send the best-charged vehicles
+            surplus_vehicles += sorted(idle[i], key=lambda v: -plane_status[v]["battery"])[:extra]
+    deficit_slots = np.repeat(np.arange(len(names)), np.maximum(target - fleet, 0))
+    if not surplus_vehicles or len(deficit_slots) == 0:
+        return []
+
+    origin = np.array([code[plane_status[v]["location"]] for v in surplus_vehicles])
+    battery = np.array([plane_status[v]["battery"] for v in surplus_vehicles], dtype=float)
+    distance = distance_table[origin[:, None], deficit_slots[None, :]]
+    feasible = battery[:, None] - battery_consumption_required(distance, discharge_rate) >= min_battery
+
+    # Infeasible pairs are priced out and dropped after the assignment
+    cost = np.where(feasible, distance, distance.max() * len(deficit_slots) + 1)
+    rows, cols = linear_sum_assignment(cost)
+
+    moves = []
+    for row, col in zip(rows, cols):
+        if not feasible[row, col]:
+            continue
+        vehicle_id = surplus_vehicles[row]
+        start, end = names[origin[row]], names[deficit_slots[col]]
+        plane_status[vehicle_id]["status"] = "in_service"
+        plane_status[vehicle_id]["location"] = end
+        plane_status[vehicle_id]["battery"] -= battery_consumption_required(distance[row, col], discharge_rate)
+        moves.append((vehicle_id, start, end))
+    return moves
@@ -0,0 +1,102 @@
+import argparse
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from data_processing import (BIN_MINUTES, RUSH_HOUR_CACHE_DIR, TIME_ORIGIN, UAM_PROBABILITIES,
+                             load_rush_hour_scores, rush_hour_steps, uam_probability)
+from vertiport_locator import VertiportLocator
+
+
+def read_trip_columns(data_file: str, vertiports: pd.DataFrame, chunksize: int = 200_000,
+                      origin: str = TIME_ORIGIN) -> Dict[str, np.ndarray]:
+    """
+    Stream the trip CSV and keep only the per-trip columns the mode choice needs.
+
+    Distance follows `data_processing.load_and_preprocess`. Trips are snapped to their
+    nearest vertiports (see `vertiport_locator`) and binned into 15-minute steps from `origin`.
+    """
+    locator = VertiportLocator(vertiports["Vertiport"], vertiports["Latitude"], vertiports["Longitude"])
+    origin = pd.Timestamp(origin)
+
+    columns = {"step": [], "start": [], "end": [], "distance": []}
+    for chunk in pd.read_csv(data_file, chunksize=chunksize,
+                             usecols=["lat_on", "lon_on", "time_on", "lat_off", "lon_off"]):
+        time_on = pd.to_datetime(chunk["time_on"])
+        lat_on, lon_on = chunk["lat_on"].to_numpy(), chunk["lon_on"].to_numpy()
+        lat_off, lon_off = chunk["lat_off"].to_numpy(), chunk["lon_off"].to_numpy()
+        columns["distance"].append(np.sqrt((lat_on - lat_off) ** 2 + (lon_on - lon_off) ** 2))
+        columns["step"].append(((time_on - origin) // pd.Timedelta(minutes=BIN_MINUTES)).to_numpy())
+        columns["start"].append(locator.nearest(lat_on, lon_on)[1].astype(np.int32))
+        columns["end"].append(locator.nearest(lat_off, lon_off)[1].astype(np.int32))
+
+    return {name: np.concatenate(parts) if parts else np.empty(0) for name, parts in columns.items()}
+
+
+def generate_scenarios(data_file: str, vertiports_file: str, distance_file: str, output_dir: str,
+                       num_scenarios: int, seed: int = 0, probabilities: Optional[Sequence[Dict]] = None,
+                       chunksize: int = 200_000, origin: str = TIME_ORIGIN,
+                       cache_dir: Optional[str] = RUSH_HOUR_CACHE_DIR) -> List[str]:
+    """
+    Draw `num_scenarios` independent UAM demand scenarios from one pass over the trip data
+    (plus one over its time_on column the first time the rush-hour scores are computed).
+
+    Scenario i uses the random stream (seed, i), so it does not depend on how many scenarios
+    are generated, and `probabilities[i % len(probabilities)]` as its mode-choice table.
+    Rush hours come from the dataset's cached `data_processing.load_rush_hour_scores`.
+    Each scenario is written as scenario_<i>.npz with per-route columns (step, start, end,
+    flow, distance) that `demand_index.load_demand_scenario` reads. Trips whose nearest
+    vertiports coincide, or that start before `origin`, are not UAM demand and are dropped.
+
+    :return: Paths of the written scenario files.
+    """
+    probabilities = list(probabilities or [UAM_PROBABILITIES])
+    vertiports = pd.read_csv(vertiports_file)
+    distance_data = pd.read_csv(distance_file, index_col=0)
+    names = vertiports["Vertiport"].tolist()
+    distance_table = distance_data.loc[names, names].to_numpy(dtype=float)
+
+    trips = read_trip_columns(data_file, vertiports, chunksize, origin)
+    scores = load_rush_hour_scores(data_file, cache_dir=cache_dir, chunksize=chunksize)
+    rush = rush_hour_steps(scores, origin).reindex(trips["step"], fill_value=False).to_numpy()
+    short = trips["distance"] <= np.quantile(trips["distance"], 0.40)
+    flight = (trips["start"] != trips["end"]) & (trips["step"] >= 0)
+
+    n = len(names)
+    route_key = (trips["step"] * n + trips["start"]) * n + trips["end"]
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for i in range(num_scenarios):
+        p = uam_probability(rush, short, probabilities[i % len(probabilities)])
+        uam = np.random.default_rng([seed, i]).random(len(p)) < p
+
+        keys, flow = np.unique(route_key[uam & flight], return_counts=True)
+        step, rest = np.divmod(keys, n * n)
+        start, end = np.divmod(rest, n)
+
+        path = os.path.join(output_dir, f"scenario_{i:03d}.npz")
+        np.savez_compressed(path, names=np.array(names), step=step.astype(np.int32),
+                            start=start.astype(np.int32), end=end.astype(np.int32),
+                            flow=flow.astype(np.int64), distance=distance_table[start, end])
+        paths.append(path)
+        print(f"Scenario {i}: {int(uam.sum())} UAM trips, {len(keys)} routes -> {path}")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_file", default="save_od_with_id.csv")
+    parser.add_argument("--vertiports_file", default="adjusted_vertiports_numeric.csv")
+    parser.add_argument("--distance_file", default="distance_matrix.csv")
+    parser.add_argument("--output_dir", default="scenarios")
+    parser.add_argument("--num_scenarios", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--origin", default=TIME_ORIGIN, help="start of time step 0")
+    args = parser.parse_args()
+
+    generate_scenarios(args.data_file, args.vertiports_file, args.distance_file, args.output_dir,
+                       args.num_scenarios, seed=args.seed, chunksize=args.chunksize, origin=args.origin)
@@ -1,11 +1,22 @@
-from generate_solution import regenerate_solution
+from generate_solution import regenerate_solution, regenerate_k_best, SpeculativeFallback
 from initialization import initialize_states_with_time
-from distance_battery import calculate_distance
-from metrics import calculate_coverage_rate, calculate_cost, update_demand_chart
+from distance_battery import calculate_distance, vertiport_names, distance_table
+from demand_batch import DemandBatch
+from metrics import calculate_coverage_rate, update_demand_chart, calculate_demand_met, MetricsAccumulator
+from unmet_ledger import UnmetDemandLedger
 from task_assignment import time_step_path_assignment
 from battery_charging import charging_and_battery_update, restore_vehicle_states
+from battery_model import BatteryModel
+from event_simulation import EventSimulation
+from rebalancing import rebalance_idle_vehicles
+from checkpoint import Checkpointer, snapshot_state, load_checkpoint, resume_kwargs
+from instrumentation import Profiler, NULL_PROFILER
+from solution_cache import SolutionCache
+from demand_index import build_demand_batches, load_demand_scenario
+from functools import partial
 import pandas as pd
 import argparse
+import time
 def load_distance_map(distance_file):
     """加载距离矩阵并生成 distance_map"""
     distance_matrix = pd.read_csv(distance_file, index_col=0)
@@ -17,9 +28,14 @@ def load_distance_map(distance_file):
                 distance_map[(start, end)] = distance_matrix.loc[start, end]
     return distance_map
 
-def load_gurobi_results(file_path: str, time_step: int):
-    """Load Gurobi results from a CSV file and convert them to list format."""
+def load_gurobi_results(file_path: str, time_step: int, as_batch: bool = False):
+    """Load Gurobi results from a CSV file and convert them to list format (or a DemandBatch)."""
     data = pd.read_csv(file_path)
+    if as_batch:
+        rows = data[data["Time"] == f"T{time_step}"]
+        code = {name: i for i, name in enumerate(vertiport_names)}
+        return DemandBatch(vertiport_names, rows["start"].map(code), rows["end"].map(code),
+                           rows["flow"].astype(int), rows["distance"])
     grouped = data.groupby('Time')
     for time, group in grouped:
         if time == f"T{time_step}":
@@ -58,30 +74,6 @@ def reset_plane_status(plane_status):
             status["status"] = "charging"  # Planes with low battery are set to charging
 
 # Main Simulation Functions
-def calculate_demand_met(gurobi_results, vehicle_movements, unmet_demand):
-    """Calculate the met demand for the current iteration."""
-    total_met_demand = 0
-    total_demand = 0
-
-    current_demand = [
-        {"start": start, "end": end, "flow": flow}
-        for start, end, flow in unmet_demand
-    ] + gurobi_results
-
-    for route in current_demand:
-        start, end, required_demand = route["start"], route["end"], route["flow"]
-        total_demand += required_demand
-
-        vehicles_on_route = sum(
-            1 for vehicle_id, movement in vehicle_movements.items()
-            if movement == (start, end)
-        )
-
-        met_demand = min(required_demand, vehicles_on_route)
-        total_met_demand += met_demand
-
-    return total_met_demand, total_demand
-
 # def run_iterations(num_iterations, vehicle_states, vertiport_states, gurobi_results_per_time, charging_rate,
 #                    discharge_rate, regenerate_solution, plane_status):
 #     unmet_demand = []
@@ -199,21 +191,66 @@ def calculate_demand_met(gurobi_results, vehicle_movements, unmet_demand):
 
 
 def run_iterations(num_iterations, vehicle_states, vertiport_states, gurobi_results_per_time, charging_rate,
-                   discharge_rate, regenerate_solution, plane_status, distance_map):
-    unmet_demand = []
-    flag = 0  # Initialize flag
-    stuck_iteration = 0
-
-    for t in range(num_iterations):
+                   discharge_rate, regenerate_solution, plane_status, distance_map, regenerate_alternatives=None,
+                   dispatch="greedy", rebalance_horizon=0, rebalance_min_battery=0, start_step=0,
+                   unmet_demand=None, flag=0, stuck_iteration=0, last_solution=None, checkpointer=None,
+                   profiler=NULL_PROFILER, speculator=None, coverage_threshold=0.6, max_retries=5, on_step=None,
+                   metrics=None):
+    """
+    Run the step simulation.
+
+    If `regenerate_alternatives` is given (see `generate_solution.regenerate_k_best`), a coverage
+    failure solves once for ranked alternatives and later retries of the same step walk that list
+    instead of calling the solver again. `dispatch` is passed to `time_step_path_assignment`.
+    With `rebalance_horizon` > 0, idle vehicles are repositioned after charging towards the
+    next `rebalance_horizon` steps of demand (see `rebalancing.rebalance_idle_vehicles`).
+
+    Steps run from `start_step` up to `num_iterations`; `unmet_demand`, `flag`, `stuck_iteration`
+    and `last_solution` carry the loop state of a resumed run (see `checkpoint.resume_kwargs`).
+    A `checkpoint.Checkpointer` snapshots the full state after every `checkpointer.every` steps.
+    An `instrumentation.Profiler` records per-step phase timings and counters.
+    A `generate_solution.SpeculativeFallback` (also passed as `regenerate_solution`) is told the
+    likely fallback problems early: the next step's when a step ends with unmet demand, and the
+    exact one as soon as a step's coverage falls below the threshold, so solves overlap with the
+    simulation.
+
+    A pass whose coverage is below `coverage_threshold` is retried with a fallback solution;
+    after `max_retries` failed passes the loop stops simulating. `on_step` is called after every
+    step with a dict of that step's metrics (coverage, demand, unmet flow, cost, passes, seconds).
+
+    Running totals go to a `metrics.MetricsAccumulator` (one is created if `metrics` is None,
+    a resumed run gets the snapshot's), which is returned and checkpointed with the loop state;
+    vertiport activations are read from `vertiport_states` once at the start.
+
+    Unmet demand is carried in an `unmet_ledger.UnmetDemandLedger`, which tracks its age per route
+    and counts each pass's flights as served; a list of (start, end, flow) tuples (e.g. from an
+    older checkpoint) is loaded into a new ledger.
+    """
+    if not isinstance(unmet_demand, UnmetDemandLedger):
+        ledger = UnmetDemandLedger(vertiport_names, distance_table)
+        ledger.set_step(start_step)
+        ledger.extend(unmet_demand or [])
+        unmet_demand = ledger
+    if metrics is None:
+        metrics = MetricsAccumulator(vertiport_names, distance_map, list(vertiport_states), cost_per_distance=10)
+    metrics.sync_activations(vertiport_states)
+    gurobi_results = last_solution
+    alternatives, alternatives_step, alternative_rank = None, None, 0
+
+    for t in range(start_step, num_iterations):
         iteration_complete = False
+        step_begin = time.perf_counter()
+        passes, coverage_rate, total_met_demand, total_demand, total_cost = 0, None, 0, 0, None
 
-        while not iteration_complete and stuck_iteration < 5:
+        while not iteration_complete and stuck_iteration < max_retries:
+            passes += 1
             print(f"Time Step {t + 1}")
 
 
             # Step 0: Restore vehicle states and reset plane statuses
-            restore_vehicle_states(vehicle_states)
-            reset_plane_status(plane_status)
+            with profiler.phase("reset"):
+                restore_vehicle_states(vehicle_states)
+                reset_plane_status(plane_status)
 
             # Initialize movement tracking for this timestep
             vehicle_movements = {vehicle_id: None for vehicle_id in vehicle_states.keys()}
@@ -221,34 +258,69 @@ def run_iterations(num_iterations, vehicle_states, vertiport_states, gurobi_resu
             # Step 1: Update total demand
             if isinstance(gurobi_results_per_time[t], dict):
                 gurobi_results_per_time[t] = [gurobi_results_per_time[t]]
+            unmet_demand.set_step(t, gurobi_results_per_time[t])
 
-            total_demand = update_demand_chart(unmet_demand, gurobi_results_per_time[t])
+            with profiler.phase("demand_chart"):
+                total_demand = update_demand_chart(unmet_demand, gurobi_results_per_time[t])
 
             # Step 2: Assign vehicles to tasks
             if flag == 1:
+                profiler.count("retries")
+            if flag == 1 and regenerate_alternatives is not None:
+                if alternatives_step != t or alternative_rank >= len(alternatives):
+                    profiler.count("solver_calls")
+                    with profiler.phase("solve"):
+                        alternatives = regenerate_alternatives(t, unmet_demand, vehicle_states, vertiport_states, gurobi_results)
+                    alternatives_step, alternative_rank = t, 0
+                if alternative_rank < len(alternatives):
+                    print(f"Flag set: Using alternative solution {alternative_rank + 1}/{len(alternatives)}.")
+                    gurobi_results = alternatives.solution(alternative_rank)
+                    alternative_rank += 1
+                else:
+                    gurobi_results = []
+                flag = 0
+            elif flag == 1:
                 print("Flag set: Retrieving second-best solution from Gurobi.")
-                gurobi_results = regenerate_solution(t, unmet_demand, vehicle_states, vertiport_states, gurobi_results, get_second_best=False)
+                profiler.count("solver_calls")
+                with profiler.phase("solve"):
+                    gurobi_results = regenerate_solution(t, unmet_demand, vehicle_states, vertiport_states, gurobi_results, get_second_best=False)
                 flag = 0
             else:
-                gurobi_results = gurobi_results_per_time[t] + [
-                    {"start": start, "end": end, "flow": needed, "distance": calculate_distance(start, end)}
-                    for start, end, needed in unmet_demand
-                ]
+                with profiler.phase("merge_unmet"):
+                    if isinstance(gurobi_results_per_time[t], DemandBatch):
+                        gurobi_results = DemandBatch.concat([
+                            gurobi_results_per_time[t],
+                            DemandBatch.from_tuples(unmet_demand, gurobi_results_per_time[t].names, distance_table)
+                        ])
+                    else:
+                        gurobi_results = gurobi_results_per_time[t] + [
+                            {"start": start, "end": end, "flow": needed, "distance": calculate_distance(start, end)}
+                            for start, end, needed in unmet_demand
+                        ]
 
             unmet_demand.clear()
 
-            time_step_path_assignment(
-                gurobi_results, vehicle_states, vertiport_states, unmet_demand, discharge_rate,
-                vehicle_movements, plane_status
-            )
+            # greedy 对每条路线扫描一遍机队，assignment 按起点分组只扫描一遍
+            profiler.count("routes_processed", len(gurobi_results))
+            profiler.count("vehicles_scanned", len(plane_status) * (len(gurobi_results) if dispatch == "greedy" else 1))
+            with profiler.phase("assignment"):
+                time_step_path_assignment(
+                    gurobi_results, vehicle_states, vertiport_states, unmet_demand, discharge_rate,
+                    vehicle_movements, plane_status, dispatch=dispatch
+                )
+                unmet_demand.settle(vehicle_movements)
 
             # Step 3: Calculate demand metrics
-            total_met_demand, total_demand = calculate_demand_met(gurobi_results, vehicle_movements, unmet_demand)
-            coverage_rate = calculate_coverage_rate(total_met_demand, total_demand)
+            with profiler.phase("metrics"):
+                total_met_demand, total_demand = calculate_demand_met(gurobi_results, vehicle_movements, unmet_demand)
+                coverage_rate = calculate_coverage_rate(total_met_demand, total_demand)
             print(f"Current Coverage Rate: {coverage_rate:.2f}")
+            # 覆盖率不足时马上在后台求解回退问题, 与下面的输出和重置重叠
+            if (speculator is not None and regenerate_alternatives is None and coverage_rate < coverage_threshold
+                    and stuck_iteration + 1 < max_retries):
+                speculator.speculate(t, unmet_demand)
 
-            activated_vertiports = [v for v, state in vertiport_states.items() if state["activated"]]
-            total_cost = calculate_cost(activated_vertiports, cost_per_distance=10, distance_map=distance_map)
+            total_cost = metrics.cost
             print(f"Current Total Cost: {total_cost:.2f}")
 
             # Print detailed vehicle states
@@ -280,15 +352,52 @@ def run_iterations(num_iterations, vehicle_states, vertiport_states, gurobi_resu
             print("-" * 50)
 
             # Check iteration success
-            if coverage_rate < 0.6:
+            if coverage_rate < coverage_threshold:
                 print(f"Coverage rate below threshold ({coverage_rate:.2f}). Setting flag.")
                 flag = 1
                 stuck_iteration += 1
             else:
                 iteration_complete = True
 
+        # 上一步仍有未满足需求时, 在后台预先求解下一步可能的回退问题
+        if speculator is not None and unmet_demand and stuck_iteration < max_retries and t + 1 < num_iterations:
+            with profiler.phase("speculate"):
+                speculator.speculate_step(t + 1, unmet_demand)
+
         # Step 4: Update battery charging
-        charging_and_battery_update(vehicle_states, time_interval=1, charging_rate=charging_rate)
+        with profiler.phase("charging"):
+            charging_and_battery_update(vehicle_states, time_interval=1, charging_rate=charging_rate)
+
+        # Step 5: Move idle vehicles towards the forecast demand
+        if rebalance_horizon > 0:
+            with profiler.phase("rebalance"):
+                moves = rebalance_idle_vehicles(plane_status, gurobi_results_per_time, t, rebalance_horizon,
+                                                discharge_rate, vertiport_names, distance_table,
+                                                min_battery=rebalance_min_battery)
+            print(f"Rebalancing moves: {moves}")
+
+        unmet_flow = unmet_demand.total_flow()
+        if passes > 0:
+            # 只记录本步最后一次尝试
+            with profiler.phase("metrics"):
+                metrics.add_demand(gurobi_results_per_time[t])
+                metrics.record_movements(vehicle_movements)
+                metrics.end_step(total_met_demand, total_demand, unmet_flow,
+                                 dispatched=sum(1 for m in vehicle_movements.values() if m))
+
+        # Step 6: Snapshot the state for resuming or forking
+        if checkpointer is not None and checkpointer.due(t + 1):
+            with profiler.phase("checkpoint"):
+                checkpointer.save(t + 1, snapshot_state(t + 1, vehicle_states, vertiport_states, plane_status,
+                                                        unmet_demand, flag, stuck_iteration, gurobi_results,
+                                                        metrics=metrics))
+        profiler.end_step(t)
+        if on_step is not None:
+            on_step({
+                "step": t, "passes": passes, "coverage_rate": coverage_rate, "met_demand": total_met_demand,
+                "total_demand": total_demand, "unmet_flow": unmet_flow,
+                "total_cost": total_cost, "seconds": time.perf_counter() - step_begin,
+            })
 
         print("-" * 50)
 
@@ -299,29 +408,70 @@ def run_iterations(num_iterations, vehicle_states, vertiport_states, gurobi_resu
             print("location of the car: ", plane_status[vehicle_id]["location"])
 
         print("-" * 50)
+    return metrics
+
+
 if __name__ == "__main__":
 
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--vertiports_file", default="adjusted_vertiports_numeric.csv")
     parser.add_argument("--distance_file", default="distance_matrix.csv")
-    parser.add_argument("--gurobi_results_file", default="updated_flow_data_with_vertiports.csv")
+    parser.add_argument("--gurobi_results_file", default="updated_flow_data_with_vertiports.csv",
+                        help="flow CSV, or a .npz scenario from scenario_generator.py")
+    parser.add_argument("--solution_cache_dir", default=None, help="persist fallback solutions between runs")
+    parser.add_argument("--solution_cache_size", type=int, default=128)
+    parser.add_argument("--fallback_lookahead", type=int, default=0,
+                        help="extra steps of demand passed to fallback solves")
+    parser.add_argument("--k_best", type=int, default=1,
+                        help="alternatives retrieved per fallback solve (1 = re-solve on every retry)")
+    parser.add_argument("--k_best_diversity", type=int, default=1)
+    parser.add_argument("--speculative_fallback", action="store_true",
+                        help="pre-solve likely fallback problems in a background process (with --k_best 1)")
+    parser.add_argument("--engine", choices=["step", "event"], default="step")
+    parser.add_argument("--flight_speed", type=float, default=None,
+                        help="event engine: distance units flown per step (default: every flight takes one step)")
+    parser.add_argument("--num_iterations", type=int, default=2)
+    parser.add_argument("--charging_rate", type=float, default=20, help="battery gained per step while charging")
+    parser.add_argument("--discharge_rate", type=float, default=0.5, help="battery used per unit of flight distance")
+    parser.add_argument("--battery_model", choices=["linear", "cc_cv"], default="linear",
+                        help="cc_cv: charging tapers above --cv_start (see battery_model.py); the charge curve "
+                             "is only used by --engine event, the step engine never recharges planes")
+    parser.add_argument("--cv_start", type=float, default=None,
+                        help="with cc_cv: SOC where constant-voltage charging starts (default 80)")
+    parser.add_argument("--cutoff_rate", type=float, default=None,
+                        help="with cc_cv: charge rate at 100%% (default rate / 10)")
+    parser.add_argument("--takeoff_energy", type=float, default=0, help="battery used by every flight on top of distance")
+    parser.add_argument("--payload_factor", type=float, default=0,
+                        help="relative extra discharge per unit of payload (passenger flights carry 1, repositioning 0)")
+    parser.add_argument("--dispatch", choices=["greedy", "assignment"], default="greedy")
+    parser.add_argument("--rebalance_horizon", type=int, default=0,
+                        help="steps of forecast demand used to reposition idle vehicles (0 = off)")
+    parser.add_argument("--rebalance_min_battery", type=float, default=0)
+    parser.add_argument("--unmet_max_age", type=int, default=None, help="steps unmet demand waits before it expires")
+    parser.add_argument("--unmet_abandon_rate", type=float, default=0,
+                        help="per-step chance that a unit of waiting demand gives up")
+    parser.add_argument("--checkpoint_dir", default=None)
+    parser.add_argument("--checkpoint_every", type=int, default=10)
+    parser.add_argument("--checkpoint_background", action="store_true", help="write snapshots on a background thread")
+    parser.add_argument("--resume_from", default=None, help="snapshot file to resume (or fork) from")
+    parser.add_argument("--profile_report", default=None,
+                        help="write per-phase timings and counters (.json summary or .csv per step)")
     args = parser.parse_args()
 
     # 加载数据
     vertiports_df = pd.read_csv(args.vertiports_file)
     vertiports = vertiports_df["Vertiport"].tolist()
     distance_map = load_distance_map(args.distance_file)
-    # 获取所有时间步的数据
-    gurobi_results_per_time = []
+    # 获取所有时间步的数据（只解析一次 CSV）
+    if args.gurobi_results_file.endswith(".npz"):
+        demand_index = load_demand_scenario(args.gurobi_results_file, vertiport_names)
+    else:
+        demand_index = build_demand_batches(args.gurobi_results_file, vertiport_names)
     total_time_steps = 500  # 假设一共500个时间步
-
-    for t in range(total_time_steps):
-        # 加载当前时间步的 Gurobi 结果
-        gurobi_results = load_gurobi_results(args.gurobi_results_file, t)
-
-        # 将每个时间步的数据添加到 gurobi_results_per_time
-        gurobi_results_per_time.append(gurobi_results)
+    gurobi_results_per_time = [
+        demand_index.get(t, DemandBatch.empty(vertiport_names)) for t in range(total_time_steps)
+    ]
 
     # Debug: 打印第一步加载的 gurobi_results_per_time
     # print("Loaded Gurobi results:")
@@ -345,19 +495,94 @@ if __name__ == "__main__":
         # 加载距离映射
     distance_map = load_distance_map("distance_matrix.csv")
 
-
-
-
+    # 电池模型: 默认保持线性充放电
+    charging_rate, discharge_rate = args.charging_rate, args.discharge_rate
+    discharge = {"takeoff_energy": args.takeoff_energy, "payload_factor": args.payload_factor}
+    if args.battery_model == "cc_cv":
+        cv_start = 80 if args.cv_start is None else args.cv_start
+        charging_rate = discharge_rate = BatteryModel.cc_cv(args.charging_rate, cv_start, args.cutoff_rate,
+                                                            args.discharge_rate, **discharge)
+    elif args.cv_start is not None or args.cutoff_rate is not None:
+        parser.error("--cv_start and --cutoff_rate need --battery_model cc_cv")
+    elif args.takeoff_energy or args.payload_factor:
+        # 线性充电, 只有放电用模型
+        discharge_rate = BatteryModel.constant(args.charging_rate, args.discharge_rate, **discharge)
+
+    # 回退求解结果缓存
+    solution_cache = SolutionCache(capacity=args.solution_cache_size, cache_dir=args.solution_cache_dir)
+
+
+    regenerate_alternatives = None
+    if args.k_best > 1:
+        regenerate_alternatives = partial(regenerate_k_best, k=args.k_best, diversity=args.k_best_diversity,
+                                          cache=solution_cache, demand_index=demand_index,
+                                          lookahead=args.fallback_lookahead)
+
+    if args.engine == "event":
+        simulation = EventSimulation(plane_status, vertiport_states, gurobi_results_per_time[:args.num_iterations],
+                                     charging_rate=charging_rate, discharge_rate=discharge_rate,
+                                     distance_file=args.distance_file,
+                                     speed=args.flight_speed, dispatch=args.dispatch)
+        for record in simulation.run(until=args.num_iterations):
+            print(record)
+        raise SystemExit
+
+    # 从快照恢复
+    resume = {"vehicle_states": vehicle_states, "vertiport_states": vertiport_states, "plane_status": plane_status}
+    if args.resume_from:
+        resume = resume_kwargs(load_checkpoint(args.resume_from))
+        print(f"Resuming from {args.resume_from} at step {resume['start_step'] + 1}")
+    checkpointer = None
+    if args.checkpoint_dir:
+        checkpointer = Checkpointer(args.checkpoint_dir, args.checkpoint_every, background=args.checkpoint_background)
+
+    profiler = Profiler() if args.profile_report else NULL_PROFILER
+
+    # 未满足需求账本; 恢复时沿用快照中的账本 (旧快照只有元组列表)
+    unmet_ledger = resume.pop("unmet_demand", None)
+    if not isinstance(unmet_ledger, UnmetDemandLedger):
+        carried = unmet_ledger or []
+        unmet_ledger = UnmetDemandLedger(vertiport_names, distance_table)
+        unmet_ledger.set_step(resume.get("start_step", 0))
+        unmet_ledger.extend(carried)
+    unmet_ledger.max_age, unmet_ledger.abandon_rate = args.unmet_max_age, args.unmet_abandon_rate
+
+    speculator = None
+    regenerate = partial(regenerate_solution, cache=solution_cache, demand_index=demand_index,
+                         lookahead=args.fallback_lookahead)
+    if args.speculative_fallback and regenerate_alternatives is None:
+        speculator = SpeculativeFallback(solution_cache, demand_index, args.fallback_lookahead)
+        regenerate = speculator
 
     # Run simulation
-    run_iterations(
-        num_iterations=2,
-        vehicle_states=vehicle_states,
-        vertiport_states=vertiport_states,
-        gurobi_results_per_time=gurobi_results_per_time,
-        charging_rate=20,
-        discharge_rate=0.5,
-        regenerate_solution=regenerate_solution,
-        plane_status=plane_status,
-        distance_map = distance_map
-    )
\ No newline at end of file
+    try:
+        metrics = run_iterations(
+            num_iterations=args.num_iterations,
+            gurobi_results_per_time=gurobi_results_per_time,
+            charging_rate=charging_rate,
+            discharge_rate=discharge_rate,
+            regenerate_solution=regenerate,
+            distance_map = distance_map,
+            regenerate_alternatives=regenerate_alternatives,
+            dispatch=args.dispatch,
+            rebalance_horizon=args.rebalance_horizon,
+            rebalance_min_battery=args.rebalance_min_battery,
+            checkpointer=checkpointer,
+            profiler=profiler,
+            speculator=speculator,
+            unmet_demand=unmet_ledger,
+            **resume
+        )
+    finally:
+        if checkpointer is not None:
+            checkpointer.close()
+        if speculator is not None:
+            speculator.close()
+    print(f"Run summary: {metrics.summary()}")
+    print(f"Unmet demand ledger: {unmet_ledger.stats()}")
+    print(f"Solution cache: {solution_cache.stats()}")
+    if speculator is not None:
+        print(f"Speculative fallback: {speculator.stats()}")
+    if args.profile_report:
+        profiler.write_report(args.profile_report)
+        print(f"Profile written to {args.profile_report}")
@@ -0,0 +1,262 @@
+import argparse
+import contextlib
+import http.client
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty
+from typing import Dict, Iterator
+
+import pandas as pd
+
+from demand_batch import DemandBatch
+from demand_index import build_demand_batches, load_demand_scenario
+from distance_battery import vertiport_names
+from generate_solution import regenerate_solution
+from initialization import initialize_states_with_time
+from simulation import initialize_plane_status_loc, load_distance_map, run_iterations
+from solution_cache import SolutionCache
+
+# 场景请求的可选参数及默认值
+SCENARIO_DEFAULTS = {
+    "num_iterations": 10,
+    "vehicles_per_vertiport": 2,
+    "charging_rate": 20.0,
+    "discharge_rate": 0.5,
+    "coverage_threshold": 0.6,
+    "max_retries": 5,
+    "dispatch": "greedy",
+    "rebalance_horizon": 0,
+    "rebalance_min_battery": 0.0,
+    "fallback_lookahead": 0,
+}
+DISPATCH_MODES = ("greedy", "assignment")
+
+# 由主进程加载一次, fork 出的工作进程直接继承
+_DATA = {}
+
+
+def load_data(vertiports_file: str, distance_file: str, demand_file: str, total_time_steps: int = 500):
+    """Load vertiports, distances and the per-step demand into this process (and later forks)."""
+    vertiports = pd.read_csv(vertiports_file)["Vertiport"].tolist()
+    if demand_file.endswith(".npz"):
+        demand_index = load_demand_scenario(demand_file, vertiport_names)
+    else:
+        demand_index = build_demand_batches(demand_file, vertiport_names)
+    _DATA.update(
+        vertiports=vertiports,
+        distance_map=load_distance_map(distance_file),
+        demand_index=demand_index,
+        demand=[demand_index.get(t, DemandBatch.empty(vertiport_names)) for t in range(total_time_steps)],
+        cache=SolutionCache(),
+    )
+
+
+def scenario_settings(request: Dict) -> Dict:
+    """
+    The request's parameters over the defaults. Unknown keys and values not of the default's
+    type (integers are accepted for float parameters) raise ValueError.
+    """
+    if not isinstance(request, dict):
+        raise ValueError("the scenario must be a JSON object")
+    unknown = set(request) - set(SCENARIO_DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown scenario parameters: {', '.join(sorted(unknown))}")
+    settings = dict(SCENARIO_DEFAULTS, **request)
+    for key, default in SCENARIO_DEFAULTS.items():
+        value = settings[key]
+        # bool 是 int 的子类, 单独排除
+        if isinstance(default, float) and isinstance(value, (int, float)) and not isinstance(value, bool):
+            settings[key] = float(value)
+        elif type(value) is not type(default):
+            raise ValueError(f"{key} must be {type(default).__name__}, got {json.dumps(value)}")
+    if settings["dispatch"] not in DISPATCH_MODES:
+        raise ValueError(f"dispatch must be one of {', '.join(DISPATCH_MODES)}")
+    if settings["num_iterations"] < 0 or settings["vehicles_per_vertiport"] < 0:
+        raise ValueError("num_iterations and vehicles_per_vertiport must not be negative")
+    if settings["num_iterations"] > len(_DATA["demand"]):
+        raise ValueError(f"num_iterations exceeds the {len(_DATA['demand'])} loaded steps")
+    return settings
+
+
+def run_scenario(settings: Dict, queue=None) -> Dict:
+    """
+    Simulate one scenario on the loaded data; per-step metrics go to `queue` as they are produced.
+
+    :return: Summary of the run.
+    """
+    begin = time.perf_counter()
+    vertiports = _DATA["vertiports"]
+    vehicles = [f"V{i}" for i in range(1, settings["vehicles_per_vertiport"] * len(vertiports) + 1)]
+    vehicle_states, vertiport_states = initialize_states_with_time(vehicles, vertiports, len(vertiports))
+    plane_status = initialize_plane_status_loc(vehicles, vertiports)
+    for vertiport in vertiports:
+        vertiport_states[vertiport]["activated"] = True
+
+    steps = []
+
+    def on_step(record):
+        record = {key: value if key in ("step", "passes") or value is None else float(value)
+                  for key, value in record.items()}
+        steps.append(record)
+        if queue is not None:
+            queue.put(record)
+
+    # 仿真循环的逐步输出对服务没有用处, 直接丢弃
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        run_iterations(
+            num_iterations=settings["num_iterations"],
+            vehicle_states=vehicle_states,
+            vertiport_states=vertiport_states,
+            gurobi_results_per_time=list(_DATA["demand"]),
+            charging_rate=settings["charging_rate"],
+            discharge_rate=settings["discharge_rate"],
+            regenerate_solution=partial(regenerate_solution, cache=_DATA["cache"], demand_index=_DATA["demand_index"],
+                                        lookahead=settings["fallback_lookahead"]),
+            plane_status=plane_status,
+            distance_map=_DATA["distance_map"],
+            dispatch=settings["dispatch"],
+            rebalance_horizon=settings["rebalance_horizon"],
+            rebalance_min_battery=settings["rebalance_min_battery"],
+            coverage_threshold=settings["coverage_threshold"],
+            max_retries=settings["max_retries"],
+            on_step=on_step,
+        )
+    covered = [s["coverage_rate"] for s in steps if s["coverage_rate"] is not None]
+    return {
+        "done": True,
+        "steps": len(steps),
+        "simulated_steps": len(covered),
+        "mean_coverage_rate": sum(covered) / len(covered) if covered else None,
+        "unmet_flow": steps[-1]["unmet_flow"] if steps else 0.0,
+        "seconds": time.perf_counter() - begin,
+    }
+
+
+def _warm_up(_):
+    return os.getpid()
+
+
+class ScenarioServer(ThreadingHTTPServer):
+    """
+    HTTP server on localhost with a warm pool of simulation processes.
+
+    The data is loaded before the pool forks, so a request only pays for building the fleet
+    and simulating. Results stream back as one JSON object per line.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, workers: int = 2):
+        super().__init__(address, ScenarioHandler)
+        context = multiprocessing.get_context("fork")
+        self.manager = context.Manager()
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        self.workers = workers
+        # 预先启动全部工作进程
+        list(self.pool.map(_warm_up, range(workers)))
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(cancel_futures=True)
+        self.manager.shutdown()
+
+
+class ScenarioHandler(BaseHTTPRequestHandler):
+    """GET /health; POST /run with a JSON scenario, answered with newline-delimited JSON."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send_json(404, {"error": f"unknown path {self.path}"})
+        self._send_json(200, {"status": "ok", "vertiports": len(_DATA["vertiports"]),
+                              "steps": len(_DATA["demand"]), "workers": self.server.workers})
+
+    def do_POST(self):
+        if self.path != "/run":
+            return self._send_json(404, {"error": f"unknown path {self.path}"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            settings = scenario_settings(request)
+        except (ValueError, TypeError) as error:
+            return self._send_json(400, {"error": str(error)})
+
+        queue = self.server.manager.Queue()
+        future = self.server.pool.submit(run_scenario, settings, queue)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        streamed = 0
+        while streamed < settings["num_iterations"]:
+            if future.done() and queue.empty():
+                break
+            try:
+                record = queue.get(timeout=0.1)
+            except Empty:
+                continue
+            self._write_line(record)
+            streamed += 1
+        try:
+            summary = future.result()
+        except Exception as error:
+            summary = {"done": False, "error": repr(error)}
+        self._write_line(summary)
+
+    def _write_line(self, payload: Dict):
+        self.wfile.write(json.dumps(payload).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+def request_scenario(scenario: Dict, host: str = "127.0.0.1", port: int = 8765, timeout: float = 600) -> Iterator[Dict]:
+    """Send a scenario to a running server and yield the per-step records, then the summary."""
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    body = json.dumps(scenario)
+    connection.request("POST", "/run", body, {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    if response.status != 200:
+        raise ValueError(json.loads(response.read()).get("error"))
+    for line in response:
+        yield json.loads(line)
+    connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve simulation scenarios from a warm worker pool on localhost.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--vertiports_file", default="adjusted_vertiports_numeric.csv")
+    parser.add_argument("--distance_file", default="distance_matrix.csv")
+    parser.add_argument("--gurobi_results_file", default="updated_flow_data_with_vertiports.csv",
+                        help="flow CSV, or a .npz scenario from scenario_generator.py")
+    parser.add_argument("--request", default=None,
+                        help='client mode: send this JSON scenario (e.g. \'{"num_iterations": 20}\') to the server')
+    args = parser.parse_args()
+
+    if args.request is not None:
+        for record in request_scenario(json.loads(args.request), port=args.port):
+            print(json.dumps(record))
+        raise SystemExit
+
+    load_data(args.vertiports_file, args.distance_file, args.gurobi_results_file)
+    server = ScenarioServer(("127.0.0.1", args.port), args.workers)
+    print(f"Serving {len(_DATA['vertiports'])} vertiports, {len(_DATA['demand'])} steps "
+          f"on http://127.0.0.1:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
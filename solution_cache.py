@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from demand_batch import DemandBatch
+
+
+def demand_fingerprint(demand_data, banned_solutions=None, solver_params: Optional[Dict] = None) -> str:
+    """
+    Canonical hash of a solver call.
+
+    The demand is treated as a multiset, so the same routes in a different order
+    (or the same unmet tuples merged in a different retry) give the same key.
+    """
+    if isinstance(demand_data, DemandBatch):
+        rows = demand_data.iter_routes()
+    else:
+        rows = ((d["start"], d["end"], d["flow"], d["distance"]) for d in demand_data)
+    demand = sorted(
+        (str(start), str(end), float(flow), round(float(distance), 6))
+        for start, end, flow, distance in rows
+    )
+    banned = sorted(
+        sorted((str(b[0]), str(b[1])) for b in banned)
+        for banned in (banned_solutions or [])
+    )
+    payload = json.dumps(
+        {"demand": demand, "banned": banned, "params": solver_params or {}},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SolutionCache:
+    """
+    Two-tier cache of solver outputs keyed by `demand_fingerprint`.
+
+    The memory tier is an LRU of `capacity` entries; evicted entries stay on disk
+    (if `cache_dir` is set), so the disk tier survives between runs.
+    """
+
+    def __init__(self, capacity: int = 128, cache_dir: Optional[str] = None):
+        self.capacity = capacity
+        self.cache_dir = cache_dir
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key: str):
+        """Return the cached solution, or None on a miss."""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+
+        if self.cache_dir and os.path.exists(self._disk_path(key)):
+            with open(self._disk_path(key), "rb") as f:
+                solution = pickle.load(f)
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, solution)
+            return solution
+
+        self.misses += 1
+        return None
+
+    def __contains__(self, key: str) -> bool:
+        """Membership test that does not count as a lookup."""
+        return key in self._memory or bool(self.cache_dir and os.path.exists(self._disk_path(key)))
+
+    def put(self, key: str, solution):
+        """Store a solution in both tiers."""
+        self._remember(key, solution)
+        if self.cache_dir:
+            tmp_path = self._disk_path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(solution, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._disk_path(key))
+
+    def _remember(self, key: str, solution):
+        self._memory[key] = solution
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        """Hit, miss and eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.hits - self.disk_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "memory_entries": len(self._memory),
+        }
@@ -1,15 +1,37 @@
 from typing import List, Dict
+from collections import defaultdict
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
 
 from distance_battery import battery_consumption_required
+from demand_batch import DemandBatch
+
+# 每架飞机承载一个单位的需求; 调度空飞 (rebalancing) 的载荷为 0
+TRIP_PAYLOAD = 1
+
 
 def time_step_path_assignment(gurobi_results: List[Dict], vehicle_states: Dict, vertiport_states: Dict,
                               unmet_demand: List, discharge_rate: float, vehicle_movements: Dict,
-                              plane_status: Dict):
-    """Assigns vehicles to paths based on Gurobi results and updates their statuses."""
-    for path in gurobi_results:
-        start, end = path["start"], path["end"]
-        needed = path["flow"]
-        distance = path["distance"]
+                              plane_status: Dict, dispatch: str = "greedy"):
+    """
+    Assigns vehicles to paths based on Gurobi results (list of dicts or DemandBatch) and updates their statuses.
+
+    dispatch="greedy" takes the first standby planes for each path in order;
+    dispatch="assignment" uses `assignment_dispatch` to maximise the met demand.
+    """
+    if dispatch == "assignment":
+        return assignment_dispatch(gurobi_results, vehicle_states, vertiport_states, unmet_demand,
+                                   discharge_rate, vehicle_movements, plane_status)
+    if dispatch != "greedy":
+        raise ValueError(f"Unknown dispatch mode: {dispatch}")
+
+    if isinstance(gurobi_results, DemandBatch):
+        routes = gurobi_results.iter_routes()
+    else:
+        routes = ((path["start"], path["end"], path["flow"], path["distance"]) for path in gurobi_results)
+
+    for start, end, needed, distance in routes:
 
         assigned = 0
 
@@ -17,7 +39,7 @@ def time_step_path_assignment(gurobi_results: List[Dict], vehicle_states: Dict,
         available_planes = [
             vehicle_id for vehicle_id, status in plane_status.items()
             if status["location"] == start and status["status"] == "standby" and status["battery"] >=
-            battery_consumption_required(distance, discharge_rate)
+            battery_consumption_required(distance, discharge_rate, TRIP_PAYLOAD)
         ]
         print(f"Available planes for path {start} -> {end}: {available_planes}")
 
@@ -25,7 +47,7 @@ def time_step_path_assignment(gurobi_results: List[Dict], vehicle_states: Dict,
             # Assign the plane to the task
             plane_status[vehicle_id]["status"] = "in_service"
             plane_status[vehicle_id]["location"] = end
-            plane_status[vehicle_id]["battery"] -= battery_consumption_required(distance, discharge_rate)
+            plane_status[vehicle_id]["battery"] -= battery_consumption_required(distance, discharge_rate, TRIP_PAYLOAD)
             assigned += 1
 
             # Record movement
@@ -42,3 +64,78 @@ def time_step_path_assignment(gurobi_results: List[Dict], vehicle_states: Dict,
 
     # Debug: print unmet demand
     print(f"Updated unmet demand: {unmet_demand}")
+
+
+def assignment_dispatch(gurobi_results: List[Dict], vehicle_states: Dict, vertiport_states: Dict,
+                        unmet_demand: List, discharge_rate: float, vehicle_movements: Dict,
+                        plane_status: Dict):
+    """
+    Same contract as `time_step_path_assignment`, but each start vertiport is solved as a
+    bipartite assignment of standby planes to demand units.
+
+    A plane can only serve a unit whose battery requirement it covers, so the greedy
+    first-fit can spend a full battery on a short hop and leave a long route unserved.
+    Here every feasible match is worth the same large reward, so the assignment
+    (Hungarian algorithm on the cost matrix) serves as many units as possible; the small
+    remaining cost prefers the plane with the least spare battery and earlier paths.
+    """
+    if isinstance(gurobi_results, DemandBatch):
+        routes = list(gurobi_results.iter_routes())
+    else:
+        routes = [(path["start"], path["end"], path["flow"], path["distance"]) for path in gurobi_results]
+
+    # Standby planes per vertiport
+    standby = defaultdict(list)
+    for vehicle_id, status in plane_status.items():
+        if status["status"] == "standby":
+            standby[status["location"]].append(vehicle_id)
+
+    # Paths per start vertiport, keeping their original order
+    paths_by_start = defaultdict(list)
+    for index, (start, _, _, _) in enumerate(routes):
+        paths_by_start[start].append(index)
+
+    assigned = np.zeros(len(routes), dtype=np.int64)
+    for start, path_indices in paths_by_start.items():
+        planes = standby.get(start, [])
+        if not planes:
+            continue
+        battery = np.array([plane_status[v]["battery"] for v in planes], dtype=float)
+
+        # One column per demand unit; a path never needs more units than there are planes
+        unit_path = np.repeat(path_indices, [min(int(routes[i][2]), len(planes)) for i in path_indices])
+        if len(unit_path) == 0:
+            continue
+        required = np.array([battery_consumption_required(routes[i][3], discharge_rate, TRIP_PAYLOAD)
+                             for i in unit_path])
+
+        feasible = battery[:, None] >= required[None, :]
+        slack = (battery[:, None] - required[None, :]) / 100.0
+        order = np.arange(len(unit_path))[None, :] / len(unit_path)
+        # Reward per match outweighs any sum of tie-break terms, so cardinality comes first
+        reward = 2 * len(unit_path) + 1
+        cost = np.where(feasible, -reward - 2 + slack + order, 0.0)
+
+        rows, cols = linear_sum_assignment(cost)
+        for row, col in zip(rows, cols):
+            if not feasible[row, col]:
+                continue
+            vehicle_id = planes[row]
+            path_index = unit_path[col]
+            _, end, _, distance = routes[path_index]
+
+            # Assign the plane to the task
+            plane_status[vehicle_id]["status"] = "in_service"
+            plane_status[vehicle_id]["location"] = end
+            plane_status[vehicle_id]["battery"] -= battery_consumption_required(distance, discharge_rate, TRIP_PAYLOAD)
+            assigned[path_index] += 1
+
+            # Record movement
+            vehicle_movements[vehicle_id] = (start, end)
+
+    # Update unmet demand
+    for (start, end, needed, _), served in zip(routes, assigned):
+        if served < needed:
+            unmet_demand.append((start, end, needed - served))
+
+    print(f"Assignment dispatch: {int(assigned.sum())} planes assigned, unmet demand: {unmet_demand}")
@@ -0,0 +1,236 @@
+from collections import Counter, deque
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from demand_batch import DemandBatch
+
+
+class UnmetDemandLedger:
+    """
+    Unmet demand indexed by route, with the age of every unit of demand.
+
+    Behaves like the list of (start, end, flow) tuples it replaces: `time_step_path_assignment`
+    appends to it, the loop clears it before each pass, and iterating yields the rows in the
+    order they were appended (dispatch and `metrics.calculate_demand_met` work per row, so the
+    rows are kept as they are). Alongside the rows, each route keeps its merged flow and FIFO
+    cohorts of [birth step, flow]; `as_batch()` is the merged per-route view for the solver.
+
+    `clear()` keeps the previous cohorts aside, so the appends of the next pass re-claim them:
+    a route's remaining flow is taken first from this step's new demand (see `set_step`), then
+    from its youngest carried cohorts. `settle(vehicle_movements)` then counts the dispatched
+    flights as served, oldest demand first; carried demand neither re-claimed nor served was
+    dropped. With `max_age`, demand older than that many steps expires when the step advances;
+    `abandon_rate` is the per-step chance that a unit of waiting demand gives up.
+    """
+
+    def __init__(self, names: Sequence[str], distance_table: np.ndarray, max_age: Optional[int] = None,
+                 abandon_rate: float = 0.0, seed: int = 0):
+        self.names = tuple(names)
+        self.code = {name: i for i, name in enumerate(self.names)}
+        self.distance_table = distance_table
+        self.max_age = max_age
+        self.abandon_rate = abandon_rate
+        self.rng = np.random.default_rng(seed)
+
+        self.rows = []                         # [起点, 终点, 流量], 按追加顺序
+        self.routes: Dict[int, deque] = {}     # 路线编码 -> [[出生步, 流量], ...], 最老的在左
+        self.flows: Dict[int, int] = {}
+        self.total = 0
+        self.step = 0
+        self._new: Dict[int, int] = {}         # 本步新需求中尚未被认领的流量
+        self._previous: Dict[int, deque] = {}  # clear() 之前的批次, 等待本轮追加认领或 settle
+        self._batch = None
+
+        self.served = 0
+        self.served_age = 0
+        self.dropped = 0
+        self.expired = 0
+        self.abandoned = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_batch"] = None  # 快照中不保存缓存的数组视图
+        return state
+
+    # --- list interface ---------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return (tuple(row) for row in self.rows)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def _route(self, start: str, end: str) -> int:
+        return self.code[start] * len(self.names) + self.code[end]
+
+    def append(self, demand: Tuple[str, str, int]):
+        """Add a (start, end, flow) row, re-claiming the route's new and previously carried demand first."""
+        start, end, flow = demand
+        self.rows.append([start, end, flow])
+        flow = int(flow)
+        if flow <= 0:
+            return
+        code = self._route(start, end)
+        cohorts = self.routes.setdefault(code, deque())
+        fresh = min(flow, self._new.get(code, 0))
+        if fresh:
+            self._new[code] -= fresh
+        carried = flow - fresh
+        # 从上一轮最年轻的批次开始认领
+        previous = self._previous.get(code)
+        while carried and previous:
+            born, units = previous[-1]
+            take = min(units, carried)
+            if take == units:
+                previous.pop()
+            else:
+                previous[-1][1] -= take
+            self._add(cohorts, born, take)
+            carried -= take
+        fresh += carried
+        if fresh:
+            self._add(cohorts, self.step, fresh)
+        self.flows[code] = self.flows.get(code, 0) + flow
+        self.total += flow
+        self._batch = None
+
+    def extend(self, demand: Iterable[Tuple[str, str, int]]):
+        for d in demand:
+            self.append(d)
+
+    def clear(self):
+        """Start a pass: the current cohorts wait to be re-claimed by this pass's appends."""
+        self._drop_unclaimed()
+        self._previous = self.routes
+        self.rows, self.routes, self.flows, self.total = [], {}, {}, 0
+        self._batch = None
+
+    # --- steps, service and aging -----------------------------------------------------
+
+    def set_step(self, t: int, new_demand=None):
+        """
+        Enter step t with its new demand (DemandBatch or list of demand dicts), aging the
+        waiting demand when t moves forward. Call before every pass of the step.
+        """
+        self._drop_unclaimed()
+        if t > self.step:
+            self._age(t)
+        self.step = t
+        self._new = {}
+        if new_demand is None:
+            return
+        if isinstance(new_demand, DemandBatch):
+            codes, index = np.unique(new_demand.route_codes(), return_inverse=True)
+            totals = np.bincount(index, weights=new_demand.flow, minlength=len(codes))
+            self._new = dict(zip(codes.tolist(), totals.astype(np.int64).tolist()))
+            return
+        for d in new_demand:
+            code = self._route(d["start"], d["end"])
+            self._new[code] = self._new.get(code, 0) + d["flow"]
+
+    def settle(self, vehicle_movements: Dict):
+        """
+        Count the flights of a pass ({vehicle: (start, end) or None}) as served demand, taking
+        the oldest carried cohorts first; carried demand left over was dropped by the pass.
+        """
+        for (start, end), count in Counter(m for m in vehicle_movements.values() if m).items():
+            self.served += count
+            previous = self._previous.get(self._route(start, end))
+            while count and previous:
+                born, units = previous[0]
+                take = min(units, count)
+                if take == units:
+                    previous.popleft()
+                else:
+                    previous[0][1] -= take
+                self.served_age += take * (self.step - born)
+                count -= take
+        self._drop_unclaimed()
+
+    def _drop_unclaimed(self):
+        self.dropped += sum(units for cohorts in self._previous.values() for _, units in cohorts)
+        self._previous = {}
+
+    def _age(self, t: int):
+        changed = {}
+        for code in list(self.routes):
+            cohorts = self.routes[code]
+            dropped = 0
+            if self.max_age is not None:
+                while cohorts and t - cohorts[0][0] > self.max_age:
+                    dropped += cohorts.popleft()[1]
+                self.expired += dropped
+            if self.abandon_rate > 0:
+                # 每个单位独立放弃, 跨越多步时按累计概率
+                chance = 1 - (1 - self.abandon_rate) ** (t - self.step)
+                for cohort in cohorts:
+                    gone = int(self.rng.binomial(cohort[1], chance))
+                    cohort[1] -= gone
+                    dropped += gone
+                    self.abandoned += gone
+                self.routes[code] = cohorts = deque(c for c in cohorts if c[1] > 0)
+            if dropped:
+                changed[code] = dropped
+                self.flows[code] -= dropped
+                self.total -= dropped
+            if not cohorts:
+                del self.routes[code]
+                self.flows.pop(code, None)
+        if changed:
+            self._remove_from_rows(changed)
+
+    def _remove_from_rows(self, units: Dict[int, int]):
+        """Take `units[route]` off that route's rows, from the first row on."""
+        for row in self.rows:
+            code = self._route(row[0], row[1])
+            if units.get(code):
+                take = min(row[2], units[code])
+                row[2] -= take
+                units[code] -= take
+        self.rows = [row for row in self.rows if row[2] > 0]
+        self._batch = None
+
+    @staticmethod
+    def _add(cohorts: deque, born: int, units: int):
+        """Insert a cohort, keeping the deque ordered from oldest to youngest."""
+        k = len(cohorts)
+        while k > 0 and cohorts[k - 1][0] > born:
+            k -= 1
+        if k > 0 and cohorts[k - 1][0] == born:
+            cohorts[k - 1][1] += units
+        else:
+            cohorts.insert(k, [born, units])
+
+    # --- views ------------------------------------------------------------------------
+
+    def total_flow(self) -> int:
+        return self.total
+
+    def as_batch(self) -> DemandBatch:
+        """The routes merged to one row each, as a DemandBatch (cached until the ledger changes)."""
+        if self._batch is None:
+            codes = np.fromiter(self.flows.keys(), dtype=np.int64, count=len(self.flows))
+            flows = np.fromiter(self.flows.values(), dtype=np.int64, count=len(self.flows))
+            start, end = np.divmod(codes, len(self.names))
+            self._batch = DemandBatch(self.names, start, end, flows, self.distance_table[start, end])
+        return self._batch
+
+    def age_profile(self) -> Dict[int, int]:
+        """Waiting flow by age in steps."""
+        profile = {}
+        for cohorts in self.routes.values():
+            for born, units in cohorts:
+                profile[self.step - born] = profile.get(self.step - born, 0) + units
+        return dict(sorted(profile.items()))
+
+    def stats(self) -> Dict:
+        """Waiting, served (with the mean wait in steps), dropped, expired and abandoned flow."""
+        return {
+            "routes": len(self.flows), "waiting": self.total, "served": self.served,
+            "mean_wait": self.served_age / self.served if self.served else 0.0,
+            "dropped": self.dropped, "expired": self.expired, "abandoned": self.abandoned,
+        }
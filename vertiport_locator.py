@@ -0,0 +1,187 @@
+import argparse
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371
+
+# kmeans_align.py 的网格参数, Grid_ID = 行号 * GRID_COLUMNS + 列号
+GRID_SIZE = 0.0135
+LAT_MIN = 37.6
+LON_MIN, LON_MAX = -123.0, -122.3
+GRID_COLUMNS = int((LON_MAX - LON_MIN) / GRID_SIZE)
+
+UNKNOWN = "Unknown"
+
+
+def cell_centres(cells, grid_width: int):
+    """(lat, lon) of grid cell centres on a row-major grid of `grid_width` columns."""
+    row, col = np.divmod(np.asarray(cells), grid_width)
+    return LAT_MIN + (row + 0.5) * GRID_SIZE, LON_MIN + (col + 0.5) * GRID_SIZE
+
+
+def unit_vectors(lat, lon) -> np.ndarray:
+    """Points on the unit sphere, (n x 3)."""
+    phi, lam = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    cos_phi = np.cos(phi)
+    return np.stack([cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)], axis=-1)
+
+
+def chord_to_km(chord):
+    chord = np.asarray(chord, dtype=float)
+    with np.errstate(invalid="ignore"):
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+    return np.where(np.isinf(chord), np.inf, km)  # 半径外的缺失项保持 inf
+
+
+def km_to_chord(km):
+    return 2 * np.sin(np.minimum(np.asarray(km, dtype=float) / (2 * EARTH_RADIUS_KM), np.pi / 2))
+
+
+class VertiportLocator:
+    """
+    Nearest-vertiport queries with haversine distances.
+
+    Vertiports are stored as points on the unit sphere in a cKDTree: straight-line (chord)
+    distance there orders points exactly like great-circle distance, so nearest-k and radius
+    queries are exact, and distances are converted back to kilometres. Queries run in chunks
+    so millions of trip endpoints never materialise a points x vertiports matrix.
+    """
+
+    def __init__(self, names: Sequence[str], lat, lon, grid_ids: Optional[Sequence[int]] = None):
+        self.names = np.asarray(names)
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.grid_ids = None if grid_ids is None else np.asarray(grid_ids)
+        self.tree = cKDTree(unit_vectors(self.lat, self.lon))
+
+    @classmethod
+    def from_csv(cls, file_path: str = "adjusted_vertiports_numeric.csv") -> "VertiportLocator":
+        data = pd.read_csv(file_path)
+        grid_ids = data["Grid_ID"] if "Grid_ID" in data.columns else None
+        return cls(data["Vertiport"], data["Latitude"], data["Longitude"], grid_ids)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _query(self, lat, lon, k: int, radius_km: Optional[float], chunksize: int, workers: int):
+        lat, lon = np.atleast_1d(lat), np.atleast_1d(lon)
+        k = min(k, len(self))
+        distance = np.empty((len(lat), k))
+        index = np.empty((len(lat), k), dtype=np.int64)
+        bound = np.inf if radius_km is None else float(km_to_chord(radius_km)) * (1 + 1e-12)
+        for begin in range(0, len(lat), chunksize):
+            end = begin + chunksize
+            d, i = self.tree.query(unit_vectors(lat[begin:end], lon[begin:end]), k=k,
+                                   distance_upper_bound=bound, workers=workers)
+            distance[begin:end] = np.reshape(d, (-1, k))
+            index[begin:end] = np.reshape(i, (-1, k))
+        return chord_to_km(distance), index
+
+    def nearest(self, lat, lon, k: int = 1, chunksize: int = 1_000_000, workers: int = 1):
+        """
+        The k nearest vertiports of every point.
+
+        :return: (distance_km, index), shaped (n,) for k=1 and (n, k) otherwise, nearest first.
+        """
+        distance, index = self._query(lat, lon, k, None, chunksize, workers)
+        if k == 1:
+            return distance[:, 0], index[:, 0]
+        return distance, index
+
+    def within(self, lat, lon, radius_km: float, k: Optional[int] = None, chunksize: int = 1_000_000,
+               workers: int = 1):
+        """
+        Vertiports within `radius_km` of every point, at most k (all by default), nearest first.
+
+        :return: (distance_km, index) of shape (n, k); missing entries are inf and len(self).
+        """
+        return self._query(lat, lon, k or len(self), radius_km, chunksize, workers)
+
+    def candidates(self, lat, lon, radius_km: float, min_k: int = 2, chunksize: int = 1_000_000) -> np.ndarray:
+        """
+        (points x vertiports) mask of the vertiports within `radius_km`, always including the
+        `min_k` nearest so that every point keeps a take-off/landing choice.
+        """
+        lat = np.atleast_1d(lat)
+        mask = np.zeros((len(lat), len(self) + 1), dtype=bool)  # 最后一列接收缺失项
+        rows = np.arange(len(lat))[:, None]
+        _, index = self.within(lat, lon, radius_km, chunksize=chunksize)
+        mask[rows, index] = True
+        _, index = self._query(lat, lon, min_k, None, chunksize, 1)
+        mask[rows, index] = True
+        return mask[:, :-1]
+
+    def locate_cells(self, cells, grid_width: int, max_distance_km: Optional[float] = None):
+        """
+        Vertiport index serving every grid cell: the vertiport in that cell, else the nearest
+        one to the cell centre, or -1 when that is farther than `max_distance_km`.
+
+        :return: (index, distance_km).
+        """
+        lat, lon = cell_centres(cells, grid_width)
+        distance, index = self.nearest(lat, lon)
+        if max_distance_km is not None:
+            index = np.where(distance <= max_distance_km, index, -1)
+        return index, distance
+
+    def names_of(self, index) -> np.ndarray:
+        """Vertiport names, "Unknown" for -1."""
+        index = np.asarray(index)
+        return np.where(index >= 0, self.names[np.maximum(index, 0)], UNKNOWN)
+
+
+def map_results_to_vertiports(results: pd.DataFrame, locator: VertiportLocator, distance: np.ndarray,
+                              grid_width: int, max_distance_km: Optional[float] = None) -> pd.DataFrame:
+    """
+    Turn optimisation results (Time, Start_Vertiport, End_Vertiport, Flow with grid IDs) into
+    the Time, start, end, flow, distance rows of updated_flow_data_with_vertiports.csv.
+
+    Grid IDs are mapped through `locator.locate_cells`, so IDs that are not exactly a vertiport
+    cell go to the nearest vertiport instead of "Unknown" (unless beyond `max_distance_km`).
+    """
+    start, start_km = locator.locate_cells(results["Start_Vertiport"].to_numpy(), grid_width, max_distance_km)
+    end, end_km = locator.locate_cells(results["End_Vertiport"].to_numpy(), grid_width, max_distance_km)
+    snapped = (start_km > 1e-6) | (end_km > 1e-6)
+    if snapped.any():
+        print(f"{int(snapped.sum())} 行的网格不是停机坪所在网格, 已映射到最近的停机坪 "
+              f"(最远 {max(start_km.max(), end_km.max()):.2f} 公里)")
+    return pd.DataFrame({
+        "Time": results["Time"].to_numpy(),
+        "start": locator.names_of(start),
+        "end": locator.names_of(end),
+        "flow": results["Flow"].to_numpy(),
+        "distance": distance,
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Map optimisation results onto named vertiports.")
+    parser.add_argument("--results_file", default="optimized_results_with_vertiport_mapping.csv")
+    parser.add_argument("--detailed_file", default="optimized_results_detailed.csv",
+                        help="row-aligned results with a distance column; without it the distance matrix is used")
+    parser.add_argument("--vertiports_file", default="adjusted_vertiports_numeric.csv")
+    parser.add_argument("--distance_file", default="distance_matrix.csv")
+    parser.add_argument("--output_file", default="updated_flow_data_with_vertiports.csv")
+    parser.add_argument("--grid_width", type=int, default=GRID_COLUMNS)
+    parser.add_argument("--max_distance_km", type=float, default=None,
+                        help="cells farther than this from every vertiport are written as Unknown")
+    args = parser.parse_args()
+
+    locator = VertiportLocator.from_csv(args.vertiports_file)
+    results = pd.read_csv(args.results_file)
+    if args.detailed_file and os.path.exists(args.detailed_file):
+        distance = pd.read_csv(args.detailed_file)["distance"].to_numpy()
+    else:
+        distance_data = pd.read_csv(args.distance_file, index_col=0)
+        table = distance_data.loc[locator.names, locator.names].to_numpy(dtype=float)
+        start, _ = locator.locate_cells(results["Start_Vertiport"].to_numpy(), args.grid_width)
+        end, _ = locator.locate_cells(results["End_Vertiport"].to_numpy(), args.grid_width)
+        distance = table[start, end]
+
+    mapped = map_results_to_vertiports(results, locator, distance, args.grid_width, args.max_distance_km)
+    mapped.to_csv(args.output_file, index=False)
+    print(f"结果已保存至 '{args.output_file}'")